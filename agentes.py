@@ -2,57 +2,216 @@ import ollama
 import ast
 import re
 import ruff
-import subprocess
-import sys
 import os
-import pathlib
 import time
 import psutil
 from sklearn.metrics import precision_score, recall_score, f1_score
+from sampler import ResourceSampler
+from sandbox import default_executor
+from lint import default_linter
+from prompts import PromptBuilder, count_tokens, summarize_lint, truncate_traceback
+from scoring import RUBRIC, ReviewStats, parse_review, reask_prompt, review_schema
+from timing import TIMINGS, span, timed
+
+# A rubric score written as "(X points)", "(X/20)", "( X )"...
+SCORE_PATTERN = r"\(\s*(\d+)\s*(?:[^)]*)?\)"
+
+def make_client(backend=None):
+    """
+    Returns the object the agents call .chat() on.
+    :param backend: "ollama" or "mock" (the local stand-in from mock_ollama); when None it is read
+                    from the LLM_BACKEND environment variable, defaulting to "ollama".
+    """
+    backend = backend or os.environ.get("LLM_BACKEND", "ollama")
+    if backend == "mock":
+        from mock_ollama import MockClient
+        return MockClient()
+    return ollama
+
 
 class LLMAgent:
-    def __init__(self, model="llama3.2:1b"):
+    def __init__(self, model="llama3.2:1b", cache=None, options=None, client=None, prompt_builder=None):
         self.model = model
         self.memory = []  # Memory for conversation history
+        # Keeps every prompt and the history sent with it within a token budget
+        self.prompt_builder = prompt_builder if prompt_builder is not None else PromptBuilder()
+        self.last_prompt_tokens = 0  # Estimated tokens of the last request (prompt plus history)
+        self.cache = cache  # Optional LLMCache in front of the model
+        self.options = options  # Sampling options passed to the model (temperature, seed...)
+        self.client = client if client is not None else make_client()
+        self.tokens = 0  # Prompt and response tokens spent by this agent, as reported by the model server
+        # Streaming: the answer is read as it is generated and the request is closed (which stops the
+        # generation) as soon as is_complete() says it has everything, or past max_response_chars
+        self.stream = False
+        self.max_response_chars = 16000
+        self.last_ttft = None  # Seconds to the first streamed chunk of the last request
+        self.last_stop = None  # How the last streamed answer ended: "complete", "length" or "done"
 
-    def generate(self, prompt):
-        """Sends a prompt to the model and receives a response."""
-        messages = [{'role': 'user', 'content': prompt}]
+    def generate(self, prompt, options=None, format=None):
+        """
+        Sends a prompt to the model and receives a response.
+        :param options: Sampling options for this request only; the agent's options when None.
+        :param format: Output format asked to the model server: "json" or a JSON schema.
+        """
+        options = options if options is not None else self.options
+        messages = self._messages(prompt)
+        key, cached = self._cache_lookup(messages, options, format)  # Raises CacheMiss in replay mode
+        if cached is not None:
+            return cached
+        extra = {} if format is None else {'format': format}
         try:
-            response = ollama.chat(model=self.model, messages=messages + self.memory)
+            with span("llm.chat"):
+                if self.stream:
+                    return self._cache_store_streamed(key, self._stream_chat(messages, options, extra))
+                response = self.client.chat(model=self.model, messages=messages, options=options, **extra)
             
             #print(response) # debugging
             
-            return response['message']['content']
+            self._count_tokens(response)
+            return self._cache_store(key, response['message']['content'])
 
         except Exception as e:
             print(f"Error calling ollama.chat: {e}")
             return "Error generating code: exception in model call."
 
+    def is_complete(self, content):
+        """Tells whether a partial streamed answer already holds everything needed from it."""
+        return False
+
+    def _stream_chat(self, messages, options, extra):
+        stream = _Stream(self)
+        chunks = self.client.chat(model=self.model, messages=messages, options=options, stream=True, **extra)
+        try:
+            for chunk in chunks:
+                if stream.feed(chunk):
+                    break
+        finally:
+            if hasattr(chunks, "close"):
+                chunks.close()  # Closes the connection, so the server stops generating
+        return stream.finish()
+
+    def _messages(self, prompt):
+        """Request messages: the prompt and the recent history, whose stale part is dropped."""
+        self.memory = self.prompt_builder.trim_history(self.memory)
+        messages = [{'role': 'user', 'content': prompt}] + self.memory
+        self.last_prompt_tokens = self.prompt_builder.record(messages)
+        return messages
+
+    def _cache_lookup(self, messages, options=None, format=None):
+        """
+        Looks the request up in the response cache.
+        :return: Tuple (cache key or None, cached response or None).
+        """
+        if self.cache is None:
+            return None, None
+        if format is not None:  # Same prompt, different answer
+            options = dict(options or {}, format=format)
+        if self.stream:  # A streamed answer may have been stopped once complete: never served to a full request
+            options = dict(options or {}, stream=True)
+        key = self.cache.key(self.model, messages, options)
+        return key, self.cache.get(key)
+
+    def _count_tokens(self, response):
+        # Cached answers cost nothing, so only real responses are counted
+        for field in ('prompt_eval_count', 'eval_count'):
+            try:
+                self.tokens += response[field] or 0
+            except (KeyError, TypeError):
+                pass
+
+    def _cache_store(self, key, content):
+        if key is not None:
+            self.cache.put(key, self.model, content)
+        return content
+
+    def _cache_store_streamed(self, key, content):
+        # An answer cut at max_response_chars is incomplete: it must not be replayed
+        if self.last_stop == "length":
+            return content
+        return self._cache_store(key, content)
+
+
+class _Stream:
+    """Collects the chunks of a streamed answer for an agent and tells when to stop reading."""
+
+    def __init__(self, agent):
+        self.agent = agent
+        self.start = time.perf_counter()
+        self.parts = []
+        self.length = 0
+        self.counted = False
+        agent.last_ttft, agent.last_stop = None, "done"
+
+    def feed(self, chunk):
+        """:return: True when the rest of the answer is not needed."""
+        if self.agent.last_ttft is None:
+            self.agent.last_ttft = time.perf_counter() - self.start
+            if TIMINGS.enabled:
+                TIMINGS.add("llm.ttft", self.agent.last_ttft)
+        content = chunk['message']['content'] or ''
+        self.parts.append(content)
+        self.length += len(content)
+        if chunk['done']:
+            self.agent._count_tokens(chunk)
+            self.counted = True
+            return True
+        if self.length > self.agent.max_response_chars:
+            self.agent.last_stop = "length"
+            return True
+        if self.agent.is_complete("".join(self.parts)):
+            self.agent.last_stop = "complete"
+            return True
+        return False
+
+    def finish(self):
+        """:return: The answer received."""
+        content = "".join(self.parts)
+        if not self.counted:  # Stopped early: the server never sent its counts, estimate them
+            self.agent.tokens += self.agent.last_prompt_tokens + count_tokens(content)
+        return content
+
 
 class Coder(LLMAgent):
-    def __init__(self, model="llama3.2:1b", problem_description=""):
-        super().__init__(model)
+    def __init__(self, model="llama3.2:1b", problem_description="", cache=None, client=None):
+        super().__init__(model, cache, client=client)
         self.problem_description = problem_description
 
-    def generate_code(self, action, review="", previous_code=""):
+    @timed("coder.generate_code")
+    def generate_code(self, action, review="", previous_code="", options=None):
         """
         Generates code based on the problem description.
+        :param options: Sampling options for this request only (e.g. {"temperature": 0.8}).
         :return: Generated code as a string.
         """
-        if review == "":
-            prompt = f"{action} Consider the following problem: {self.problem_description}"
-        else:
-            prompt = (f"{action}. A skilled Python Developer gave you the following feedback to improve your code:\n"
-                        f"{review}\n\nCurrent code to improve:\n{previous_code}\n"
-                        "Send the entire code back everytime, with all functions needed for the program to run smoothly.")
+        prompt = self.build_prompt(action, review, previous_code)
         
-        response = self.generate(prompt)
+        response = self.generate(prompt, options)
         
         # Extract only the code from the response
         return self.extract_code(response)
+
+    def build_prompt(self, action, review="", previous_code=""):
+        """
+        Builds the prompt for the next version of the code.
+        :return: Prompt as a string.
+        """
+        if review == "":
+            return f"{action} Consider the following problem: {self.problem_description}"
+        # Never cut: the code must be sent back whole, and the review already holds condensed
+        # lint output and tracebacks (see Reviewer._generate_report). Only the history makes room
+        return self.prompt_builder.build(
+            (f"{action}. A skilled Python Developer gave you the following feedback to improve your code:\n", None),
+            (review, None),
+            ("\n\nCurrent code to improve:\n", None),
+            (previous_code, None),
+            ("\nSend the entire code back everytime, with all functions needed for the program to run smoothly.", None),
+        )
     
 
+    def is_complete(self, content):
+        # The first fenced block is closed: what follows is usually only explanations
+        return re.search(r"```(?:python)?\n.*?```", content, re.DOTALL) is not None
+
     def extract_code(self, content):
         """
         Extracts code from the response by looking for code blocks.
@@ -71,10 +230,18 @@ class Coder(LLMAgent):
 
 
 class Reviewer(LLMAgent):
-    def __init__(self, model="llama3.2:1b", problem_description=""):
-        super().__init__(model)
+    def __init__(self, model="llama3.2:1b", problem_description="", executor=None, cache=None, client=None,
+                 linter=None):
+        super().__init__(model, cache, client=client)
         self.problem_description = problem_description
+        self.executor = executor if executor is not None else default_executor()
+        self.linter = linter if linter is not None else default_linter()
+        # Structured mode: the scores are asked as a JSON object following review_schema()
+        self.structured = False
+        self.review_stats = ReviewStats()
+        self.last_reasked = ()  # Rubric fields asked again in the last review
 
+    @timed("reviewer.review_code")
     def review_code(self, code, action):
         """
         Reviews the code by performing static analysis, checking for bugs, and generating feedback.
@@ -88,20 +255,14 @@ class Reviewer(LLMAgent):
         success, execution_report = self._execute_code(code)
 
         # Generate detailed feedback
-        prompt = (f"{action} Consider the following problem: {self.problem_description}.\n\n"
-                f"Static Analysis (Ruff):\n{static_analysis_report}\n\n"
-                f"Execution Results:\n{execution_report}\n\n"
-                f"Review the code below and provide detailed feedback based on the following criteria:\n\n"
-                f"1. **Data Analysis (20 points)** - Evaluate the clarity and quality of the data analysis. Give a score from 0 to 20.\n"
-                f"2. **Adherence to PEP-8 (20 points)** - Evaluate the use of good naming practices and PEP-8 compliance. Give a score from 0 to 20.\n"
-                f"3. **Code logic and structure (20 points)** - Evaluate the clarity and efficiency of the code logic and structure. Give a score from 0 to 20.\n"
-                f"4. **Code comments (10 points)** - Evaluate the quantity and clarity of the comments in the code. Give a score from 0 to 10.\n"
-                f"5. **Visualizations (10 points)** - Evaluate the clarity and usefulness of the visualizations. Give a score from 0 to 10.\n"
-                f"6. **Error prevention (10 points)** - Evaluate whether the code implements checks to prevent errors. Give a score from 0 to 10.\n"
-                f"7. **Code optimization (10 points)** - Evaluate the efficiency of the code. Give a score from 0 to 10.\n\n"
-                f"Code to review:\n{code}\n. Don't send any code back to the Coder, just review the code, don't send more code back.")
-
-        feedback = self.generate(prompt)
+        prompt = self.build_prompt(code, action, static_analysis_report, execution_report)
+
+        self.last_reasked = ()
+        if self.structured:
+            feedback = self.generate(prompt, format=review_schema())
+            feedback = self._complete_review(feedback)
+        else:
+            feedback = self.generate(prompt)
         
         # Compile the feedback into a structured report
         report = self._generate_report(static_analysis_report, execution_report, feedback)
@@ -111,58 +272,74 @@ class Reviewer(LLMAgent):
 
         return report, score
 
+    def build_prompt(self, code, action, static_analysis_report, execution_report):
+        """
+        Builds the review prompt with the rubric of the seven scored criteria.
+        :return: Prompt as a string.
+        """
+        # Over the budget, the execution output is cut first, then the Ruff report; the code never is
+        return self.prompt_builder.build(
+            (f"{action} Consider the following problem: {self.problem_description}.\n\n"
+             f"Static Analysis (Ruff):\n", None),
+            (summarize_lint(static_analysis_report), 1),
+            ("\n\nExecution Results:\n", None),
+            (truncate_traceback(execution_report), 0),
+            ("\n\nReview the code below and provide detailed feedback based on the following criteria:\n\n"
+             "1. **Data Analysis (20 points)** - Evaluate the clarity and quality of the data analysis. Give a score from 0 to 20.\n"
+             "2. **Adherence to PEP-8 (20 points)** - Evaluate the use of good naming practices and PEP-8 compliance. Give a score from 0 to 20.\n"
+             "3. **Code logic and structure (20 points)** - Evaluate the clarity and efficiency of the code logic and structure. Give a score from 0 to 20.\n"
+             "4. **Code comments (10 points)** - Evaluate the quantity and clarity of the comments in the code. Give a score from 0 to 10.\n"
+             "5. **Visualizations (10 points)** - Evaluate the clarity and usefulness of the visualizations. Give a score from 0 to 10.\n"
+             "6. **Error prevention (10 points)** - Evaluate whether the code implements checks to prevent errors. Give a score from 0 to 10.\n"
+             "7. **Code optimization (10 points)** - Evaluate the efficiency of the code. Give a score from 0 to 10.\n\n"
+             "Code to review:\n", None),
+            (code, None),
+            ("\n. Don't send any code back to the Coder, just review the code, don't send more code back."
+             + (self._json_instructions() if self.structured else ""), None),
+        )
+
+    def _json_instructions(self):
+        fields = ", ".join(f'"{field}" ({name}, 0 to {maximum})' for field, name, maximum in RUBRIC)
+        return (f'\nAnswer only with a JSON object: "feedback" with your review as text, '
+                f'then one integer score per criterion: {fields}.')
+
+    def _complete_review(self, feedback):
+        """
+        Reads a structured review and asks again, once and only for them, the scores it lacks.
+        :return: The review as JSON text, with the scores of both answers.
+        """
+        review = parse_review(feedback)
+        if review.missing:
+            self.last_reasked = review.missing
+            answer = self.generate(reask_prompt(review), format=review_schema(review.missing))
+            review = review.merge(parse_review(answer, review.missing))
+        return review.to_json()
+
+    def is_complete(self, content):
+        # All seven rubric scores are in. Only JSON reviews can tell: a free-text one repeats the
+        # rubric headings, "(20 points)", which look like scores, so it is always read to the end
+        if self.structured:
+            return not parse_review(content).missing
+        return False
+
+    @timed("reviewer.ruff")
     def _static_analysis_ruff(self, code):
         """
-        Uses Ruff to perform static analysis on the code.
+        Uses Ruff to perform static analysis on the code, fed through stdin.
         :param code: Code to be analyzed.
-        :return: Report from Ruff as a string.
+        :return: LintReport; it formats as the Ruff report text.
         """
-        try:
-            # Save code temporarily to pass it to Ruff
-            temp_file_path = pathlib.Path("temp_code.py").resolve()  # Generate absolute path
-            with open(temp_file_path, "w") as f:
-                f.write(code)
-
-            print(f"Temporary file path for Ruff: {temp_file_path}")  # Debugging path
-
-            # Run Ruff with "check" subcommand
-            ruff_result = subprocess.run(
-                ["ruff", "check", str(temp_file_path)],
-                capture_output=True,
-                text=True
-            )
-            if ruff_result.returncode == 0:
-                return ruff_result.stdout
-            else:
-                return f"Ruff Error: {ruff_result.stderr}"
-        except FileNotFoundError:
-            return "Error: Ruff is not installed or not found in the system PATH."
-        except Exception as e:
-            print(f"Error running Ruff: {e}")
-            return "Error: Could not complete static analysis with Ruff."
+        return self.linter.check(code)
 
+    @timed("reviewer.execute")
     def _execute_code(self, code):
         """
         Executes the code to check for runtime errors.
         :param code: Code to be executed.
         :return: Tuple (success: bool, output: str).
         """
-        try:
-            result = subprocess.run(
-                [sys.executable, "-c", code],
-                capture_output=True,
-                text=True,
-                timeout=30 # kind of big, but it worked better with a big timer
-            )
-            if result.returncode == 0:
-                return True, "Code executed successfully."
-            else:
-                return False, result.stderr
-        except subprocess.TimeoutExpired:
-            return False, "Error: Code execution timed out."
-        except Exception as e:
-            print(f"Error during execution: {e}")
-            return False, f"Error during execution: {e}"
+        # Shared with the Environment and the monitor, so the code only runs once
+        return self.executor.execute_code(code)
 
     def _generate_report(self, static_analysis_report, execution_report, feedback):
         """
@@ -172,10 +349,11 @@ class Reviewer(LLMAgent):
         :param feedback: Feedback generated based on code quality.
         :return: Combined report as a string.
         """
+        # The report is the next Coder prompt's feedback, so the Ruff output and the tracebacks are condensed
         report = (
             f"=== Code Review Report ===\n\n"
-            f"Static Analysis (Ruff):\n{static_analysis_report}\n\n"
-            f"Execution Results:\n{execution_report}\n\n"
+            f"Static Analysis (Ruff):\n{summarize_lint(static_analysis_report)}\n\n"
+            f"Execution Results:\n{truncate_traceback(execution_report)}\n\n"
             f"Reviewer Feedback:\n{feedback}\n"
         )
         return report
@@ -183,7 +361,7 @@ class Reviewer(LLMAgent):
     def _calculate_score(self, static_analysis_report, success, feedback):
         """
         Calculates a score based on the static analysis results, execution success, and reviewer feedback.
-        :param static_analysis_report: Results from static analysis.
+        :param static_analysis_report: LintReport from static analysis.
         :param success: Boolean indicating if the code executed successfully.
         :param feedback: The feedback string containing the scores.
         :return: Calculated score based on review quality.
@@ -195,10 +373,13 @@ class Reviewer(LLMAgent):
             # Default scores if extraction fails
             scores = [0, 0, 0, 0, 0, 0, 0]
             total_score = -1
+            self.review_stats.record(True, self.last_reasked)
             return total_score
+        # A structured review still lacking scores after the re-ask is only partly scored
+        self.review_stats.record(self.structured and len(scores) < len(RUBRIC), self.last_reasked)
 
 
-        static_issues = static_analysis_report.count("\n")  # Count lines in the Ruff report
+        static_issues = static_analysis_report.issue_count  # Number of Ruff diagnostics
         static_score = max(-20, 10 - static_issues)  # Deduct points for each issue
 
         execution_score = 20 if success else -20  # Reward for successful execution
@@ -212,10 +393,14 @@ class Reviewer(LLMAgent):
         :param feedback: The feedback string containing the scores.
         :return: Tuple with a list of individual scores and the total score.
         """
+        if self.structured:
+            review = parse_review(feedback)
+            if not review.scores:
+                raise ValueError("Scores not found in the feedback.")
+            return list(review.scores.values()), review.total
 
         # Regular expression to match scores in almost any format with "(X 'something')"
-        pattern = r"\(\s*(\d+)\s*(?:[^)]*)?\)"
-        scores = re.findall(pattern, feedback)  # Extract all scores as strings
+        scores = re.findall(SCORE_PATTERN, feedback)  # Extract all scores as strings
         
         if scores:
             scores = list(map(int, scores))  # Convert to a list of integers
@@ -225,38 +410,80 @@ class Reviewer(LLMAgent):
             raise ValueError("Scores not found in the feedback.")
             
 class MonitoringAndFeedbackAgent:
-    def __init__(self):
+    def __init__(self, executor=None, sampler=None, verbose=True):
         # Inicialização do agente com valores padrão
+        self.verbose = verbose  # Imprime o feedback gerado
         self.start_time = None
         self.end_time = None
+        self.last_result = None  # Última execução monitorada
+        self.executor = executor if executor is not None else default_executor()
+        # Amostragem em segundo plano, para que as leituras nunca precisem esperar
+        # (a do executor, se ele já tiver uma)
+        if sampler is None:
+            sampler = self.executor.sampler
+        self.owns_sampler = sampler is None  # Só para em close() a amostragem que ele mesmo iniciou
+        self.sampler = sampler if sampler is not None else ResourceSampler().start()
+        if self.executor.sampler is None:
+            self.executor.attach_sampler(self.sampler)
+
+    def close(self):
+        """Para a thread de amostragem, se foi este agente que a iniciou."""
+        if self.owns_sampler:
+            self.sampler.stop()
 
+    @timed("monitor.execution_time")
     def monitor_execution_time(self, code):
         """
         Monitora o tempo de execução de um código e retorna o tempo gasto.
+        O resultado vem do executor compartilhado, então o tempo é o da execução real
+        do programa mesmo quando ele já tinha sido executado antes, e a execução está
+        sujeita ao timeout e aos limites de recursos do executor.
         """
-        self.start_time = time.time()  # Começa a medir o tempo
-        result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True)
-        self.end_time = time.time()  # Termina a medição do tempo
-        execution_time = self.end_time - self.start_time
+        result = self.executor.run(code)
+        self.last_result = result
+        self.start_time = time.time() - result.wall_time
+        self.end_time = self.start_time + result.wall_time
+        execution_time = result.wall_time
         return result, execution_time
 
-    def monitor_resource_usage(self):
+    @timed("monitor.resource_usage")
+    def monitor_resource_usage(self, seconds=1.0):
         """
         Monitora o uso de memória e CPU durante a execução.
+        Lê os agregados do amostrador sem bloquear: do processo que executou o último código
+        monitorado ou, se nenhum código foi executado ainda, do treinador nos últimos `seconds`.
         """
-        # Obtém informações do sistema de recursos
-        process = psutil.Process(os.getpid())
-        memory_usage = process.memory_info().rss / (1024 * 1024)  # Memória usada em MB
-        cpu_usage = psutil.cpu_percent(interval=1)  # Percentual de uso de CPU
+        result = self.last_result
+        if result is None:
+            stats = self.sampler.window(seconds)
+            if stats is None or stats["cpu_percent"] is None:
+                process = psutil.Process(os.getpid())
+                return process.memory_info().rss / (1024 * 1024), process.cpu_percent(None)
+            return stats["peak_rss"] / (1024 * 1024), stats["cpu_percent"]
+
+        stats = None
+        if result.pid is not None and result.start_time is not None:
+            end = result.start_time + result.wall_time + self.sampler.interval
+            stats = self.sampler.window(pid=result.pid, start=result.start_time, end=end)
+
+        # Sem amostras (execução vinda do cache ou rápida demais): usa os números da própria execução
+        memory_usage = max(stats["peak_rss"] if stats else 0, result.peak_rss or 0) / (1024 * 1024)  # Pico em MB
+        if stats and stats["cpu_percent"] is not None:
+            cpu_usage = stats["cpu_percent"]  # Percentual médio de uso de CPU
+        else:
+            cpu_usage = result.usage.cpu_percent or 0.0
         return memory_usage, cpu_usage
 
+    @timed("monitor.provide_feedback")
     def provide_feedback(self, code, score):
         """
         Fornece feedback contínuo sobre o código e o modelo.
         """
-        # Monitoramento do modelo
+        # Monitoramento do processo que executou o código, não do treinador
         result, execution_time = self.monitor_execution_time(code)
-        memory_usage, cpu_usage = self.monitor_resource_usage()
+        usage = result.usage
+        memory_usage = (usage.peak_rss or 0) / (1024 * 1024)  # Pico de memória em MB
+        cpu_usage = usage.cpu_percent or 0.0  # Tempo de CPU sobre o tempo de execução
 
         feedback = f"""
         === Performance Feedback ===
@@ -264,8 +491,17 @@ class MonitoringAndFeedbackAgent:
         Uso de memória: {memory_usage:.2f} MB
         Uso de CPU: {cpu_usage:.2f}%
         """
+        if usage.user_time is not None:
+            feedback += f"Tempo de CPU (usuário/sistema): {usage.user_time:.2f}s / {usage.system_time:.2f}s\n        "
+        if usage.minor_faults is not None:
+            feedback += f"Page faults (menores/maiores): {usage.minor_faults} / {usage.major_faults}\n        "
+        if usage.read_bytes is not None:
+            feedback += (f"Leitura/escrita: {usage.read_bytes / (1024 * 1024):.2f} MB / "
+                         f"{usage.write_bytes / (1024 * 1024):.2f} MB\n        ")
         
         # Sugestões de melhorias
+        if result.failure is not None:
+            feedback += f"\nExecução interrompida: {result.report()[1].splitlines()[0]}"
         if execution_time > 10:
             feedback += "\nSugestão: O tempo de execução está muito alto. Considere otimizar o algoritmo."
         if memory_usage > 150:
@@ -274,6 +510,7 @@ class MonitoringAndFeedbackAgent:
             feedback += "\nSugestão: O código está utilizando muita CPU. Tente otimizar a complexidade do algoritmo."
 
         # Imprimir feedback
-        print("Feedback gerado:\n", feedback)
+        if self.verbose:
+            print("Feedback gerado:\n", feedback)
 
         return feedback
\ No newline at end of file
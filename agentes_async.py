@@ -0,0 +1,150 @@
+import asyncio
+import os
+import time
+
+import ollama
+
+from agentes import LLMAgent, Coder, Reviewer, _Stream
+from scoring import parse_review, reask_prompt, review_schema
+from timing import span, timed
+
+
+class AsyncModelClient:
+    """
+    One connection pool to the model server, shared by every async agent.
+    At most `max_concurrency` requests are in flight and each one is cancelled after `timeout` seconds.
+    """
+
+    def __init__(self, host=None, max_concurrency=4, timeout=120, client=None):
+        # ollama.AsyncClient keeps its HTTP connections alive between requests
+        self.client = client if client is not None else make_async_client(host=host)
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+        self.timeout = timeout
+
+    async def chat(self, model, messages, stream=False, **kwargs):
+        if stream:
+            return self._stream(model, messages, **kwargs)
+        async with self.semaphore:
+            return await asyncio.wait_for(self.client.chat(model=model, messages=messages, **kwargs), self.timeout)
+
+    async def _stream(self, model, messages, **kwargs):
+        # The request keeps its slot until the stream ends or is closed, and the timeout covers all of it
+        async with self.semaphore:
+            deadline = time.monotonic() + self.timeout
+            chunks = await asyncio.wait_for(self.client.chat(model=model, messages=messages, stream=True, **kwargs),
+                                            self.timeout)
+            try:
+                while True:
+                    try:
+                        chunk = await asyncio.wait_for(anext(chunks), deadline - time.monotonic())
+                    except StopAsyncIteration:
+                        return
+                    yield chunk
+            finally:
+                await chunks.aclose()
+
+
+def make_async_client(backend=None, host=None):
+    """
+    Async counterpart of agentes.make_client.
+    :param backend: "ollama" or "mock"; read from LLM_BACKEND when None.
+    """
+    backend = backend or os.environ.get("LLM_BACKEND", "ollama")
+    if backend == "mock":
+        from mock_ollama import AsyncMockClient
+        return AsyncMockClient()
+    return ollama.AsyncClient(host=host)
+
+
+class AsyncLLMAgent(LLMAgent):
+    def __init__(self, model="llama3.2:1b", client=None, cache=None):
+        LLMAgent.__init__(self, model, cache)
+        self.client = client if client is not None else AsyncModelClient()
+
+    async def generate(self, prompt, options=None, format=None):
+        """Sends a prompt to the model and receives a response without blocking the event loop."""
+        options = options if options is not None else self.options
+        messages = self._messages(prompt)
+        key, cached = self._cache_lookup(messages, options, format)
+        if cached is not None:
+            return cached
+        extra = {} if format is None else {'format': format}
+        try:
+            with span("llm.chat"):
+                if self.stream:
+                    return self._cache_store_streamed(key, await self._stream_chat(messages, options, extra))
+                response = await self.client.chat(self.model, messages, options=options, **extra)
+            self._count_tokens(response)
+            return self._cache_store(key, response['message']['content'])
+
+        except asyncio.TimeoutError:
+            print("Error calling ollama.chat: request timed out")
+            return "Error generating code: exception in model call."
+        except Exception as e:
+            print(f"Error calling ollama.chat: {e}")
+            return "Error generating code: exception in model call."
+
+
+    async def _stream_chat(self, messages, options, extra):
+        stream = _Stream(self)
+        chunks = await self.client.chat(self.model, messages, options=options, stream=True, **extra)
+        try:
+            async for chunk in chunks:
+                if stream.feed(chunk):
+                    break
+        finally:
+            await chunks.aclose()  # Closes the connection, so the server stops generating
+        return stream.finish()
+
+
+class AsyncCoder(AsyncLLMAgent, Coder):
+    def __init__(self, model="llama3.2:1b", problem_description="", client=None, cache=None):
+        Coder.__init__(self, model, problem_description, cache, client if client is not None else AsyncModelClient())
+
+    @timed("coder.generate_code")
+    async def generate_code(self, action, review="", previous_code="", options=None):
+        """
+        Generates code based on the problem description.
+        :return: Generated code as a string.
+        """
+        response = await self.generate(self.build_prompt(action, review, previous_code), options)
+        return self.extract_code(response)
+
+
+class AsyncReviewer(AsyncLLMAgent, Reviewer):
+    def __init__(self, model="llama3.2:1b", problem_description="", executor=None, client=None, cache=None,
+                 linter=None):
+        Reviewer.__init__(self, model, problem_description, executor, cache,
+                          client if client is not None else AsyncModelClient(), linter)
+
+    @timed("reviewer.review_code")
+    async def review_code(self, code, action):
+        """
+        Reviews the code like Reviewer.review_code, running Ruff and the execution at the same time.
+        :param code: Code to be reviewed.
+        :return: Feedback and total score.
+        """
+        static_analysis_report, (success, execution_report) = await asyncio.gather(
+            asyncio.to_thread(self._static_analysis_ruff, code),
+            asyncio.to_thread(self._execute_code, code),
+        )
+
+        prompt = self.build_prompt(code, action, static_analysis_report, execution_report)
+        self.last_reasked = ()
+        if self.structured:
+            feedback = await self._complete_review(await self.generate(prompt, format=review_schema()))
+        else:
+            feedback = await self.generate(prompt)
+
+        report = self._generate_report(static_analysis_report, execution_report, feedback)
+        score = self._calculate_score(static_analysis_report, success, feedback)
+        return report, score
+
+    async def _complete_review(self, feedback):
+        """Reviewer._complete_review without blocking the event loop."""
+        review = parse_review(feedback)
+        if review.missing:
+            self.last_reasked = review.missing
+            answer = await self.generate(reask_prompt(review), format=review_schema(review.missing))
+            review = review.merge(parse_review(answer, review.missing))
+        return review.to_json()
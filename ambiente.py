@@ -1,13 +1,16 @@
-import ast
-import subprocess
-import sys
 import matplotlib.pyplot as plt
+from analysis import default_analyzer
+from sandbox import default_executor
+from timing import timed
 
 class Environment:
-    def __init__(self, threshold_score=50, expected_output=None, max_iterations=100):
+    def __init__(self, threshold_score=50, expected_output=None, max_iterations=100, executor=None, analyzer=None):
         self.threshold_score = threshold_score  # Minimum score to consider the code satisfactory
         self.expected_output = expected_output  # Expected output for code correctness check
         self.max_iterations = max_iterations
+        self.executor = executor if executor is not None else default_executor()  # Shared with the Reviewer
+        self.last_execution = None  # ExecutionResult of the last code run, with the child's resource usage
+        self.analyzer = analyzer if analyzer is not None else default_analyzer()  # Parses each program once
 
     def calculate_reward(self, score, agent_type="coder", iteration=0):
         """
@@ -27,34 +30,22 @@ class Environment:
             print(f"Error calculating reward: {e}")
             return -1.0  # Default to maximum penalty on error
 
+    @timed("environment.execute_code")
     def execute_code(self, code):
         """
         Executes the code to check for runtime errors.
         :param code: Code to be executed.
         :return: Tuple (success: bool, output: str).
         """
-        try:
-            result = subprocess.run(
-                [sys.executable, "-c", code],
-                capture_output=True,
-                text=True,
-                timeout=30 # kind of big, but it worked better with a big timer
-            )
-            if result.returncode == 0:
-                if 'matplotlib.pyplot' in code:
-                    plt.close()
-                    plt.close()
-                    plt.close()
-                    plt.close()
-                    plt.close()
-                return True, "Code executed successfully."
-            else:
-                return False, result.stderr
-        except subprocess.TimeoutExpired:
-            return False, "Error: Code execution timed out."
-        except Exception as e:
-            print(f"Error during execution: {e}")
-            return False, f"Error during execution: {e}"
+        self.last_execution = self.executor.run(code)
+        success, output = self.last_execution.report()
+        if success and 'matplotlib.pyplot' in code:
+            plt.close()
+            plt.close()
+            plt.close()
+            plt.close()
+            plt.close()
+        return success, output
 
     def check_correctness(self, code_output):
         """
@@ -64,25 +55,22 @@ class Environment:
         """
         return code_output == self.expected_output
 
+    @timed("environment.analyze_code")
+    def analyze_code(self, code):
+        """
+        Computes every static metric of the code in a single pass, memoized by code hash.
+        :param code: Code to be analyzed.
+        :return: CodeMetrics.
+        """
+        return self.analyzer.analyze(code)
+
     def analyze_code_quality(self, code):
         """
         Analyzes code quality using a simple static analysis.
         :param code: Code to be analyzed.
         :return: A score representing code quality.
         """
-        issues = []
-        try:
-            tree = ast.parse(code)
-            for node in ast.walk(tree):
-                if isinstance(node, ast.FunctionDef):
-                    issues.append(f"Function '{node.name}' found.")
-                elif isinstance(node, ast.Assign):
-                    issues.append("Global variable assignment found.")
-            if not issues:
-                return 10  # Perfect score for no issues
-            return max(0, 10 - len(issues))  # Deduct points based on issues found
-        except SyntaxError:
-            return 0  # Lowest quality score if there's a syntax error
+        return self.analyze_code(code).quality_score  # One point off per function and assignment
 
     def calculate_complexity(self, code):
         """
@@ -90,15 +78,12 @@ class Environment:
         :param code: Code to be analyzed.
         :return: Complexity score (lower is simpler).
         """
-        try:
-            lines_of_code = len(code.splitlines())
-            tree = ast.parse(code)
-            function_count = sum(1 for node in ast.walk(tree) if isinstance(node, ast.FunctionDef))
-            return lines_of_code + function_count * 2  # Basic complexity formula
-        except Exception as e:
-            print(f"Error calculating complexity: {e}")
-            return float('inf')  # Infinite complexity on error
+        metrics = self.analyze_code(code)
+        if not metrics.valid:
+            print(f"Error calculating complexity: {metrics.syntax_error}")
+        return metrics.complexity_score  # Lines plus two per function, infinite on error
 
+    @timed("environment.reward_coder")
     def reward_coder(self, code, reviewer_score, iteration=0):
         """
         Rewards the coder based on code quality, correctness, and complexity.
@@ -142,6 +127,7 @@ class Environment:
         return correctness_reward + complexity_penalty + reviewer_penalty +  time_adjustment
 
 
+    @timed("environment.reward_reviewer")
     def reward_reviewer(self, previous_score, current_score):
         """
         Rewards the reviewer based on improvements in the analytic report's score.
@@ -0,0 +1,275 @@
+import ast
+import collections
+import re
+import threading
+
+from sandbox import code_hash
+
+# Methods that walk a DataFrame row by row (or column by column) in Python
+ROW_ITERATORS = frozenset({"iterrows", "itertuples", "items", "iteritems"})
+# pandas constructors and readers whose result is tracked as a DataFrame
+DATAFRAME_FACTORIES = frozenset({"DataFrame", "read_csv", "read_excel", "read_json", "read_parquet", "read_sql"})
+
+
+class CodeMetrics(collections.namedtuple(
+        "CodeMetrics",
+        ["code_hash", "valid", "syntax_error", "lines", "loc", "function_count", "assign_count",
+         "cyclomatic_complexity", "max_nesting_depth", "imports", "iterrows_calls", "dataframe_loops"])):
+    """
+    Everything the environment measures on a program, from a single parse.
+    lines counts every line and loc only the lines with code (no blanks or comments).
+    imports is a frozenset of the imported module names. iterrows_calls counts calls to
+    the row iterators of pandas, dataframe_loops the `for` loops running over a DataFrame.
+    When valid is False, syntax_error holds the message and the AST metrics are zero.
+    """
+    __slots__ = ()
+
+    @property
+    def quality_score(self):
+        """Environment.analyze_code_quality: 10 minus one point per function and assignment."""
+        if not self.valid:
+            return 0  # Lowest quality score if there's a syntax error
+        return max(0, 10 - (self.function_count + self.assign_count))
+
+    @property
+    def complexity_score(self):
+        """Environment.calculate_complexity: lines plus two per function, infinite when it does not parse."""
+        if not self.valid:
+            return float('inf')
+        return self.lines + self.function_count * 2
+
+
+# Metrics of one top-level statement, and the DataFrame names known after it
+_BlockMetrics = collections.namedtuple(
+    "_BlockMetrics", ["function_count", "assign_count", "branches", "max_depth", "imports", "iterrows_calls",
+                      "dataframe_loops", "pandas_aliases", "dataframes"])
+
+
+class CodeAnalyzer:
+    """
+    Parses each program once and computes all its metrics in one visit of the tree.
+    Results are memoized by the hash of the code text, in an LRU of `max_entries`.
+    The metrics of each top-level function or block are memoized as well (in an LRU of
+    `max_blocks`), so a lightly edited program only visits the statements that changed.
+    """
+
+    def __init__(self, max_entries=256, max_blocks=4096):
+        self.max_entries = max_entries
+        self._cache = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self.blocks = _BlockCache(max_blocks)
+        self.hits = 0
+        self.misses = 0
+
+    def analyze(self, code):
+        """
+        Returns the metrics of the code, computing them only the first time it is seen.
+        :param code: Source code as a string.
+        :return: CodeMetrics.
+        """
+        key = code_hash(code)
+        with self._lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                self.hits += 1
+                return self._cache[key]
+            self.misses += 1
+
+        metrics = compute_metrics(code, key, self.blocks)
+        with self._lock:
+            self._cache[key] = metrics
+            while len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
+        return metrics
+
+
+def compute_metrics(code, key=None, blocks=None):
+    """
+    Computes the metrics of a program, one top-level statement at a time.
+    :param key: Code hash, computed when not given.
+    :param blocks: Optional _BlockCache holding the metrics of statements seen before.
+    :return: CodeMetrics.
+    """
+    key = key if key is not None else code_hash(code)
+    lines = code.splitlines()
+    loc = sum(1 for line in lines if line.strip() and not line.strip().startswith("#"))
+    try:
+        tree = ast.parse(code)
+    except (SyntaxError, ValueError) as e:  # ValueError: null bytes in the source
+        return CodeMetrics(key, False, str(e), len(lines), loc, 0, 0, 0, 0, frozenset(), 0, 0)
+
+    source_lines = re.split(r"\r\n|\r|\n", code)  # The same line breaks as the AST positions
+    totals = collections.Counter()
+    max_depth, imports = 0, set()
+    pandas_aliases, dataframes = frozenset(), frozenset()
+    for statement in tree.body:
+        block_key = None
+        if blocks is not None:
+            # A statement's metrics depend on its text and on the DataFrames defined before it
+            first = min([statement.lineno] + [d.lineno for d in getattr(statement, "decorator_list", [])])
+            text = "\n".join(source_lines[first - 1:statement.end_lineno])
+            block_key = (code_hash(text), statement.col_offset, statement.end_col_offset, pandas_aliases, dataframes)
+            block = blocks.get(block_key)
+        if block_key is None or block is None:
+            block = _visit_block(statement, pandas_aliases, dataframes)
+            if block_key is not None:
+                blocks.put(block_key, block)
+
+        totals.update(function_count=block.function_count, assign_count=block.assign_count,
+                      branches=block.branches, iterrows_calls=block.iterrows_calls,
+                      dataframe_loops=block.dataframe_loops)
+        max_depth = max(max_depth, block.max_depth)
+        imports |= block.imports
+        pandas_aliases, dataframes = block.pandas_aliases, block.dataframes
+
+    return CodeMetrics(key, True, None, len(lines), loc, totals["function_count"], totals["assign_count"],
+                       1 + totals["branches"], max_depth, frozenset(imports), totals["iterrows_calls"],
+                       totals["dataframe_loops"])
+
+
+def _visit_block(statement, pandas_aliases, dataframes):
+    visitor = _MetricsVisitor(pandas_aliases, dataframes)
+    visitor.visit(statement)
+    return _BlockMetrics(visitor.function_count, visitor.assign_count, visitor.complexity - 1, visitor.max_depth,
+                         frozenset(visitor.imports), visitor.iterrows_calls, visitor.dataframe_loops,
+                         frozenset(visitor.pandas_aliases), frozenset(visitor.dataframes))
+
+
+class _BlockCache:
+    """Thread-safe LRU of _BlockMetrics."""
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            if key not in self._entries:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return self._entries[key]
+
+    def put(self, key, block):
+        with self._lock:
+            self._entries[key] = block
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+class _MetricsVisitor(ast.NodeVisitor):
+    # Statements whose body is one level deeper
+    BLOCKS = (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef, ast.If, ast.For, ast.AsyncFor, ast.While,
+              ast.With, ast.AsyncWith, ast.Try, ast.ExceptHandler)
+    # Nodes that add a path through the code
+    BRANCHES = (ast.If, ast.For, ast.AsyncFor, ast.While, ast.ExceptHandler, ast.IfExp, ast.Assert)
+
+    def __init__(self, pandas_aliases=(), dataframes=()):
+        self.function_count = 0
+        self.assign_count = 0
+        self.complexity = 1
+        self.depth = 0
+        self.max_depth = 0
+        self.imports = set()
+        self.iterrows_calls = 0
+        self.dataframe_loops = 0
+        self.pandas_aliases = set(pandas_aliases)
+        self.dataframes = set(dataframes)  # Names bound to a DataFrame somewhere in the program
+
+    def generic_visit(self, node):
+        if isinstance(node, self.BRANCHES):
+            self.complexity += 1
+        elif isinstance(node, ast.BoolOp):
+            self.complexity += len(node.values) - 1
+        elif isinstance(node, ast.comprehension):
+            self.complexity += 1 + len(node.ifs)
+        elif isinstance(node, getattr(ast, "match_case", ())):
+            self.complexity += 1
+
+        if isinstance(node, self.BLOCKS):
+            self.depth += 1
+            self.max_depth = max(self.max_depth, self.depth)
+            super().generic_visit(node)
+            self.depth -= 1
+        else:
+            super().generic_visit(node)
+
+    def visit_FunctionDef(self, node):
+        self.function_count += 1
+        self.generic_visit(node)
+
+    def visit_Import(self, node):
+        for alias in node.names:
+            self.imports.add(alias.name)
+            if alias.name == "pandas":
+                self.pandas_aliases.add(alias.asname or alias.name)
+        self.generic_visit(node)
+
+    def visit_ImportFrom(self, node):
+        if node.module and not node.level:
+            self.imports.add(node.module)
+            if node.module == "pandas":
+                self.pandas_aliases.update(alias.asname or alias.name for alias in node.names
+                                           if alias.name in DATAFRAME_FACTORIES)
+        self.generic_visit(node)
+
+    def visit_Assign(self, node):
+        self.assign_count += 1
+        if self._is_dataframe(node.value):
+            self.dataframes.update(target.id for target in node.targets if isinstance(target, ast.Name))
+        self.generic_visit(node)
+
+    def visit_Call(self, node):
+        if isinstance(node.func, ast.Attribute) and node.func.attr == "iterrows":
+            self.iterrows_calls += 1
+        self.generic_visit(node)
+
+    def visit_For(self, node):
+        if self._loops_over_dataframe(node.iter):
+            self.dataframe_loops += 1
+        self.generic_visit(node)
+
+    def _is_dataframe(self, node):
+        """Tells whether an expression builds a DataFrame: pd.read_csv(...), df.copy(), df[...]..."""
+        if isinstance(node, ast.Call):
+            func = node.func
+            if isinstance(func, ast.Name):
+                return func.id in self.pandas_aliases
+            if isinstance(func, ast.Attribute):
+                if isinstance(func.value, ast.Name) and func.value.id in self.pandas_aliases:
+                    return func.attr in DATAFRAME_FACTORIES
+                return self._is_dataframe(func.value)  # Method chains on a DataFrame
+            return False
+        if isinstance(node, ast.Subscript):
+            return self._is_dataframe(node.value)
+        return isinstance(node, ast.Name) and node.id in self.dataframes
+
+    def _loops_over_dataframe(self, node):
+        if isinstance(node, ast.Call):
+            func = node.func
+            if isinstance(func, ast.Attribute) and func.attr in ROW_ITERATORS:
+                return self._is_dataframe(func.value) or func.attr == "iterrows"
+            # for i in range(len(df)):
+            if isinstance(func, ast.Name) and func.id == "range" and node.args:
+                size = node.args[-1] if len(node.args) > 1 else node.args[0]
+                return (isinstance(size, ast.Call) and isinstance(size.func, ast.Name) and size.func.id == "len"
+                        and bool(size.args) and self._is_dataframe(size.args[0]))
+            return False
+        return self._is_dataframe(node)
+
+
+_default_analyzer = None
+_default_lock = threading.Lock()
+
+
+def default_analyzer():
+    """Returns the analyzer shared by every environment that was not given one explicitly."""
+    global _default_analyzer
+    with _default_lock:
+        if _default_analyzer is None:
+            _default_analyzer = CodeAnalyzer()
+        return _default_analyzer
@@ -0,0 +1,287 @@
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import pathlib
+import platform
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from agentes import Reviewer
+from ambiente import Environment
+from analysis import CodeAnalyzer
+from dataset import SalesGenerator
+from lint import RuffLinter
+from main import run_episode, run_episode_async
+from mock_ollama import CODE_TEMPLATES, MockModel, MockClient, AsyncMockClient
+from qlearning import QLearning
+from sandbox import CodeExecutor, ResourceLimits
+
+ROOT = pathlib.Path(__file__).resolve().parent
+FORMAT_VERSION = 1
+
+
+def load_corpus(synthesized=2, seed=0):
+    """
+    Fixed set of generated programs the benchmarks run on: temp_code.py, iterations_old/*.py,
+    the mock model's templates and `synthesized` variants of each (comment and whitespace edits,
+    an iterrows loop, a syntax error), so the same seed always gives the same corpus.
+    :return: List of (name, code) tuples.
+    """
+    programs = []
+    for path in [ROOT / "temp_code.py"] + sorted((ROOT / "iterations_old").glob("*.py")):
+        if path.exists():
+            programs.append((path.relative_to(ROOT).as_posix(), path.read_text(encoding="latin-1")))
+    programs += [(f"mock_template_{i}", code) for i, code in enumerate(CODE_TEMPLATES)]
+
+    rng = random.Random(seed)
+    variants = []
+    for name, code in programs:
+        for i in range(synthesized):
+            variants.append((f"{name}~{i}", _synthesize(code, rng)))
+    return programs + variants
+
+
+def _synthesize(code, rng):
+    lines = code.splitlines()
+    edit = rng.choice(("comments", "loop", "syntax_error"))
+    if edit == "comments":
+        for _ in range(rng.randint(1, 5)):
+            lines.insert(rng.randint(0, len(lines)), f"# note {rng.randint(0, 999)}")
+    elif edit == "loop":
+        lines += ["", "total = 0", "for index, row in df.iterrows():", "    total += 1", "print(total)"]
+    else:
+        lines.insert(rng.randint(0, len(lines)), "def broken(:")
+    return "\n".join(lines) + "\n"
+
+
+def review_feedbacks(count=50, seed=0):
+    """Reviews as the mock model writes them, to benchmark the score parsing."""
+    model = MockModel(seed=seed)
+    return [model._review(call) for call in range(1, count + 1)]
+
+
+def measure(func, repeats=5, warmup=1):
+    """
+    Times `func` (called without arguments) `repeats` times after `warmup` untimed calls.
+    :return: Dict with the duration of every repeat and their min, median and mean, in seconds.
+    """
+    for _ in range(warmup):
+        func()
+    durations = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        func()
+        durations.append(time.perf_counter() - start)
+    return {"repeats": durations, "min": min(durations), "median": statistics.median(durations),
+            "mean": statistics.fmean(durations)}
+
+
+def micro_benchmarks(corpus, repeats=5, backend="forkserver", sales_rows=None):
+    """
+    One benchmark per component, each going over the whole corpus with cold caches,
+    so it measures the work and not the memoization (the cache hit path is timed separately).
+    :param sales_rows: Runs the programs on a synthetic Sales.csv of this many rows instead of the real one.
+    :return: Dict benchmark name -> measurement.
+    """
+    codes = [code for _, code in corpus]
+    feedbacks = review_feedbacks()
+    reviewer = Reviewer.__new__(Reviewer)  # _getScore needs no model nor executor
+    reviewer.structured = False  # Times the free-text parsing
+    results = {}
+
+    executor = CodeExecutor(backend=backend, limits=ResourceLimits())
+    environment = Environment(executor=executor)
+
+    def execute_cold():
+        executor.clear()
+        for code in codes:
+            environment.execute_code(code)
+
+    def execute_cached():
+        for code in codes:
+            environment.execute_code(code)
+
+    with _scratch_directory(sales_rows):  # The programs read Sales.csv and save their plots next to it
+        results["environment.execute_code"] = measure(execute_cold, repeats)
+        results["environment.execute_code.cached"] = measure(execute_cached, repeats)
+    executor.close()
+
+    probe = RuffLinter().check("")
+    if probe.error is None:
+        results["reviewer.ruff"] = measure(lambda: _lint_all(codes), repeats)
+    else:
+        print(f"Skipping reviewer.ruff: {probe.error}")
+
+    results["reviewer.get_score"] = measure(lambda: [reviewer._getScore(feedback) for feedback in feedbacks], repeats)
+    results["analysis.compute_metrics"] = measure(lambda: _analyze_all(codes), repeats)
+
+    transitions = _transitions(10000)
+    results["qlearning.update_q_value"] = measure(lambda: _update_one_by_one(transitions), repeats)
+    results["qlearning.update_many"] = measure(lambda: _update_batched(transitions), repeats)
+    return results
+
+
+def _lint_all(codes):
+    linter = RuffLinter(max_entries=0)
+    for code in codes:
+        linter.check(code)
+
+
+def _analyze_all(codes):
+    analyzer = CodeAnalyzer()
+    for code in codes:
+        analyzer.analyze(code)
+
+
+def _transitions(count, state_space_size=4, actions=3, seed=0):
+    rng = np.random.default_rng(seed)
+    return (rng.integers(state_space_size, size=count), rng.integers(actions, size=count),
+            rng.uniform(-1, 1, size=count), rng.integers(state_space_size, size=count))
+
+
+def _update_one_by_one(transitions):
+    qlearning = QLearning(["a", "b", "c"], 4)
+    for state, action, reward, next_state in zip(*transitions):
+        qlearning.update_q_value(state, action, reward, next_state)
+
+
+def _update_batched(transitions, batch_size=32):
+    qlearning = QLearning(["a", "b", "c"], 4)
+    states, actions, rewards, next_states = transitions
+    for start in range(0, len(states), batch_size):
+        batch = slice(start, start + batch_size)
+        qlearning.update_many(states[batch], actions[batch], rewards[batch], next_states[batch])
+
+
+def macro_benchmarks(iterations=10, repeats=3, latency=0.0, backend="forkserver", sales_rows=None):
+    """
+    Whole training loops of `iterations` iterations against the mock model, sync and async,
+    each run in a scratch directory holding a copy of Sales.csv (or a synthetic one of `sales_rows` rows).
+    :return: Dict benchmark name -> measurement, with the time per iteration added.
+    """
+    results = {}
+    for name, use_async in (("loop.sync", False), ("loop.async", True)):
+        def episode():
+            model = MockModel(latency=("constant", latency), seed=0)
+            executor = CodeExecutor(backend=backend, limits=ResourceLimits(), incremental=True)
+            with _scratch_directory(sales_rows):
+                if use_async:
+                    asyncio.run(run_episode_async(max_iterations=iterations, executor=executor, verbose=False,
+                                                  llm_client=AsyncMockClient(model)))
+                else:
+                    run_episode(max_iterations=iterations, executor=executor, verbose=False,
+                                llm_client=MockClient(model))
+            executor.close()
+
+        random.seed(0)
+        result = measure(episode, repeats, warmup=0)
+        result["per_iteration"] = result["median"] / iterations
+        results[f"{name}.{iterations}"] = result
+    return results
+
+
+@contextlib.contextmanager
+def _scratch_directory(sales_rows=None):
+    previous = os.getcwd()
+    with tempfile.TemporaryDirectory(prefix="benchmark_") as directory:
+        if sales_rows:
+            SalesGenerator(sales_rows).write(os.path.join(directory, "Sales.csv"))
+        else:
+            shutil.copy(ROOT / "Sales.csv", directory)
+        os.chdir(directory)
+        try:
+            with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+                yield directory
+        finally:
+            os.chdir(previous)
+
+
+def compare(baseline, current, threshold=0.10):
+    """
+    Finds the benchmarks whose median got slower than the baseline's by more than `threshold`.
+    Benchmarks missing from either side are ignored.
+    :return: List of (name, baseline median, current median, relative change) tuples.
+    """
+    regressions = []
+    for name, result in current["benchmarks"].items():
+        previous = baseline["benchmarks"].get(name)
+        if previous is None or previous["median"] <= 0:
+            continue
+        change = result["median"] / previous["median"] - 1
+        if change > threshold:
+            regressions.append((name, previous["median"], result["median"], change))
+    return regressions
+
+
+def format_results(results, baseline=None):
+    lines = [f"{'benchmark':<36} {'median ms':>11} {'min ms':>11} {'change':>8}"]
+    for name, result in results["benchmarks"].items():
+        previous = baseline["benchmarks"].get(name) if baseline else None
+        change = f"{result['median'] / previous['median'] - 1:>+8.1%}" if previous and previous["median"] > 0 else ""
+        lines.append(f"{name:<36} {result['median'] * 1000:>11.2f} {result['min'] * 1000:>11.2f} {change:>8}")
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks the environment components and the training loop.")
+    parser.add_argument("--suite", choices=("micro", "macro", "all"), default="all")
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--iterations", type=int, default=10, help="Iterations of each macro-benchmark loop")
+    parser.add_argument("--synthesized", type=int, default=2, help="Synthesized variants per corpus program")
+    parser.add_argument("--latency", type=float, default=0.0, help="Latency of the mock model in the macro-benchmarks")
+    parser.add_argument("--backend", choices=("subprocess", "forkserver"), default="forkserver")
+    parser.add_argument("--sales-rows", type=int,
+                        help="Runs the programs on a synthetic Sales.csv of this many rows (see dataset.py)")
+    parser.add_argument("--output", default="benchmarks/latest.json", help="Where the results are written")
+    parser.add_argument("--baseline", help="Results of an earlier run to compare against")
+    parser.add_argument("--threshold", type=float, default=0.10,
+                        help="Relative slowdown of a median over the baseline counted as a regression")
+    args = parser.parse_args()
+
+    corpus = load_corpus(args.synthesized)
+    benchmarks = {}
+    if args.suite in ("micro", "all"):
+        benchmarks.update(micro_benchmarks(corpus, args.repeats, args.backend, args.sales_rows))
+    if args.suite in ("macro", "all"):
+        benchmarks.update(macro_benchmarks(args.iterations, max(1, args.repeats // 2), args.latency, args.backend,
+                                           args.sales_rows))
+
+    results = {
+        "version": FORMAT_VERSION,
+        "created": time.time(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "corpus_size": len(corpus),
+        "sales_rows": args.sales_rows,
+        "benchmarks": benchmarks,
+    }
+    if os.path.dirname(args.output):
+        os.makedirs(os.path.dirname(args.output), exist_ok=True)
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    print(format_results(results, baseline))
+    print(f"Results written to {args.output}")
+
+    if baseline is not None:
+        regressions = compare(baseline, results, args.threshold)
+        for name, before, after, change in regressions:
+            print(f"Regression in {name}: {before * 1000:.2f} ms -> {after * 1000:.2f} ms ({change:+.1%})")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
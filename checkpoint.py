@@ -0,0 +1,174 @@
+import json
+import os
+import struct
+
+import numpy as np
+
+MAGIC = b"QTBL"
+LOG_MAGIC = b"QLOG"
+VERSION = 1
+ALIGNMENT = 64  # Payloads start on a 64-byte boundary so they can be memory-mapped directly
+HYPERPARAMETERS = ("learning_rate", "discount_factor", "exploration_decay", "trace_decay")
+
+# Delta-log record: iteration, exploration rate, number of changed cells
+_RECORD = struct.Struct("<qdI")
+
+
+def save_checkpoint(qlearning, path, iteration):
+    """
+    Writes the Q-table and visit counts of a QLearning to a binary checkpoint, atomically.
+    Layout: magic, version, header length, JSON header (shape, dtype, hyperparameters,
+    exploration_rate, iteration, payload offsets), then the raw arrays.
+    :param qlearning: QLearning to save.
+    :param path: Checkpoint file; replaced only once the new one is complete.
+    :param iteration: Iteration the table corresponds to.
+    """
+    header = _header(qlearning, iteration)
+    arrays = {"q_table": np.ascontiguousarray(qlearning.q_table), "visits": np.ascontiguousarray(qlearning.visits)}
+    header["arrays"] = {name: {"dtype": a.dtype.str, "shape": list(a.shape), "offset": 0} for name, a in arrays.items()}
+    # The offsets depend on the header length, which depends on the offsets: repeat until it settles
+    start = None
+    while start != _align(len(_preamble(header))):
+        start = offset = _align(len(_preamble(header)))
+        for name, array in arrays.items():
+            header["arrays"][name]["offset"] = offset
+            offset = _align(offset + array.nbytes)
+    preamble = _preamble(header)
+
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    with open(temp_path, "wb") as f:
+        f.write(preamble)
+        for name, array in arrays.items():
+            f.seek(header["arrays"][name]["offset"])
+            f.write(array.tobytes())
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp_path, path)
+
+
+def load_checkpoint(path, mmap=True):
+    """
+    Reads a checkpoint.
+    :param mmap: Map the arrays instead of reading them (copy-on-write: changes stay in memory).
+    :return: Tuple (header dict, dict of arrays "q_table" and "visits").
+    """
+    with open(path, "rb") as f:
+        header = _read_header(f, MAGIC, path)
+        arrays = {}
+        for name, spec in header["arrays"].items():
+            dtype, shape = np.dtype(spec["dtype"]), tuple(spec["shape"])
+            if mmap:
+                arrays[name] = np.memmap(path, dtype=dtype, mode="c", offset=spec["offset"], shape=shape)
+            else:
+                f.seek(spec["offset"])
+                arrays[name] = np.fromfile(f, dtype=dtype, count=int(np.prod(shape))).reshape(shape)
+    return header, arrays
+
+
+def restore(qlearning, path, mmap=True):
+    """
+    Loads a checkpoint into a QLearning (table, visits, exploration rate and hyperparameters).
+    :return: The iteration the checkpoint was saved at.
+    """
+    header, arrays = load_checkpoint(path, mmap)
+    if tuple(header["shape"]) != qlearning.q_table.shape:
+        raise ValueError(f"Checkpoint {path} holds a {tuple(header['shape'])} table, "
+                         f"expected {qlearning.q_table.shape}")
+    qlearning.q_table = arrays["q_table"]
+    qlearning.visits = arrays["visits"]
+    qlearning.exploration_rate = header["exploration_rate"]
+    for name, value in header["hyperparameters"].items():
+        setattr(qlearning, name, value)
+    return header["iteration"]
+
+
+class DeltaLog:
+    """
+    Append-only log of a Q-table: the full table once, then for each logged iteration only
+    the cells that changed since the previous record (flat indices and new values).
+    A record cut short by a crash is ignored when reading.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._last = None  # Table as of the last record, to diff against
+
+    def append(self, qlearning, iteration):
+        """Logs the table of a QLearning at an iteration."""
+        table = np.ascontiguousarray(qlearning.q_table)
+        if self._last is None and os.path.exists(self.path) and os.path.getsize(self.path) > 0:
+            _, self._last, _, end = self._replay()
+            os.truncate(self.path, end)  # Drop a record cut short by a crash, if any
+        with open(self.path, "ab") as f:
+            if self._last is None or f.tell() == 0:
+                header = _header(qlearning, iteration)
+                header["arrays"] = {"q_table": {"dtype": table.dtype.str, "shape": list(table.shape)}}
+                f.write(_preamble(header, LOG_MAGIC))
+                f.write(table.tobytes())
+            else:
+                changed = np.flatnonzero(table.ravel() != self._last.ravel()).astype(np.uint32)
+                f.write(_RECORD.pack(iteration, qlearning.exploration_rate, len(changed)))
+                f.write(changed.tobytes())
+                f.write(table.ravel()[changed].tobytes())
+            f.flush()
+        self._last = table.copy()
+
+    def table_at(self, iteration=None):
+        """
+        Reconstructs the table as it was at an iteration.
+        :param iteration: Latest record not after it is used; the last record when None.
+        :return: Tuple (iteration of the record used, table, exploration rate).
+        """
+        return self._replay(iteration)[:3]
+
+    def _replay(self, iteration=None):
+        with open(self.path, "rb") as f:
+            header = _read_header(f, LOG_MAGIC, self.path)
+            spec = header["arrays"]["q_table"]
+            dtype, shape = np.dtype(spec["dtype"]), tuple(spec["shape"])
+            table = np.frombuffer(f.read(dtype.itemsize * int(np.prod(shape))), dtype=dtype).reshape(shape).copy()
+            found, exploration_rate = header["iteration"], header["exploration_rate"]
+            end = f.tell()
+            while True:
+                record = f.read(_RECORD.size)
+                if len(record) < _RECORD.size:
+                    break
+                record_iteration, record_rate, count = _RECORD.unpack(record)
+                data = f.read(count * (4 + dtype.itemsize))
+                if len(data) < count * (4 + dtype.itemsize) or (iteration is not None and record_iteration > iteration):
+                    break
+                cells = np.frombuffer(data[:count * 4], dtype=np.uint32)
+                table.ravel()[cells] = np.frombuffer(data[count * 4:], dtype=dtype)
+                found, exploration_rate = record_iteration, record_rate
+                end = f.tell()
+        return found, table, exploration_rate, end
+
+
+def _header(qlearning, iteration):
+    return {
+        "version": VERSION,
+        "shape": list(qlearning.q_table.shape),
+        "dtype": qlearning.q_table.dtype.str,
+        "hyperparameters": {name: getattr(qlearning, name) for name in HYPERPARAMETERS if hasattr(qlearning, name)},
+        "exploration_rate": qlearning.exploration_rate,
+        "iteration": iteration,
+    }
+
+
+def _preamble(header, magic=MAGIC):
+    data = json.dumps(header).encode("utf-8")
+    return magic + struct.pack("<HI", VERSION, len(data)) + data
+
+
+def _read_header(f, magic, path):
+    start = f.read(len(magic) + 6)
+    if start[:len(magic)] != magic:
+        raise ValueError(f"{path} is not a Q-table file")
+    version, length = struct.unpack("<HI", start[len(magic):])
+    if version > VERSION:
+        raise ValueError(f"{path} has format version {version}, this code reads up to {VERSION}")
+    return json.loads(f.read(length))
+
+
+def _align(offset):
+    return (offset + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
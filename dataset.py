@@ -0,0 +1,179 @@
+import argparse
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from sandbox import forget_data
+
+COLUMNS = ["Date", "Price", "Store", "State"]
+STATES = np.array(["Paraná", "Acre", "Pamraná"])  # Pamraná: the misspelling found in Sales.csv
+BLOCK = 1 << 16  # Rows drawn from one random generator; row i is the same whatever the chunk size
+
+# Record layout of the .npy output: fixed-width UTF-8 bytes keep the prices as text ("20.99USD"),
+# and empty bytes (or NaT for the date) mark the missing values
+NPY_DTYPE = np.dtype([("Date", "datetime64[D]"), ("Price", "S14"), ("Store", "i1"), ("State", "S8")])
+
+
+class SalesGenerator:
+    """
+    Synthetic datasets with the schema and the problems of Sales.csv, of any size:
+    prices as text with a USD suffix, a few outliers over 100000USD, store IDs outside 1 to 5,
+    the misspelled state Pamraná and missing dates, prices and states. Dates go up one day
+    at a time over `days` days, like the real file.
+    Rows are drawn in blocks of BLOCK rows, each from its own generator seeded with (seed, block),
+    so the data depends only on the seed and the number of rows, never on how it is chunked.
+    :param rows: Number of rows.
+    :param chunk_size: Rows per generated chunk (rounded up to a multiple of BLOCK), which bounds the memory.
+    """
+
+    def __init__(self, rows, seed=0, start="2024-09-01", days=91, null_rate=0.01, outlier_rate=0.02,
+                 misspelling_rate=0.04, bad_store_rate=0.03, state_weights=(0.55, 0.45), chunk_size=1 << 20):
+        self.rows = rows
+        self.seed = seed
+        self.start = np.datetime64(start, "D")
+        self.days = days
+        self.null_rate = null_rate
+        self.outlier_rate = outlier_rate
+        self.misspelling_rate = misspelling_rate
+        self.bad_store_rate = bad_store_rate
+        parana, acre = state_weights
+        self.state_probabilities = np.array([parana, acre, 0.0]) / (parana + acre) * (1 - misspelling_rate)
+        self.state_probabilities[2] = misspelling_rate
+        self.chunk_size = max(BLOCK, -(-chunk_size // BLOCK) * BLOCK)
+
+    def columns(self):
+        """
+        Yields the raw columns of each chunk: dict with "date" (datetime64[D]), "cents" (int64 price),
+        "store", "state" (index into STATES) and the boolean masks "date_null", "price_null", "state_null".
+        """
+        blocks_per_chunk = self.chunk_size // BLOCK
+        blocks = -(-self.rows // BLOCK)
+        for first in range(0, blocks, blocks_per_chunk):
+            parts = [self._block(block) for block in range(first, min(first + blocks_per_chunk, blocks))]
+            yield {name: np.concatenate([part[name] for part in parts]) for name in parts[0]}
+
+    def frames(self):
+        """Yields each chunk as a DataFrame holding what pd.read_csv gives on Sales.csv (text dates and prices)."""
+        for columns in self.columns():
+            yield pd.DataFrame({
+                "Date": _with_nulls(np.datetime_as_string(columns["date"]), columns["date_null"]),
+                "Price": _with_nulls(_price_text(columns["cents"]), columns["price_null"]),
+                "Store": columns["store"],
+                "State": _with_nulls(STATES[columns["state"]], columns["state_null"]),
+            }, columns=COLUMNS)
+
+    def write_csv(self, path):
+        with open(path, "w", encoding="utf-8", newline="") as f:
+            for i, frame in enumerate(self.frames()):
+                frame.to_csv(f, header=i == 0, index=False)
+
+    def write_parquet(self, path):
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError:
+            raise ImportError("Parquet output needs pyarrow (pip install pyarrow)") from None
+        writer = None
+        try:
+            for frame in self.frames():
+                table = pyarrow.Table.from_pandas(frame, preserve_index=False)
+                if writer is None:
+                    writer = pyarrow.parquet.ParquetWriter(path, table.schema)
+                writer.write_table(table)
+        finally:
+            if writer is not None:
+                writer.close()
+
+    def write_npy(self, path):
+        """Writes a .npy of NPY_DTYPE records, filled chunk by chunk through a memory map."""
+        array = np.lib.format.open_memmap(path, mode="w+", dtype=NPY_DTYPE, shape=(self.rows,))
+        offset = 0
+        for columns in self.columns():
+            chunk = array[offset:offset + len(columns["date"])]
+            chunk["Date"] = np.where(columns["date_null"], np.datetime64("NaT"), columns["date"])
+            chunk["Price"] = np.where(columns["price_null"], b"", np.char.encode(_price_text(columns["cents"])))
+            chunk["Store"] = columns["store"]
+            chunk["State"] = np.where(columns["state_null"], b"", np.char.encode(STATES, "utf-8")[columns["state"]])
+            offset += len(chunk)
+        array.flush()
+        del array
+
+    def write(self, path, format=None):
+        """
+        Writes the dataset as CSV, Parquet or NumPy, chosen by `format` or the file extension.
+        Cached executions are keyed on the content of the data files (see CodeExecutor), so
+        programs run again on a regenerated Sales.csv instead of returning the old outputs.
+        :return: Seconds it took.
+        """
+        format = format or os.path.splitext(path)[1].lstrip(".").lower()
+        writers = {"csv": self.write_csv, "parquet": self.write_parquet, "npy": self.write_npy}
+        if format not in writers:
+            raise ValueError(f"Unknown dataset format: {format} (expected csv, parquet or npy)")
+        start = time.perf_counter()
+        writers[format](path)
+        forget_data(path)  # Rewritten within the same mtime tick, it could keep its old hash
+        return time.perf_counter() - start
+
+    def _block(self, block):
+        first = block * BLOCK
+        count = min(BLOCK, self.rows - first)
+        rng = np.random.default_rng([self.seed, block])
+
+        rows = np.arange(first, first + count, dtype=np.int64)
+        date = self.start + (rows * self.days // self.rows).astype("timedelta64[D]")
+
+        cents = rng.integers(500, 10000, size=count)  # 5.00USD to 99.99USD
+        outliers = rng.random(count) < self.outlier_rate
+        cents[outliers] = rng.integers(100000_01, 100_000_000_00, size=int(outliers.sum()))
+
+        store = rng.integers(1, 6, size=count).astype(np.int8)
+        bad_stores = rng.random(count) < self.bad_store_rate
+        store[bad_stores] = rng.integers(6, 8, size=int(bad_stores.sum()))
+
+        state = rng.choice(len(STATES), size=count, p=self.state_probabilities)
+        nulls = rng.random((3, count)) < self.null_rate
+        return {"date": date, "cents": cents, "store": store, "state": state,
+                "date_null": nulls[0], "price_null": nulls[1], "state_null": nulls[2]}
+
+
+def load_npy(path):
+    """Maps a dataset written by write_npy without reading it."""
+    return np.load(path, mmap_mode="r")
+
+
+def _price_text(cents):
+    # "20.99USD", built with array operations instead of formatting each price
+    dollars, remainder = np.divmod(cents, 100)
+    text = np.char.add(dollars.astype(str), ".")
+    text = np.char.add(text, np.char.zfill(remainder.astype(str), 2))
+    return np.char.add(text, "USD")
+
+
+def _with_nulls(values, nulls):
+    values = values.astype(object)
+    values[nulls] = None
+    return values
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generates a synthetic Sales dataset with the problems of Sales.csv.")
+    parser.add_argument("--rows", type=int, default=1000)
+    parser.add_argument("--output", default="Sales_synthetic.csv", help="File to write (.csv, .parquet or .npy)")
+    parser.add_argument("--format", choices=("csv", "parquet", "npy"), help="Overrides the file extension")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--chunk-size", type=int, default=1 << 20, help="Rows generated at a time")
+    parser.add_argument("--null-rate", type=float, default=0.01)
+    parser.add_argument("--outlier-rate", type=float, default=0.02)
+    parser.add_argument("--misspelling-rate", type=float, default=0.04)
+    args = parser.parse_args()
+
+    generator = SalesGenerator(args.rows, seed=args.seed, null_rate=args.null_rate, outlier_rate=args.outlier_rate,
+                               misspelling_rate=args.misspelling_rate, chunk_size=args.chunk_size)
+    seconds = generator.write(args.output, args.format)
+    print(f"Wrote {args.rows} rows to {args.output} in {seconds:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+import collections
+import json
+import subprocess
+import threading
+
+from sandbox import code_hash
+
+
+class Diagnostic(collections.namedtuple(
+        "Diagnostic", ["code", "message", "line", "column", "end_line", "end_column", "severity", "fixable"])):
+    """One Ruff finding; code is the rule code ("F401", or "invalid-syntax" for syntax errors)."""
+    __slots__ = ()
+
+    @classmethod
+    def from_ruff(cls, item):
+        """Builds a diagnostic from one entry of `ruff check --output-format json`."""
+        code = item.get("code") or "invalid-syntax"  # Older Ruff versions report syntax errors with no code
+        location, end = item.get("location") or {}, item.get("end_location") or {}
+        return cls(code, item.get("message", ""), location.get("row"), location.get("column"),
+                   end.get("row"), end.get("column"), item.get("severity") or _severity(code),
+                   item.get("fix") is not None)
+
+    def __str__(self):
+        return f"line {self.line}:{self.column}: {self.code} [{self.severity}] {self.message}"
+
+
+class LintReport(collections.namedtuple("LintReport", ["code_hash", "diagnostics", "error"], defaults=(None,))):
+    """
+    Structured result of linting one program. error holds why Ruff could not run, if it could not.
+    Formats as the text shown to the model in the review prompt.
+    """
+    __slots__ = ()
+
+    @property
+    def issue_count(self):
+        return len(self.diagnostics)
+
+    @property
+    def bug_count(self):
+        """Syntax errors and Pyflakes findings, whatever severity Ruff reported for them."""
+        return sum(_severity(d.code) == "error" for d in self.diagnostics)
+
+    @property
+    def has_syntax_error(self):
+        return any(d.code == "invalid-syntax" for d in self.diagnostics)
+
+    def by_severity(self):
+        """:return: Dict severity -> number of diagnostics."""
+        return dict(collections.Counter(d.severity for d in self.diagnostics))
+
+    def __str__(self):
+        if self.error is not None:
+            return f"Ruff Error: {self.error}"
+        if not self.diagnostics:
+            return "All checks passed!"
+        lines = [str(d) for d in self.diagnostics]
+        lines.append(f"Found {len(self.diagnostics)} error{'s' if len(self.diagnostics) != 1 else ''}.")
+        return "\n".join(lines)
+
+
+class RuffLinter:
+    """
+    Runs `ruff check` on source fed through stdin and parses its JSON output, so nothing
+    is written to the working directory and several reviewers can lint at the same time.
+    Reports are cached by the hash of the code text, in an LRU of `max_entries`.
+    """
+
+    def __init__(self, command=None, max_entries=256, timeout=30):
+        self.command = list(command) if command is not None else [_find_ruff()]
+        self.max_entries = max_entries
+        self.timeout = timeout
+        self._cache = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def check(self, code):
+        """
+        Lints the code, running Ruff only the first time a given program is seen.
+        :param code: Source code as a string.
+        :return: LintReport.
+        """
+        key = code_hash(code)
+        with self._lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                self.hits += 1
+                return self._cache[key]
+            self.misses += 1
+
+        report = self._run(key, code)
+        if report.error is None:  # Ruff failures are not cached, the next call retries
+            with self._lock:
+                self._cache[key] = report
+                while len(self._cache) > self.max_entries:
+                    self._cache.popitem(last=False)
+        return report
+
+    def _run(self, key, code):
+        try:
+            result = subprocess.run(
+                self.command + ["check", "--output-format", "json", "--no-cache",
+                                "--stdin-filename", "generated_code.py", "-"],
+                input=code, capture_output=True, text=True, timeout=self.timeout,
+            )
+        except FileNotFoundError:
+            return LintReport(key, [], "Ruff is not installed or not found in the system PATH.")
+        except subprocess.TimeoutExpired:
+            return LintReport(key, [], "Ruff timed out.")
+
+        # Exit code 1 only means that issues were found
+        if result.returncode not in (0, 1):
+            return LintReport(key, [], result.stderr.strip())
+        try:
+            diagnostics = [Diagnostic.from_ruff(item) for item in json.loads(result.stdout or "[]")]
+        except (ValueError, AttributeError) as e:
+            return LintReport(key, [], f"Could not parse the Ruff output: {e}")
+        diagnostics.sort(key=lambda d: (d.line or 0, d.column or 0))
+        return LintReport(key, diagnostics)
+
+
+def _find_ruff():
+    """Prefers the binary shipped with the ruff package, falling back to the one on PATH."""
+    try:
+        from ruff.__main__ import find_ruff_bin
+        return find_ruff_bin()
+    except (ImportError, FileNotFoundError):
+        return "ruff"
+
+
+def _severity(code):
+    # Syntax errors and Pyflakes findings are real bugs, the rest is style
+    if code == "invalid-syntax" or code.startswith(("E9", "F")):
+        return "error"
+    return "warning"
+
+
+_default_linter = None
+_default_lock = threading.Lock()
+
+
+def default_linter():
+    """Returns the linter shared by every reviewer that was not given one explicitly."""
+    global _default_linter
+    with _default_lock:
+        if _default_linter is None:
+            _default_linter = RuffLinter()
+        return _default_linter
@@ -0,0 +1,96 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+import zlib
+
+
+class CacheMiss(LookupError):
+    """Raised in replay mode when a request has never been answered before."""
+
+
+class LLMCache:
+    """
+    Persistent cache of model responses, stored compressed in a SQLite file.
+    Entries are keyed by the model, the full message list and the sampling options, and the
+    least recently used ones are evicted once the stored responses exceed `max_bytes`.
+    With `replay=True` the model is never called: a miss raises CacheMiss.
+    """
+
+    def __init__(self, path="llm_cache.sqlite", max_bytes=256 * 1024 * 1024, replay=False):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.replay = replay
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        # Several episodes may share the file, so wait on locks instead of failing
+        self._db = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        with self._db:
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, model TEXT, response BLOB, size INTEGER, "
+                "created REAL, last_used REAL)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS responses_last_used ON responses (last_used)")
+
+    @staticmethod
+    def key(model, messages, options=None):
+        """
+        Builds the content address of a request.
+        :return: SHA-256 hex digest of the canonical JSON of the request.
+        """
+        request = {"model": model, "messages": messages, "options": options or {}}
+        return hashlib.sha256(json.dumps(request, sort_keys=True, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        """
+        Looks up a response.
+        :return: The cached response, or None on a miss.
+        :raises CacheMiss: On a miss in replay mode.
+        """
+        with self._lock:
+            row = self._db.execute("SELECT response FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                if self.replay:
+                    raise CacheMiss(f"No cached response for request {key} (replay mode).")
+                return None
+            self.hits += 1
+            with self._db:
+                self._db.execute("UPDATE responses SET last_used = ? WHERE key = ?", (time.time(), key))
+        return zlib.decompress(row[0]).decode("utf-8")
+
+    def put(self, key, model, response):
+        """Stores a response and evicts old entries if the cache grew past its size limit."""
+        data = zlib.compress(response.encode("utf-8"))
+        now = time.time()
+        with self._lock, self._db:
+            self._db.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?)",
+                (key, model, data, len(data), now, now),
+            )
+            self._evict()
+
+    def size(self):
+        """Returns the total size in bytes of the stored (compressed) responses."""
+        with self._lock:
+            return self._db.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    def _evict(self):
+        total = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        rows = self._db.execute("SELECT key, size FROM responses ORDER BY last_used")
+        stale = []
+        for key, size in rows:
+            if total <= self.max_bytes:
+                break
+            stale.append((key,))
+            total -= size
+        self._db.executemany("DELETE FROM responses WHERE key = ?", stale)
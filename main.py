@@ -1,11 +1,26 @@
 from agentes import Coder, Reviewer, MonitoringAndFeedbackAgent
+from agentes_async import AsyncModelClient, AsyncCoder, AsyncReviewer
 from ambiente import Environment
 from qlearning import QLearning
+from replay import ReplayBuffer
+from session import Session
+from runlog import RunLog
+from stopping import Progress, StoppingCriteria
+from timing import TIMINGS, LiveView
+from llm_cache import LLMCache
+from mock_ollama import MockModel, MockClient, AsyncMockClient
+from sandbox import CodeExecutor, ResourceLimits
+from speculative import BestOfK
+from prompts import PromptBuilder
+import argparse
+import asyncio
+import contextlib
+import os
 import random
+import time
 
-def main():
-    # Define a comprehensive problem description for testing
-    problem_description = """
+# Define a comprehensive problem description for testing
+PROBLEM_DESCRIPTION = """
         We have a Sales.csv with 4 columns: Date, with the date (format 2024-09-25) of the sale;
         Price, how much money (format 20.99USD) the client paid for the sale;
         Store, in which store was made that sale, the IDs go from 1 to 5
@@ -16,21 +31,8 @@ def main():
         - Sales per month of the year.
     """
 
-    max_iterations = 100
-
-    try:
-        # Instantiate the agents and environment
-        coder = Coder(problem_description=problem_description)
-        reviewer = Reviewer(problem_description=problem_description)
-        environment = Environment(threshold_score=100, max_iterations=max_iterations)
-        monitor = MonitoringAndFeedbackAgent()
-    except Exception as e:
-        print(f"Error initializing agents or environment: {e}")
-        return
-
-
-    coder_prompts = [   
-        """You are an experienced Python coder tasked with solving a data science problem efficiently. Your objective is to (with the file Sales.csv):
+CODER_PROMPTS = [   
+    """You are an experienced Python coder tasked with solving a data science problem efficiently. Your objective is to (with the file Sales.csv):
             1. Handle any missing or inconsistent data by applying appropriate imputation or removal methods.
             2. Ensure that any outliers (e.g., sales exceeding 100000USD) are properly identified and dealt with.
             3. Create two visualizations using libraries like `matplotlib` or `seaborn`: 
@@ -39,159 +41,614 @@ def main():
             4. Write clean and well-documented code. Use comments and docstrings to explain your approach and logic.
         Focus on writing robust, maintainable code that fulfills the problem description with clarity and efficiency. Ensure that edge cases, such as missing values and outliers, are handled properly, and the visualizations are meaningful and accurate.""",
 
-        "You are a skilled Python developer and data scientist. Your primary task is to write Python code that effectively addresses "
-        "data science problems based on a given problem description. Follow these guidelines carefully:\n\n"
-            "1. Precision: Generate code that directly addresses the problem requirements without unnecessary elements.\n"
-            "2. Documentation: Include concise comments in the code to explain key steps, so it's easy to understand and maintain.\n"
-            "3. Error Handling: Anticipate common issues (e.g., missing data, incorrect formats) and handle them gracefully within the code.\n"
-            "4. Efficiency: Use efficient methods, libraries, or algorithms wherever possible to optimize performance.\n\n"
-        "Your code should be clean, well-organized, and focus on the task requirements provided in the problem description.",
-        
-        """You are a Python developer. You will make some code, that code needs to be:
+    "You are a skilled Python developer and data scientist. Your primary task is to write Python code that effectively addresses "
+    "data science problems based on a given problem description. Follow these guidelines carefully:\n\n"
+        "1. Precision: Generate code that directly addresses the problem requirements without unnecessary elements.\n"
+        "2. Documentation: Include concise comments in the code to explain key steps, so it's easy to understand and maintain.\n"
+        "3. Error Handling: Anticipate common issues (e.g., missing data, incorrect formats) and handle them gracefully within the code.\n"
+        "4. Efficiency: Use efficient methods, libraries, or algorithms wherever possible to optimize performance.\n\n"
+    "Your code should be clean, well-organized, and focus on the task requirements provided in the problem description.",
+    
+    """You are a Python developer. You will make some code, that code needs to be:
         1. Remember all the basics, and give the code already finished.
         2. Handle unexpected input gracefully, always expect for the worse.
         3. Return results in the expected format.""",
-        
-        """You are a minimalist coder. Your mission is to write the shortest and simplest Python 
+    
+    """You are a minimalist coder. Your mission is to write the shortest and simplest Python 
         script that accomplishes the given task without sacrificing clarity or functionality.""",
 
-    ]
-    
-    reviewer_prompts = [    
-        """You are a highly experienced Python code reviewer with a focus on data science tasks. Your role is to review the code generated by the Coder and provide clear, constructive feedback. Your review should cover:
+]
+
+REVIEWER_PROMPTS = [    
+    """You are a highly experienced Python code reviewer with a focus on data science tasks. Your role is to review the code generated by the Coder and provide clear, constructive feedback. Your review should cover:
             1. **Error Handling**: Evaluate how the code handles potential issues like missing data, invalid formats, or outliers. Ensure it is robust and fails gracefully.
             2. **Code Efficiency**: Suggest any improvements for optimizing performance, such as better handling of large datasets or faster methods for data cleaning and visualization.
             3. **Clarity and Readability**: Assess the code for clarity, modularity, and readability. Recommend improvements to naming conventions, structure, or documentation.
             4. **Best Practices**: Ensure that the code adheres to Python best practices, including proper use of libraries, concise code, and appropriate error handling.
         Avoid suggesting any new code. Your feedback should focus on the existing code and how it can be improved, highlighting areas that might not meet the problem’s requirements or where performance could be enhanced.""",
 
-        "You are a Senior Python developer and data scientist with expertise in reviewing code for quality, efficiency, and best practices. "
-        "Your primary role is to review code generated by other developers and provide detailed feedback on how to improve it. Follow these instructions carefully:\n\n"
-            "1. Identify Errors: Analyze the code for errors or bugs, especially those that might arise from the code’s current logic, and explain how to handle them effectively.\n"
-            "2. Suggest Optimizations: Look for ways to improve the code’s efficiency. This includes suggesting alternative methods, removing redundancies, and identifying potential performance bottlenecks.\n"
-            "3. Enhance Readability: Recommend adjustments that improve code readability and maintainability, such as restructuring code blocks, adding comments, or following consistent naming conventions.\n"
-            "4. Focus on Best Practices: Suggest ways to follow Python best practices, such as appropriate error handling, modular design, and clarity in code structure.\n\n"
-        "Do not include any new code in your response, don't send ANY CODE in general, NOTHING. Focus only on providing constructive feedback based on the code’s" 
-        "current state and the potential errors it could generate, as well as clear, actionable recommendations for improvement."
-        ,
+    "You are a Senior Python developer and data scientist with expertise in reviewing code for quality, efficiency, and best practices. "
+    "Your primary role is to review code generated by other developers and provide detailed feedback on how to improve it. Follow these instructions carefully:\n\n"
+        "1. Identify Errors: Analyze the code for errors or bugs, especially those that might arise from the code’s current logic, and explain how to handle them effectively.\n"
+        "2. Suggest Optimizations: Look for ways to improve the code’s efficiency. This includes suggesting alternative methods, removing redundancies, and identifying potential performance bottlenecks.\n"
+        "3. Enhance Readability: Recommend adjustments that improve code readability and maintainability, such as restructuring code blocks, adding comments, or following consistent naming conventions.\n"
+        "4. Focus on Best Practices: Suggest ways to follow Python best practices, such as appropriate error handling, modular design, and clarity in code structure.\n\n"
+    "Do not include any new code in your response, don't send ANY CODE in general, NOTHING. Focus only on providing constructive feedback based on the code’s" 
+    "current state and the potential errors it could generate, as well as clear, actionable recommendations for improvement."
+    ,
 
-        """Your task is to review the provided Python code with the primary goal of verifying whether it fulfills the given problem’s requirements.
+    """Your task is to review the provided Python code with the primary goal of verifying whether it fulfills the given problem’s requirements.
 
             1. Highlight any missing features, incomplete logic, or deviations from the problem requirements.
             2. Confirm whether it produces the expected results in all scenarios, including edge cases.
             3. Critize the Coder harshly, showing all his mistakes as if he's inferior to you.
         Your feedback should focus on aligning the code’s functionality with the problem’s goals, identifying oversights, and suggesting corrections or enhancements to improve alignment.""",
-        
-        """You are a minimalist reviewer. Your mission is to review the following code in the shortest and simplest way 
+    
+    """You are a minimalist reviewer. Your mission is to review the following code in the shortest and simplest way 
         that accomplishes the given task without sacrificing clarity or functionality.""",
 
-    ]
-    
-    # Define actions and Q-Learning parameters
-    coder_actions = coder_prompts
-    reviewer_actions = reviewer_prompts
-    
-    # Initialize Q-Learning for both agents
-    state_space_size = 4 # bad, average and good previous code
-    c_qlearning = QLearning(coder_actions, state_space_size)
-    r_qlearning = QLearning(reviewer_actions, state_space_size)
-
-    save_iterations = [1, 2, 3] + list(range(10, 101, 10)) # Para salvar as iterações
-
-    feedback = "" # Initially is an empty string
-    generated_code = "" # Initially is an empty string
-
-    last_reviewer_index = -1 # We just reward the reviewer one iteration later
-    previous_score = 0
-    state = 0  # Initial state
-    for iteration in range(max_iterations):
-        print(f"\n=== Iteration {iteration + 1} ===")
-
-        # Step 1: Coder selects an action using Q-learning and generates code
-        coder_action_index = c_qlearning.choose_action(state)
-        coder_action = coder_actions[coder_action_index]
-        
-        print(f"Coder's action: {coder_action}")
-        print(f"\n=== Coder is working... ===")
-        
-        generated_code = coder.generate_code(coder_action, feedback, generated_code) # Gets the last code as well
-
-        # Step 2: Reviewer selects an action using Q-learning and reviews the code
-        reviewer_action_index = r_qlearning.choose_action(state)
-        reviewer_action = reviewer_actions[reviewer_action_index]
-        
-        print("Generated code by Coder:\n", generated_code, "\n")
-        
-        print(f"Reviewer's action: {reviewer_action}")
-        print(f"\n=== Reviewer is working... ===")
-
-        feedback, score = reviewer.review_code(generated_code, reviewer_action)
-
-        # Monitor performance during coder's action
-        monitor.provide_feedback(generated_code, score)  # Monitor the coder's performance
-
-        # Monitor performance during coder's action
-        monitor.monitor_execution_time(generated_code)  # Monitor the coder's performance
-        memory_usage, cpu_usage = monitor.monitor_resource_usage()  # Monitor resource usage
+]
+
+
+def run_episode(max_iterations=100, c_qlearning=None, r_qlearning=None, executor=None, verbose=True,
+                llm_cache=None, llm_client=None, replay_buffers=None, replay_updates=0, session=None, resume=False,
+                run_log=None, stopping=None, best_of=None, prompt_budget=None, stream=False,
+                structured_review=False):
+    """
+    Runs one Coder/Reviewer episode of `max_iterations` iterations.
+    :param c_qlearning: Q-learning of the Coder; a fresh one is created if None.
+    :param r_qlearning: Q-learning of the Reviewer; a fresh one is created if None.
+    :param executor: CodeExecutor shared by the agents; if None, a new one is created and closed at the end.
+    :param llm_cache: Optional LLMCache shared by the Coder and the Reviewer.
+    :param llm_client: Object the agents call .chat() on (see agentes.make_client); None picks the default.
+    :param verbose: Prints the code, feedback and Q-tables of every iteration.
+    :param replay_buffers: Optional (coder, reviewer) ReplayBuffers storing every transition.
+    :param replay_updates: Batches replayed from the buffers after each real update.
+    :param session: Optional Session taking snapshots of the loop on its cadence.
+    :param resume: Continue from the session's latest snapshot, if there is one.
+    :param run_log: Optional RunLog getting one record per iteration; its verbosity overrides `verbose`.
+    :param stopping: Optional StoppingCriteria that can end the episode before `max_iterations`.
+    :param best_of: Optional BestOfK; the Coder then samples several candidates and only the best is reviewed.
+    :param prompt_budget: Token budget of every prompt; the agents' default (see PromptBuilder) when None.
+    :param stream: Stream the answers and stop them once the code block or the seven JSON scores are in.
+    :param structured_review: Ask the Reviewer for its scores as a JSON object (see scoring.py).
+    :return: Tuple (c_qlearning, r_qlearning, iterations run), or None if initialization fails.
+    """
+    with episode_executor(executor) as executor:
+        try:
+            # Instantiate the agents and environment
+            coder = Coder(problem_description=PROBLEM_DESCRIPTION, cache=llm_cache, client=llm_client)
+            reviewer = Reviewer(problem_description=PROBLEM_DESCRIPTION, executor=executor, cache=llm_cache,
+                                client=llm_client)
+            episode = Episode(coder, reviewer, executor, max_iterations, c_qlearning, r_qlearning, verbose,
+                              replay_buffers, replay_updates, session, run_log, stopping, best_of, prompt_budget,
+                              stream, structured_review)
+        except Exception as e:
+            print(f"Error initializing agents or environment: {e}")
+            return
+
+        start = episode.restore(resume)
+        iteration = None
+        for iteration in range(start, max_iterations):
+            # Step 1: Coder selects an action using Q-learning and generates code
+            coder_action = episode.start_iteration(iteration)
+            if best_of is None:
+                # Gets the last code as well
+                generated = coder.generate_code(coder_action, episode.feedback, episode.generated_code)
+            else:
+                # K candidates are generated and checked at the same time, only the best one is reviewed
+                generated = best_of.generate(CODER_PROMPTS, episode.coder_action_index, episode.feedback,
+                                             episode.generated_code)
+
+            # Step 2: Reviewer selects an action using Q-learning and reviews the code
+            reviewer_action = episode.code_generated(generated)
+            episode.reviewed(*reviewer.review_code(episode.generated_code, reviewer_action))
+
+            # Monitor performance during coder's and reviewer's actions
+            episode.log_monitoring(*episode.monitor(episode.generated_code, episode.feedback, episode.score))
+            episode.timer.lap("monitor")
+
+            # Step 3: Calculate rewards
+            coder_reward = episode.reward_coder(iteration)
+            if episode.end_iteration(iteration, coder_reward):
+                break
+
+        return episode.finish(start, iteration)
+
+
+async def run_episode_async(max_iterations=100, c_qlearning=None, r_qlearning=None, executor=None,
+                            verbose=True, llm_cache=None, llm_client=None, max_concurrency=4, timeout=120,
+                            replay_buffers=None, replay_updates=0, session=None, resume=False, run_log=None,
+                            stopping=None, best_of=None, prompt_budget=None, stream=False,
+                            structured_review=False):
+    """
+    Same episode as run_episode, but with the async agents: Ruff and the execution run
+    while waiting for each other, and the monitoring of an iteration's code runs while
+    the Coder is already generating the next version.
+    :param llm_client: Async client the requests go through (see agentes_async.make_async_client).
+    :param max_concurrency: Maximum number of requests in flight to the model server.
+    :param timeout: Seconds before a model request is abandoned.
+    The other parameters and the return value are those of run_episode.
+    """
+    with episode_executor(executor) as executor:
+        try:
+            client = AsyncModelClient(max_concurrency=max_concurrency, timeout=timeout, client=llm_client)
+            coder = AsyncCoder(problem_description=PROBLEM_DESCRIPTION, client=client, cache=llm_cache)
+            reviewer = AsyncReviewer(problem_description=PROBLEM_DESCRIPTION, executor=executor, client=client,
+                                     cache=llm_cache)
+            episode = Episode(coder, reviewer, executor, max_iterations, c_qlearning, r_qlearning, verbose,
+                              replay_buffers, replay_updates, session, run_log, stopping, best_of, prompt_budget,
+                              stream, structured_review)
+        except Exception as e:
+            print(f"Error initializing agents or environment: {e}")
+            return
+
+        monitoring = None
+        start = episode.restore(resume)
+        iteration = None
+        for iteration in range(start, max_iterations):
+            coder_action = episode.start_iteration(iteration)
+            if best_of is None:
+                generation = asyncio.create_task(
+                    coder.generate_code(coder_action, episode.feedback, episode.generated_code))
+            else:
+                generation = asyncio.create_task(best_of.generate_async(
+                    CODER_PROMPTS, episode.coder_action_index, episode.feedback, episode.generated_code))
+            if monitoring is not None:
+                episode.log_monitoring(*await monitoring)
+            reviewer_action = episode.code_generated(await generation)
+            episode.reviewed(*await reviewer.review_code(episode.generated_code, reviewer_action))
+
+            # Only reports, nothing downstream depends on it, so it can lag one iteration behind
+            monitoring = asyncio.create_task(asyncio.to_thread(
+                episode.monitor, episode.generated_code, episode.feedback, episode.score))
+
+            # The execution result is already cached by the review, so this only scores it
+            coder_reward = await asyncio.to_thread(episode.reward_coder, iteration)
+            if episode.end_iteration(iteration, coder_reward):
+                break
+
+        if monitoring is not None:
+            await monitoring
+        return episode.finish(start, iteration)
+
+
+@contextlib.contextmanager
+def episode_executor(executor=None):
+    """
+    Yields the executor given to an episode or, if there is none, a new one that is closed (stopping
+    its zygote) when the episode ends: each generated program runs only once, in a fork of a process
+    with pandas already imported, and is killed early if it goes over the resource limits.
+    Edits that only touch comments or whitespace reuse the previous run.
+    """
+    if executor is not None:
+        yield executor
+        return
+    with CodeExecutor(cache_dir=".execution_cache", backend="forkserver", limits=ResourceLimits(),
+                      incremental=True) as executor:
+        yield executor
+
+
+class Episode:
+    """
+    Everything run_episode and run_episode_async share: the environment, the monitor, the
+    Q-learning of both agents, the state carried from one iteration to the next and every
+    step of an iteration that does not wait for the model. The two loops only differ in how
+    they call the Coder and the Reviewer.
+    """
+
+    def __init__(self, coder, reviewer, executor, max_iterations, c_qlearning=None, r_qlearning=None,
+                 verbose=True, replay_buffers=None, replay_updates=0, session=None, run_log=None, stopping=None,
+                 best_of=None, prompt_budget=None, stream=False, structured_review=False):
+        if run_log is not None:
+            verbose = run_log.verbosity >= 2
+        self.log = print if verbose else (lambda *args, **kwargs: None)
+        self.coder = coder
+        self.reviewer = reviewer
+        self.agents = {"coder": coder, "reviewer": reviewer}
+        self.environment = Environment(threshold_score=100, max_iterations=max_iterations, executor=executor)
+        self.monitor_agent = MonitoringAndFeedbackAgent(executor=executor, verbose=verbose)
+        if prompt_budget is not None:
+            coder.prompt_builder = PromptBuilder(prompt_budget)
+            reviewer.prompt_builder = PromptBuilder(prompt_budget)
+        coder.stream = reviewer.stream = stream
+        reviewer.structured = structured_review
+        if best_of is not None:
+            best_of.bind(coder, executor, reviewer.linter, self.environment.analyzer)
+
+        # Initialize Q-Learning for both agents
+        state_space_size = 4 # bad, average and good previous code
+        self.c_qlearning = c_qlearning if c_qlearning is not None else QLearning(CODER_PROMPTS, state_space_size)
+        self.r_qlearning = r_qlearning if r_qlearning is not None else QLearning(REVIEWER_PROMPTS, state_space_size)
+
+        self.max_iterations = max_iterations
+        self.replay_buffers = replay_buffers
+        self.replay_updates = replay_updates
+        self.session = session
+        self.run_log = run_log
+        self.stopping = stopping
+        self.stream = stream
+        self.save_iterations = [1, 2, 3] + list(range(10, 101, 10)) # Para salvar as iterações
+
+        # Carried from one iteration to the next
+        self.state = 0  # Initial state
+        self.previous_score = 0
+        self.last_reviewer_index = -1 # We just reward the reviewer one iteration later
+        self.generated_code = "" # Initially is an empty string
+        self.feedback = "" # Initially is an empty string
+
+        # Of the iteration being run
+        self.timer = None
+        self.coder_action_index = self.reviewer_action_index = None
+        self.candidates = None
+        self.score = None
+
+    def restore(self, resume):
+        """Continues from the session's latest snapshot if asked to. :return: First iteration to run."""
+        restored = (self.session.restore(self.c_qlearning, self.r_qlearning, self.agents, self.replay_buffers)
+                    if self.session is not None and resume else None)
+        if restored is None:
+            return 0
+        start, loop_state = restored
+        (self.state, self.previous_score, self.last_reviewer_index, self.generated_code,
+         self.feedback) = (loop_state[key] for key in LOOP_STATE)
+        self.log(f"Resuming from iteration {start + 1}")
+        return start
+
+    def start_iteration(self, iteration):
+        """Chooses the Coder's action. :return: Its prompt."""
+        self.log(f"\n=== Iteration {iteration + 1} ===")
+        self.timer = Timer()
+        self.coder_action_index = self.c_qlearning.choose_action(self.state)
+        coder_action = CODER_PROMPTS[self.coder_action_index]
+        self.log(f"Coder's action: {coder_action}")
+        self.log("\n=== Coder is working... ===")
+        return coder_action
+
+    def code_generated(self, generated):
+        """
+        Takes the Coder's code and chooses the Reviewer's action.
+        :param generated: The code, or the (best, candidates) of a best-of-K round.
+        :return: The Reviewer's prompt.
+        """
+        self.candidates = None
+        if isinstance(generated, str):
+            self.generated_code = generated
+        else:
+            best, self.candidates = generated
+            self.generated_code, self.coder_action_index = best.code, best.action_index
+        self.timer.lap("generate")
+
+        self.reviewer_action_index = self.r_qlearning.choose_action(self.state)
+        reviewer_action = REVIEWER_PROMPTS[self.reviewer_action_index]
+        self.log("Generated code by Coder:\n", self.generated_code, "\n")
+        self.log(f"Reviewer's action: {reviewer_action}")
+        self.log("\n=== Reviewer is working... ===")
+        return reviewer_action
+
+    def reviewed(self, feedback, score):
+        self.feedback, self.score = feedback, score
+        self.timer.lap("review")
+        self.log("Reviewer's feedback:\n", feedback)
+        self.log("Score assigned by Reviewer:", score, "\n")
 
+    def monitor(self, code, feedback, score):
+        """
+        Monitors the performance of the coder's and the reviewer's actions.
+        :return: Tuple (execution time, memory usage, CPU usage).
+        """
+        monitor = self.monitor_agent
+        monitor.provide_feedback(code, score)
+        _, execution_time = monitor.monitor_execution_time(code)
+        memory_usage, cpu_usage = monitor.monitor_resource_usage()
+        monitor.provide_feedback(feedback, score)
+        return execution_time, memory_usage, cpu_usage
+
+    def log_monitoring(self, execution_time, memory_usage, cpu_usage):
         # Imprimir tempo de execução, uso de memória e CPU
-        print(f"Execution Time: {monitor.end_time - monitor.start_time:.2f} seconds")
-        print(f"Memory Usage: {memory_usage:.2f} MB")
-        print(f"CPU Usage: {cpu_usage:.2f}%")
-
-        # Monitor performance during reviewer's action
-        monitor.provide_feedback(feedback, score)  # Monitor the reviewer's performance
-        
-        print("Reviewer's feedback:\n", feedback)
-        print("Score assigned by Reviewer:", score, "\n")
-
-        # Step 3: Calculate rewards
-        coder_reward = environment.reward_coder(generated_code, score, iteration)
-        if last_reviewer_index != -1:
-            reviewer_reward = environment.reward_reviewer(previous_score, score)
-        previous_score = score  # Update the previous score for the next iteration
-        
-        print("Coder's reward:", coder_reward)
-        if last_reviewer_index != -1:
-            print("Reviewer's reward:", reviewer_reward, "\n")
-        
+        self.log(f"Execution Time: {execution_time:.2f} seconds")
+        self.log(f"Memory Usage: {memory_usage:.2f} MB")
+        self.log(f"CPU Usage: {cpu_usage:.2f}%")
+
+    def reward_coder(self, iteration):
+        return self.environment.reward_coder(self.generated_code, self.score, iteration)
+
+    def end_iteration(self, iteration, coder_reward):
+        """
+        Rewards the Reviewer, updates both Q-tables, logs and saves the iteration and moves to the next state.
+        :return: True if the stopping policies end the episode here.
+        """
+        score = self.score
+        reviewer_reward = None
+        if self.last_reviewer_index != -1:
+            reviewer_reward = self.environment.reward_reviewer(self.previous_score, score)
+        self.previous_score = score  # Update the previous score for the next iteration
+
+        self.log("Coder's reward:", coder_reward)
+        if reviewer_reward is not None:
+            self.log("Reviewer's reward:", reviewer_reward, "\n")
+
         # Changing the state
-        if score == -1: # If the code is not even working
-            next_state = 0
-        elif score < 50: # Bad code
-            next_state = 1
-        elif 50 <= score <= 90: # Average code
-            next_state = 2
-        else:
-            next_state = 3 # Good code
-            
-        c_qlearning.update_q_value(state, coder_action_index, coder_reward, next_state)
-        if last_reviewer_index != -1:
-            r_qlearning.update_q_value(state, last_reviewer_index, reviewer_reward, next_state) # We just reward the reviewer one iteration later
-        
-        print("\n=== Q-values for Coder ===")
-        print(c_qlearning.q_table)
-        
-        print("\n=== Q-values for Reviewer ===")
-        print(r_qlearning.q_table)
-        
+        next_state = score_to_state(score)
+        coder_buffer, reviewer_buffer = self.replay_buffers or (None, None)
+        learn(self.c_qlearning, self.state, self.coder_action_index, coder_reward, next_state, coder_buffer,
+              self.replay_updates)
+        if reviewer_reward is not None:
+            learn(self.r_qlearning, self.state, self.last_reviewer_index, reviewer_reward, next_state,
+                  reviewer_buffer, self.replay_updates) # We just reward the reviewer one iteration later
+        self.timer.lap("reward")
+        timings = self.timer.done()
+        if self.run_log is not None:
+            record_iteration(self.run_log, self.environment, iteration, self.state, next_state,
+                             self.coder_action_index, self.reviewer_action_index, self.generated_code,
+                             self.feedback, score, coder_reward, reviewer_reward, timings, self.candidates,
+                             {name: agent.last_prompt_tokens for name, agent in self.agents.items()},
+                             self.agents if self.stream else None, self.reviewer)
+
+        self.log("\n=== Q-values for Coder ===")
+        self.log(self.c_qlearning.q_table)
+
+        self.log("\n=== Q-values for Reviewer ===")
+        self.log(self.r_qlearning.q_table)
+
         # next state
-        state = next_state
-        last_reviewer_index = reviewer_action_index
-
-        if iteration + 1 in save_iterations:
-            iteration_output = f"Iteration {iteration + 1}\n"
-            iteration_output += f"Coder's action: {coder_action}\n"
-            iteration_output += f"Generated code by Coder:\n{generated_code}\n"
-            iteration_output += f"Reviewer's action: {reviewer_action}\n"
-            iteration_output += f"Reviewer's feedback:\n{feedback}\n"
-            iteration_output += f"Score assigned by Reviewer: {score}\n"
-
-            # Save to a text file
-            file_name = f"iterations/iteration_{iteration + 1}.txt"
-            with open(file_name, 'w') as file:
-                file.write(iteration_output)
+        self.state = next_state
+        self.last_reviewer_index = self.reviewer_action_index
+
+        if iteration + 1 in self.save_iterations:
+            save_iteration(iteration, CODER_PROMPTS[self.coder_action_index], self.generated_code,
+                           REVIEWER_PROMPTS[self.reviewer_action_index], self.feedback, score)
+        if self.session is not None and self.session.due(iteration):
+            flush_buffers(self.replay_buffers)
+            self.session.save(iteration, loop_state_of(self.state, self.previous_score, self.last_reviewer_index,
+                                                       self.generated_code, self.feedback),
+                              self.c_qlearning, self.r_qlearning, self.agents, self.replay_buffers)
+        return should_stop(self.stopping, iteration, score, coder_reward, self.c_qlearning, self.r_qlearning,
+                           self.agents)
+
+    def finish(self, start, last_iteration):
+        """
+        :param last_iteration: Last iteration run, None if the loop did not run.
+        :return: Tuple (c_qlearning, r_qlearning, iterations run).
+        """
+        flush_buffers(self.replay_buffers)
+        self.monitor_agent.close()
+        return (self.c_qlearning, self.r_qlearning,
+                finish(self.stopping, start, last_iteration, self.run_log, self.log))
+
+
+def score_to_state(score):
+    """Maps the Reviewer's score to the state of the next iteration."""
+    if score == -1: # If the code is not even working
+        return 0
+    elif score < 50: # Bad code
+        return 1
+    elif 50 <= score <= 90: # Average code
+        return 2
+    return 3 # Good code
+
+
+LOOP_STATE = ("state", "previous_score", "last_reviewer_index", "generated_code", "feedback")
+
+
+def loop_state_of(state, previous_score, last_reviewer_index, generated_code, feedback):
+    """Collects the loop variables a session snapshot needs to continue the episode."""
+    return dict(zip(LOOP_STATE, (int(state), int(previous_score), int(last_reviewer_index), generated_code,
+                                 feedback)))
+
+
+def learn(qlearning, state, action, reward, next_state, buffer=None, replay_updates=0):
+    """
+    Updates the Q-table with a real transition, then stores it in the replay buffer (if any)
+    and learns again from `replay_updates` batches of past transitions.
+    """
+    qlearning.update_q_value(state, action, reward, next_state)
+    if buffer is not None:
+        buffer.add(state, action, reward, next_state)
+        qlearning.replay(buffer, replay_updates)
+
+
+def flush_buffers(replay_buffers):
+    for buffer in replay_buffers or ():
+        buffer.flush()
+
+
+def should_stop(stopping, iteration, score, coder_reward, c_qlearning, r_qlearning, agents):
+    """Asks the stopping policies, if any, whether the iteration that just ended should be the last."""
+    if stopping is None:
+        return False
+    tokens = sum(agent.tokens for agent in agents.values())
+    progress = Progress(iteration, score, coder_reward, (c_qlearning.q_table, r_qlearning.q_table), tokens)
+    return stopping.check(progress) is not None
 
+
+def finish(stopping, start, last_iteration, run_log, log):
+    """
+    Records why the episode ended.
+    :param last_iteration: Last iteration run (0-based), None if none was.
+    :return: Number of iterations run in this call.
+    """
+    iterations = 0 if last_iteration is None else last_iteration + 1 - start
+    reason = stopping.reason if stopping is not None and stopping.reason is not None else "max_iterations"
+    if run_log is not None:
+        run_log.stop(reason, iterations)
+    log(f"Stopped after {iterations} iterations: {reason}")
+    return iterations
+
+
+class Timer:
+    """Wall time of each step of an iteration, also added to the timing stages when they are enabled."""
+
+    def __init__(self):
+        self.start = self.last = time.perf_counter()
+        self.laps = {}
+
+    def lap(self, name):
+        now = time.perf_counter()
+        self.laps[name] = now - self.last
+        self.last = now
+        if TIMINGS.enabled:
+            TIMINGS.add(f"main.{name}", self.laps[name])
+
+    def done(self):
+        """Ends the iteration and returns the duration of every step and the total."""
+        timings = dict(self.laps, total=time.perf_counter() - self.start)
+        if TIMINGS.enabled:
+            TIMINGS.add("main.iteration", timings["total"])
+        return timings
+
+
+def record_iteration(run_log, environment, iteration, state, next_state, coder_action_index, reviewer_action_index,
+                     generated_code, feedback, score, coder_reward, reviewer_reward, timings, candidates=None,
+                     prompt_tokens=None, streamed_by=None, reviewer=None):
+    """
+    Sends one iteration to the run log, with the code and feedback stored by hash.
+    :param candidates: Candidates of a best-of-K round, if the Coder sampled several.
+    :param prompt_tokens: Dict agent name -> estimated tokens of its last request.
+    :param streamed_by: Dict name -> agent whose last answer was streamed, to log its time to first token.
+    :param reviewer: Reviewer, to log whether its scores could be read.
+    """
+    execution = environment.last_execution
+    metrics = environment.analyze_code(generated_code)
+    extra = {"candidates": [candidate.to_dict() for candidate in candidates]} if candidates else {}
+    if reviewer is not None:
+        extra["review"] = {"structured": reviewer.structured, "reasked": list(reviewer.last_reasked),
+                           "parse_failure_rate": reviewer.review_stats.parse_failure_rate}
+    if streamed_by:
+        extra["streaming"] = {name: {"ttft": agent.last_ttft, "stop": agent.last_stop}
+                              for name, agent in streamed_by.items()}
+    run_log.record(
+        iteration=iteration + 1, state=state, next_state=next_state,
+        coder_action=coder_action_index, reviewer_action=reviewer_action_index,
+        score=score, coder_reward=coder_reward, reviewer_reward=reviewer_reward,
+        code_hash=run_log.body(generated_code), feedback_hash=run_log.body(feedback),
+        timings=timings,
+        prompt_tokens=prompt_tokens,
+        metrics={
+            "success": execution.success if execution else None,
+            "failure": execution.failure if execution else None,
+            "usage": execution.usage._asdict() if execution else None,
+            "loc": metrics.loc,
+            "cyclomatic_complexity": metrics.cyclomatic_complexity,
+            "quality": metrics.quality_score,
+            "complexity": metrics.complexity_score,
+        },
+        **extra,
+    )
+
+
+def save_iteration(iteration, coder_action, generated_code, reviewer_action, feedback, score):
+    iteration_output = f"Iteration {iteration + 1}\n"
+    iteration_output += f"Coder's action: {coder_action}\n"
+    iteration_output += f"Generated code by Coder:\n{generated_code}\n"
+    iteration_output += f"Reviewer's action: {reviewer_action}\n"
+    iteration_output += f"Reviewer's feedback:\n{feedback}\n"
+    iteration_output += f"Score assigned by Reviewer: {score}\n"
+
+    # Save to a text file
+    os.makedirs("iterations", exist_ok=True)
+    file_name = f"iterations/iteration_{iteration + 1}.txt"
+    with open(file_name, 'w') as file:
+        file.write(iteration_output)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Trains the Coder and the Reviewer with Q-learning.")
+    parser.add_argument("--iterations", type=int, default=100)
+    parser.add_argument("--async", dest="use_async", action="store_true",
+                        help="Overlap model requests with Ruff, execution and monitoring")
+    parser.add_argument("--llm-cache", metavar="PATH", help="SQLite file caching the model responses")
+    parser.add_argument("--replay", action="store_true",
+                        help="Only answer from --llm-cache and stop at the first uncached request")
+    parser.add_argument("--mock", action="store_true", help="Use the local mock model instead of Ollama")
+    parser.add_argument("--mock-latency", type=float, default=0.0, help="Median latency of the mock model")
+    parser.add_argument("--mock-failure-rate", type=float, default=0.0)
+    parser.add_argument("--mock-missing-rate", type=float, default=0.0,
+                        help="Probability of the mock model leaving a score out of a JSON review")
+    parser.add_argument("--replay-updates", type=int, default=0, metavar="K",
+                        help="Batches of past transitions replayed after each iteration")
+    parser.add_argument("--replay-dir", default="replay", help="Where the replay buffers are kept between runs")
+    parser.add_argument("--session-dir", default="session", help="Where the snapshots of the loop are written")
+    parser.add_argument("--snapshot-every", type=int, default=10, metavar="N",
+                        help="Take a snapshot every N iterations (0 disables them)")
+    parser.add_argument("--resume", action="store_true", help="Continue from the latest snapshot")
+    parser.add_argument("--run-log", metavar="DIR", default="runs", help="Where the structured log of the run is written")
+    parser.add_argument("--verbosity", type=int, choices=(0, 1, 2), default=2,
+                        help="0: silent, 1: one line per iteration, 2: full code, feedback and Q-tables")
+    parser.add_argument("--stop-score", type=float, metavar="SCORE",
+                        help="Stop once the score stays at or above SCORE for --stop-patience iterations")
+    parser.add_argument("--stop-q-epsilon", type=float, metavar="EPS",
+                        help="Stop once no Q-value moves by EPS or more for --stop-patience iterations")
+    parser.add_argument("--stop-patience", type=int, default=3, metavar="K")
+    parser.add_argument("--stop-plateau", type=int, metavar="WINDOW",
+                        help="Stop when the mean coder reward of two consecutive WINDOWs differs by less "
+                             "than --stop-plateau-delta")
+    parser.add_argument("--stop-plateau-delta", type=float, default=0.01)
+    parser.add_argument("--max-seconds", type=float, help="Wall-clock budget of the run")
+    parser.add_argument("--max-tokens", type=int, help="Budget of model tokens (prompt and response) of the run")
+    parser.add_argument("--prompt-budget", type=int, metavar="TOKENS",
+                        help="Token budget of every prompt (the Ruff report, the tracebacks and the history "
+                             "are cut to fit, never the code)")
+    parser.add_argument("--stream", action="store_true",
+                        help="Stream the answers and stop them once the code block or the seven JSON scores are in")
+    parser.add_argument("--structured-review", action="store_true",
+                        help="Ask the Reviewer for a JSON object with the seven scores")
+    parser.add_argument("--best-of", type=int, default=1, metavar="K",
+                        help="Sample K candidates per iteration and only review the best one")
+    parser.add_argument("--best-of-temperatures", default="0.2,0.5,0.8,1.1",
+                        help="Comma-separated temperatures the candidates cycle through")
+    parser.add_argument("--best-of-vary-prompts", action="store_true",
+                        help="Candidates also use the coder prompts after the chosen one")
+    parser.add_argument("--timing", action="store_true", help="Time every stage of the loop")
+    parser.add_argument("--timing-file", default="timings.json", help="Where the timing summary is exported")
+    parser.add_argument("--timing-live", type=float, default=0, metavar="SECONDS",
+                        help="Print the timing table every SECONDS during the run")
+    args = parser.parse_args()
+
+    llm_cache = None
+    if args.llm_cache or args.replay:
+        llm_cache = LLMCache(args.llm_cache or "llm_cache.sqlite", replay=args.replay)
+
+    llm_client = None
+    if args.mock:
+        mock_model = MockModel(latency=("lognormal", args.mock_latency, 0.5), failure_rate=args.mock_failure_rate,
+                               missing_rate=args.mock_missing_rate)
+        llm_client = AsyncMockClient(mock_model) if args.use_async else MockClient(mock_model)
+
+    replay_buffers = None
+    if args.replay_updates > 0:
+        os.makedirs(args.replay_dir, exist_ok=True)
+        replay_buffers = (ReplayBuffer(path=os.path.join(args.replay_dir, "coder.npy")),
+                          ReplayBuffer(path=os.path.join(args.replay_dir, "reviewer.npy")))
+
+    options = {"max_iterations": args.iterations, "llm_cache": llm_cache, "llm_client": llm_client,
+               "replay_buffers": replay_buffers, "replay_updates": args.replay_updates,
+               "session": Session(args.session_dir, every=args.snapshot_every), "resume": args.resume,
+               "run_log": RunLog(args.run_log, verbosity=args.verbosity),
+               "stopping": StoppingCriteria.from_args(args), "prompt_budget": args.prompt_budget,
+               "stream": args.stream, "structured_review": args.structured_review}
+    if args.best_of > 1:
+        temperatures = [float(value) for value in args.best_of_temperatures.split(",") if value.strip()]
+        options["best_of"] = BestOfK(args.best_of, temperatures, args.best_of_vary_prompts)
+    live_view = None
+    if args.timing or args.timing_live:
+        TIMINGS.enable()
+        if args.timing_live:
+            live_view = LiveView(interval=args.timing_live).start()
+    try:
+        if args.use_async:
+            asyncio.run(run_episode_async(**options))
+        else:
+            run_episode(**options)
+    finally:
+        options["run_log"].close()
+        if live_view is not None:
+            live_view.stop()
+        if options.get("best_of") is not None and args.verbosity > 0:
+            print(options["best_of"].format_summary())
+        if TIMINGS.enabled:
+            print(f"\n=== Timings ===\n{TIMINGS.format()}")
+            TIMINGS.export(args.timing_file)
     print("\n=== Iterative agent flow test completed ===")
 
 if __name__ == "__main__":
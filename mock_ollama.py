@@ -0,0 +1,326 @@
+import argparse
+import asyncio
+import datetime
+import http.server
+import itertools
+import json
+import pathlib
+import random
+import re
+import threading
+import time
+
+import ollama
+
+from scoring import review_schema
+
+CODE_TEMPLATES = [
+    '''import pandas as pd
+import matplotlib.pyplot as plt
+
+# Load the data and clean the prices
+df = pd.read_csv("Sales.csv")
+df["Price"] = pd.to_numeric(df["Price"].str.replace("USD", ""), errors="coerce")
+df = df.dropna()
+df = df[df["Price"] <= 100000]  # Remove outliers
+df["State"] = df["State"].replace({"Pamraná": "Paraná"})
+
+# Sales per state
+df.groupby("State")["Price"].sum().plot(kind="bar", title="Sales per state")
+plt.savefig("sales_per_state.png")
+plt.close()
+
+# Sales per month
+df["Month"] = pd.to_datetime(df["Date"]).dt.month
+df.groupby("Month")["Price"].sum().plot(kind="line", title="Sales per month")
+plt.savefig("sales_per_month.png")
+plt.close()
+''',
+    '''import pandas as pd
+import matplotlib.pyplot as plt
+
+df = pd.read_csv("Sales.csv")
+totals = {}
+for i, row in df.iterrows():
+    price = float(str(row["Price"]).replace("USD", ""))
+    if price > 100000:
+        continue
+    totals[row["State"]] = totals.get(row["State"], 0) + price
+
+plt.bar(list(totals.keys()), list(totals.values()))
+plt.show()
+''',
+    '''import pandas as pd
+
+df = pd.read_csv("Sales.csv")
+df["Price"] = df["Price"].astype(float)  # Fails: prices end with USD
+print(df.groupby("State")["Price"].sum())
+''',
+]
+
+REVIEW_CRITERIA = [
+    ("Data Analysis", 20), ("Adherence to PEP-8", 20), ("Code logic and structure", 20), ("Code comments", 10),
+    ("Visualizations", 10), ("Error prevention", 10), ("Code optimization", 10),
+]
+
+
+class MockModel:
+    """
+    Scripted stand-in for the model behind the Ollama chat API.
+    Code requests are answered with fenced programs taken in turn from `code_responses`
+    (by default a few Sales.csv programs, good and bad), review requests with the seven
+    rubric scores drawn at random. Each call waits a latency drawn from `latency` and
+    fails with probability `failure_rate`. When streamed, a fifth of the latency passes before
+    the first chunk and the rest is spread over the following ones.
+    :param latency: ("constant", seconds), ("uniform", low, high) or ("lognormal", median, sigma).
+    :param ramble: Text appended after every answer, like small models tend to do.
+    :param missing_rate: With a JSON output format, probability of leaving out each score.
+    """
+
+    def __init__(self, code_responses=None, review_responses=None, latency=("constant", 0.0),
+                 failure_rate=0.0, seed=None, ramble="", missing_rate=0.0):
+        self.code_responses = list(code_responses or CODE_TEMPLATES)
+        self.review_responses = list(review_responses or [])
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.ramble = ramble
+        self.missing_rate = missing_rate
+        self.random = random.Random(seed)
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_directory(cls, path, **kwargs):
+        """Builds a model that answers code requests with the .py files found in `path`."""
+        files = sorted(pathlib.Path(path).glob("*.py"))
+        return cls(code_responses=[f.read_text(encoding="utf-8", errors="replace") for f in files], **kwargs)
+
+    def respond(self, model, messages, format=None):
+        """
+        Produces the reply to a chat request, after the simulated latency.
+        :param format: Output format of the request; "json" or a schema gives a JSON review.
+        :return: Response with the same fields as ollama's ChatResponse.
+        :raises ollama.ResponseError: On a simulated failure.
+        """
+        prompt, content, delay, failed = self._draw(messages, format)
+        time.sleep(delay)
+        if failed:
+            raise ollama.ResponseError("mock model failure", 500)
+        return _chat_response(model, content, prompt, delay)
+
+    def respond_stream(self, model, messages, format=None, chunk_words=3):
+        """
+        Produces the reply as ollama streams it: chunks of a few words, the last one empty
+        with done set and the token counts. Stopping the iteration stops the generation.
+        :raises ollama.ResponseError: On a simulated failure, before the first chunk.
+        """
+        prompt, content, delay, failed = self._draw(messages, format)
+        time.sleep(delay / 5)
+        if failed:
+            raise ollama.ResponseError("mock model failure", 500)
+        pieces = re.findall(r"\S+\s*|\s+", content)
+        pieces = ["".join(pieces[i:i + chunk_words]) for i in range(0, len(pieces), chunk_words)]
+        for i, piece in enumerate(pieces):
+            if i:
+                time.sleep(delay * 4 / 5 / len(pieces))
+            yield _chunk(model, piece)
+        yield _chat_response(model, "", prompt, delay, eval_count=len(content.split()))
+
+    def _draw(self, messages, format=None):
+        with self._lock:
+            self.calls += 1
+            call = self.calls
+            delay = self._draw_latency()
+            failed = self.random.random() < self.failure_rate
+            prompt = messages[0]["content"] if messages else ""
+            if format:
+                return prompt, self._structured_review(format), delay, failed  # JSON mode: no rambling
+            content = self._review(call) if "Code to review" in prompt else self._code(call)
+        return prompt, content + self.ramble, delay, failed
+
+    def _draw_latency(self):
+        kind, *params = self.latency
+        if kind == "constant":
+            return params[0]
+        if kind == "uniform":
+            return self.random.uniform(*params)
+        if kind == "lognormal":
+            median, sigma = params
+            return self.random.lognormvariate(0, sigma) * median
+        raise ValueError(f"Unknown latency distribution: {kind}")
+
+    def _code(self, call):
+        code = self.code_responses[(call - 1) % len(self.code_responses)]
+        return f"Here is the code:\n\n```python\n{code.strip()}\n```\n\nIt cleans the data and plots the sales."
+
+    def _review(self, call):
+        if self.review_responses:
+            return self.review_responses[(call - 1) % len(self.review_responses)]
+        lines = [f"{i}. **{name}** ({self.random.randint(maximum // 4, maximum)} points): could be improved."
+                 for i, (name, maximum) in enumerate(REVIEW_CRITERIA, start=1)]
+        return "Review of the code:\n\n" + "\n".join(lines)
+
+
+    def _structured_review(self, format):
+        schema = format if isinstance(format, dict) else review_schema()
+        review = {}
+        for name, rules in schema["properties"].items():
+            if rules["type"] == "string":
+                review[name] = "The code could be improved."
+            elif self.random.random() >= self.missing_rate:
+                review[name] = self.random.randint(rules["maximum"] // 4, rules["maximum"])
+        return json.dumps(review)
+
+
+class MockClient:
+    """In-process replacement for `ollama` / `ollama.Client`: agents call `.chat()` on it the same way."""
+
+    def __init__(self, model=None):
+        self.model = model if model is not None else MockModel()
+
+    def chat(self, model, messages, options=None, stream=False, format=None, **kwargs):
+        if stream:
+            return self.model.respond_stream(model, messages, format)
+        return self.model.respond(model, messages, format)
+
+
+class AsyncMockClient:
+    """In-process replacement for `ollama.AsyncClient`."""
+
+    def __init__(self, model=None):
+        self.model = model if model is not None else MockModel()
+
+    async def chat(self, model, messages, options=None, stream=False, format=None, **kwargs):
+        if stream:
+            return _stream_in_thread(self.model.respond_stream(model, messages, format))
+        return await asyncio.to_thread(self.model.respond, model, messages, format)
+
+
+async def _stream_in_thread(chunks):
+    # Each chunk is waited for in a thread, like the sleeping non-streamed responses
+    try:
+        while True:
+            chunk = await asyncio.to_thread(next, chunks, None)
+            if chunk is None:
+                return
+            yield chunk
+    finally:
+        chunks.close()
+
+
+class MockServer:
+    """
+    Serves a MockModel over localhost HTTP at /api/chat, so the real Ollama client can be
+    pointed at it (e.g. OLLAMA_HOST=http://127.0.0.1:11435).
+    """
+
+    def __init__(self, model=None, host="127.0.0.1", port=11435):
+        self.model = model if model is not None else MockModel()
+        self.server = http.server.ThreadingHTTPServer((host, port), _handler_for(self.model))
+        self.thread = None
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def _handler_for(model):
+    class Handler(http.server.BaseHTTPRequestHandler):
+        def do_POST(self):
+            if self.path != "/api/chat":
+                self._send(404, {"error": f"unknown endpoint {self.path}"})
+                return
+            request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+            if request.get("stream", True):  # Ollama streams unless told otherwise
+                self._stream(model.respond_stream(request.get("model"), request.get("messages", []),
+                                                  request.get("format")))
+                return
+            try:
+                response = model.respond(request.get("model"), request.get("messages", []), request.get("format"))
+            except ollama.ResponseError as e:
+                self._send(e.status_code, {"error": e.error})
+                return
+            self._send(200, response)
+
+        def _stream(self, chunks):
+            try:
+                first = next(chunks)
+            except ollama.ResponseError as e:
+                self._send(e.status_code, {"error": e.error})
+                return
+            # Newline-delimited JSON until the connection closes, like Ollama
+            self.send_response(200)
+            self.send_header("Content-Type", "application/x-ndjson")
+            self.end_headers()
+            try:
+                for chunk in itertools.chain([first], chunks):
+                    self.wfile.write(json.dumps(chunk).encode("utf-8") + b"\n")
+                    self.wfile.flush()
+            except (BrokenPipeError, ConnectionResetError):
+                pass  # The client stopped reading: the generation stops here
+            finally:
+                chunks.close()
+
+        def _send(self, status, body):
+            data = json.dumps(body).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, format, *args):
+            pass  # One line per request would drown the training output
+
+    return Handler
+
+
+def _chunk(model, content):
+    return {
+        "model": model,
+        "created_at": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "message": {"role": "assistant", "content": content},
+        "done": False,
+    }
+
+
+def _chat_response(model, content, prompt, delay, eval_count=None):
+    return {
+        "model": model,
+        "created_at": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "message": {"role": "assistant", "content": content},
+        "done": True,
+        "done_reason": "stop",
+        "total_duration": int(delay * 1e9),
+        "prompt_eval_count": len(prompt.split()),  # Rough token counts
+        "eval_count": len(content.split()) if eval_count is None else eval_count,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local stand-in for the Ollama chat API.")
+    parser.add_argument("--port", type=int, default=11435)
+    parser.add_argument("--latency", type=float, default=0.0, help="Median latency in seconds")
+    parser.add_argument("--sigma", type=float, default=0.0, help="Log-normal spread of the latency")
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    parser.add_argument("--missing-rate", type=float, default=0.0, help="Scores left out of JSON reviews")
+    parser.add_argument("--corpus", help="Directory of .py files used as code responses")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    options = {"latency": ("lognormal", args.latency, args.sigma), "failure_rate": args.failure_rate,
+               "seed": args.seed, "missing_rate": args.missing_rate}
+    mock = MockModel.from_directory(args.corpus, **options) if args.corpus else MockModel(**options)
+    server = MockServer(mock, port=args.port)
+    print(f"Mock model server listening on {server.url}")
+    server.server.serve_forever()
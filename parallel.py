@@ -0,0 +1,162 @@
+import argparse
+import concurrent.futures
+import os
+import pathlib
+import shutil
+import time
+
+import numpy as np
+
+from main import run_episode, CODER_PROMPTS, REVIEWER_PROMPTS
+from qlearning import QLearning
+from sampler import ResourceSampler
+from sandbox import CodeExecutor, ResourceLimits
+
+
+class ParallelTrainer:
+    """
+    Runs independent Coder/Reviewer episodes at the same time over a process pool.
+    Episodes run in rounds of `workers`: every episode of a round starts from the shared
+    Q-tables and, when the round ends, the updates they made are averaged back into them.
+    """
+
+    def __init__(self, episodes, workers=None, max_iterations=100, work_dir="episodes",
+                 data_files=("Sales.csv",), backend="forkserver", state_space_size=4):
+        self.episodes = episodes
+        self.workers = workers or os.cpu_count() or 1
+        self.max_iterations = max_iterations
+        self.work_dir = pathlib.Path(work_dir).resolve()
+        self.data_files = [pathlib.Path(path).resolve() for path in data_files]
+        self.backend = backend
+        self.coder_qlearning = QLearning(CODER_PROMPTS, state_space_size)
+        self.reviewer_qlearning = QLearning(REVIEWER_PROMPTS, state_space_size)
+        self.stats = {}
+
+    def train(self):
+        """
+        Runs all the episodes and merges their Q-tables into the shared ones.
+        :return: Tuple (coder QLearning, reviewer QLearning).
+        """
+        self.work_dir.mkdir(parents=True, exist_ok=True)
+        cache_dir = self.work_dir / "execution_cache"  # Programs are shared, so their results are too
+        start = time.perf_counter()
+        finished = iterations = 0
+
+        with concurrent.futures.ProcessPoolExecutor(max_workers=self.workers) as pool:
+            for round_start in range(0, self.episodes, self.workers):
+                coder_state = _export(self.coder_qlearning)
+                reviewer_state = _export(self.reviewer_qlearning)
+                futures = [
+                    pool.submit(_episode_worker, index, str(self.work_dir), [str(p) for p in self.data_files],
+                                self.max_iterations, coder_state, reviewer_state, str(cache_dir), self.backend)
+                    for index in range(round_start, min(round_start + self.workers, self.episodes))
+                ]
+
+                results = []
+                for future in concurrent.futures.as_completed(futures):
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        print(f"Error running episode: {e}")
+                        continue
+                    if result is not None:
+                        results.append(result)
+
+                merge_q_tables(self.coder_qlearning, [r["coder"] for r in results])
+                merge_q_tables(self.reviewer_qlearning, [r["reviewer"] for r in results])
+                finished += len(results)
+                iterations += sum(r["iterations"] for r in results)
+                self._report(finished, iterations, time.perf_counter() - start)
+
+        return self.coder_qlearning, self.reviewer_qlearning
+
+    def _report(self, finished, iterations, elapsed):
+        self.stats = {
+            "episodes": finished,
+            "iterations": iterations,
+            "elapsed": elapsed,
+            "episodes_per_hour": finished / elapsed * 3600 if elapsed else 0.0,
+            "iterations_per_second": iterations / elapsed if elapsed else 0.0,
+        }
+        print(f"{finished}/{self.episodes} episodes in {elapsed:.1f}s: "
+              f"{self.stats['episodes_per_hour']:.2f} episodes/hour, "
+              f"{self.stats['iterations_per_second']:.3f} iterations/sec")
+
+
+def merge_q_tables(shared, episode_states):
+    """
+    Averages the changes each episode made to the shared table, weighted by how many
+    times each episode updated each cell. Cells no episode touched are kept as they are.
+    :param shared: QLearning holding the shared table.
+    :param episode_states: List of (q_table, visits, exploration_rate) returned by the episodes.
+    """
+    if not episode_states:
+        return
+    base = shared.q_table.astype(np.float64)
+    visits = sum(v for _, v, _ in episode_states)
+    delta = sum(v * (q - base) for q, v, _ in episode_states)
+    merged = np.where(visits > 0, base + delta / np.maximum(visits, 1), base)
+    shared.q_table[...] = merged
+    shared.visits += visits
+    shared.exploration_rate = float(np.mean([rate for _, _, rate in episode_states]))
+
+
+def _export(qlearning):
+    return qlearning.q_table.copy(), qlearning.exploration_rate
+
+
+def _restore(actions, state):
+    q_table, exploration_rate = state
+    qlearning = QLearning(actions, q_table.shape[0], exploration_rate=exploration_rate)
+    qlearning.q_table = q_table.copy()
+    return qlearning
+
+
+def _episode_worker(index, work_dir, data_files, max_iterations, coder_state, reviewer_state, cache_dir, backend):
+    """
+    Runs one episode inside its own working directory, so temporary files such as
+    temp_code.py and the iterations/ reports never clash with other episodes.
+    The pool keeps its processes between episodes, so the zygote of the executor and the
+    sampling thread the monitor reads from are stopped when the episode ends, however it ends.
+    """
+    episode_dir = pathlib.Path(work_dir) / f"episode_{index:03d}"
+    (episode_dir / "iterations").mkdir(parents=True, exist_ok=True)
+    for path in data_files:
+        shutil.copy(path, episode_dir)
+    os.chdir(episode_dir)
+
+    sampler = ResourceSampler().start()
+    executor = CodeExecutor(cache_dir=cache_dir, backend=backend, sampler=sampler, limits=ResourceLimits(),
+                            incremental=True)
+    try:
+        coder_qlearning = _restore(CODER_PROMPTS, coder_state)
+        reviewer_qlearning = _restore(REVIEWER_PROMPTS, reviewer_state)
+        result = run_episode(max_iterations, coder_qlearning, reviewer_qlearning, executor=executor, verbose=False)
+    finally:
+        executor.close()
+        sampler.stop()
+    if result is None:
+        return None
+
+    coder_qlearning, reviewer_qlearning, iterations = result
+    return {
+        "coder": (coder_qlearning.q_table, coder_qlearning.visits, coder_qlearning.exploration_rate),
+        "reviewer": (reviewer_qlearning.q_table, reviewer_qlearning.visits, reviewer_qlearning.exploration_rate),
+        "iterations": iterations,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Runs Coder/Reviewer episodes in parallel.")
+    parser.add_argument("--episodes", type=int, default=4)
+    parser.add_argument("--workers", type=int, default=None, help="Processes in the pool (default: all cores)")
+    parser.add_argument("--iterations", type=int, default=100, help="Iterations per episode")
+    parser.add_argument("--work-dir", default="episodes")
+    args = parser.parse_args()
+
+    trainer = ParallelTrainer(args.episodes, args.workers, args.iterations, args.work_dir)
+    coder_qlearning, reviewer_qlearning = trainer.train()
+    print("\n=== Q-values for Coder ===")
+    print(coder_qlearning.q_table)
+    print("\n=== Q-values for Reviewer ===")
+    print(reviewer_qlearning.q_table)
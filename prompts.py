@@ -0,0 +1,157 @@
+import collections
+import re
+
+# Words, numbers and single punctuation marks: close to what a BPE tokenizer gives on code and English
+_TOKEN = re.compile(r"\w+|[^\w\s]")
+
+
+def count_tokens(text):
+    """
+    Estimates the number of model tokens of a text, without the model's tokenizer.
+    Long identifiers are split into pieces by real tokenizers, so this undercounts them a little.
+    """
+    return sum(1 + len(match) // 8 for match in _TOKEN.findall(text))
+
+
+def truncate(text, max_tokens, marker="\n... [{cut} tokens cut] ...\n"):
+    """
+    Shortens a text to about `max_tokens` by cutting its middle, on line boundaries when possible.
+    The start and the end are kept: for code that is the imports and the last statements,
+    for outputs the command and the final error.
+    """
+    tokens = count_tokens(text)
+    if tokens <= max_tokens:
+        return text
+    if max_tokens <= 0:
+        return ""
+    room = max(0, max_tokens - count_tokens(marker.format(cut=tokens)))
+    keep = int(len(text) * room / tokens)
+    half = keep // 2
+    head, tail = text[:half], text[len(text) - half:] if half else ""
+    # Do not leave half lines on either side of the cut
+    if "\n" in head:
+        head = head[:head.rindex("\n") + 1]
+    if "\n" in tail:
+        tail = tail[tail.index("\n") + 1:]
+    cut = tokens - count_tokens(head) - count_tokens(tail)
+    return head + marker.format(cut=cut) + tail
+
+
+def truncate_traceback(text, max_frames=3, max_line_length=300):
+    """
+    Keeps the first line and the last `max_frames` frames of each Python traceback in a
+    stderr text, and the exception message, dropping the frames inside libraries above them.
+    Repeated lines (e.g. warnings) are collapsed and very long lines are shortened.
+    """
+    lines = []
+    previous, repeats = None, 0
+    for line in text.splitlines():
+        if line == previous:
+            repeats += 1
+            continue
+        if repeats:
+            lines.append(f"  [previous line repeated {repeats} more times]")
+        previous, repeats = line, 0
+        lines.append(line if len(line) <= max_line_length else line[:max_line_length] + " ...")
+    if repeats:
+        lines.append(f"  [previous line repeated {repeats} more times]")
+
+    result = []
+    frames = []  # Frames (File line plus its source lines) of the traceback being read
+
+    def flush_frames():
+        if len(frames) > max_frames:
+            result.append(f"  [{len(frames) - max_frames} frames omitted]")
+        for frame in frames[-max_frames:]:
+            result.extend(frame)
+        frames.clear()
+
+    in_traceback = False
+    for line in lines:
+        if line.startswith("Traceback (most recent call last):"):
+            result.append(line)
+            frames.clear()
+            in_traceback = True
+        elif in_traceback and line.startswith("  File "):
+            frames.append([line])
+        elif in_traceback and line.startswith("    ") and frames:
+            frames[-1].append(line)
+        else:
+            if in_traceback:
+                flush_frames()
+                in_traceback = False
+            result.append(line)
+    flush_frames()  # A traceback cut before its exception line
+    return "\n".join(result)
+
+
+def summarize_lint(report, max_items=10):
+    """
+    Condenses a LintReport to one line per rule (count, first lines, message), most frequent
+    rules first, keeping at most `max_items` rules. Anything else is formatted as is.
+    """
+    diagnostics = getattr(report, "diagnostics", None)
+    if not diagnostics or getattr(report, "error", None) is not None:
+        return str(report)
+    by_code = collections.OrderedDict()
+    for diagnostic in diagnostics:
+        by_code.setdefault(diagnostic.code, []).append(diagnostic)
+    rules = sorted(by_code.items(), key=lambda item: -len(item[1]))
+    lines = []
+    for code, found in rules[:max_items]:
+        at = ", ".join(str(d.line) for d in found[:5]) + (", ..." if len(found) > 5 else "")
+        lines.append(f"{code} x{len(found)} (line {at}): {found[0].message}")
+    if len(rules) > max_items:
+        lines.append(f"... and {sum(len(found) for _, found in rules[max_items:])} more issues "
+                     f"of {len(rules) - max_items} other rules")
+    lines.append(f"Found {len(diagnostics)} error{'s' if len(diagnostics) != 1 else ''}.")
+    return "\n".join(lines)
+
+
+class PromptBuilder:
+    """
+    Assembles prompts that fit a token budget. A prompt is a list of sections (text, order):
+    sections with order None are always sent whole, the others are cut in their middle, lowest
+    order first, until the prompt fits in `budget` tokens. The conversation history sent with
+    it is bounded to its most recent `history_budget` tokens.
+    The tokens of every prompt built are kept in `counts`.
+    """
+
+    def __init__(self, budget=3072, history_budget=1024, max_counts=1000):
+        self.budget = budget
+        self.history_budget = history_budget
+        self.counts = collections.deque(maxlen=max_counts)
+
+    def build(self, *sections):
+        """
+        :param sections: Tuples (text, order); order None never shrinks.
+        :return: The prompt, within the budget unless the fixed sections alone go over it.
+        """
+        texts = [text for text, _ in sections]
+        sizes = [count_tokens(text) for text in texts]
+        over = sum(sizes) - self.budget
+        shrinkable = sorted((order, i) for i, (_, order) in enumerate(sections) if order is not None)
+        for _, i in shrinkable:
+            if over <= 0:
+                break
+            texts[i] = truncate(texts[i], max(0, sizes[i] - over))
+            new_size = count_tokens(texts[i])
+            over -= sizes[i] - new_size
+            sizes[i] = new_size
+        return "".join(texts)
+
+    def trim_history(self, memory):
+        """Drops the oldest messages of a conversation until it fits in `history_budget` tokens."""
+        kept, total = [], 0
+        for message in reversed(memory):
+            total += count_tokens(message.get("content", ""))
+            if total > self.history_budget:
+                break
+            kept.append(message)
+        return kept[::-1]
+
+    def record(self, messages):
+        """Counts the tokens of the messages of one request. :return: The count."""
+        tokens = sum(count_tokens(message.get("content", "")) for message in messages)
+        self.counts.append(tokens)
+        return tokens
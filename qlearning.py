@@ -1,18 +1,27 @@
 import numpy as np
-import csv
 import random
+import checkpoint
+from timing import timed
 
 class QLearning:
-    def __init__(self, actions, state_space_size, learning_rate=0.1, discount_factor=0.9, exploration_rate=1.0, exploration_decay=0.99):
+    def __init__(self, actions, state_space_size, learning_rate=0.1, discount_factor=0.9, exploration_rate=1.0, exploration_decay=0.99,
+                 initial_q=5.0, dtype=np.float64, trace_decay=0.0, seed=None):
         self.actions = actions  # List of possible actions
-        
+
         # I changed to it starts with 5 so we encourage the coder to explore more at the start
-        self.q_table = np.full((state_space_size, len(actions)), 5) # Q-table initialized with fives
+        self.q_table = np.full((state_space_size, len(actions)), initial_q, dtype=dtype) # Q-table initialized with fives
+        self.visits = np.zeros((state_space_size, len(actions)), dtype=np.int64) # Updates per cell, used to merge tables
         self.learning_rate = learning_rate
         self.discount_factor = discount_factor
         self.exploration_rate = exploration_rate
         self.exploration_decay = exploration_decay
+        # Eligibility traces (Q(lambda)) for update_q_value, off when trace_decay is 0
+        self.trace_decay = trace_decay
+        self.traces = np.zeros_like(self.q_table) if trace_decay > 0 else None
+        self.rng = np.random.default_rng(seed)  # Used by the batched methods
+        self.delta_logs = {}  # Open checkpoint.DeltaLog per file name
 
+    @timed("qlearning.choose_action")
     def choose_action(self, state):
         # Epsilon-greedy to choose action: explore or exploit
         if random.uniform(0, 1) < self.exploration_rate:
@@ -20,26 +29,123 @@ class QLearning:
         else:
             return np.argmax(self.q_table[state])  # Choose the action with the highest Q value
 
+    def choose_actions(self, states):
+        """
+        Epsilon-greedy choice for many environments at once.
+        :param states: Array of the current state of each environment.
+        :return: Array with one action index per environment.
+        """
+        states = np.asarray(states)
+        greedy = np.argmax(self.q_table[states], axis=1)
+        explore = self.rng.random(states.shape[0]) < self.exploration_rate
+        return np.where(explore, self.rng.integers(len(self.actions), size=states.shape[0]), greedy)
+
+    @timed("qlearning.update_q_value")
     def update_q_value(self, state, action, reward, next_state):
         # Update the Q-table
         best_future_q = np.max(self.q_table[next_state])
         current_q = self.q_table[state, action]
         # Q-learning formula
-        new_q = current_q + self.learning_rate * (reward + self.discount_factor * best_future_q - current_q)
-        self.q_table[state, action] = new_q
+        td_error = reward + self.discount_factor * best_future_q - current_q
+        if self.traces is None:
+            self.q_table[state, action] = current_q + self.learning_rate * td_error
+        else:
+            # Every recently visited pair gets part of the error, fading by gamma * lambda per step
+            self.traces[state, action] += 1
+            self.q_table += self.learning_rate * td_error * self.traces
+            self.traces *= self.discount_factor * self.trace_decay
+        self.visits[state, action] += 1
 
         # Exploration rate decay
         self.exploration_rate *= self.exploration_decay
 
+    @timed("qlearning.update_many")
+    def update_many(self, states, actions, rewards, next_states, dones=None):
+        """
+        Applies a batch of transitions at once, all computed from the table before the batch.
+        Transitions of the same (state, action) pair are averaged into one step, so a batch
+        moves each Q-value at most one learning-rate step towards its targets, however many
+        environments hit it. Eligibility traces are not used here: the transitions may come
+        from different episodes.
+        :param states: Array of states.
+        :param actions: Array of action indices, one per state.
+        :param rewards: Array of rewards.
+        :param next_states: Array of the states reached.
+        :param dones: Optional boolean array; a finished episode has no future value.
+        :return: Array of the TD errors.
+
+        >>> q = QLearning(["a", "b"], 2, learning_rate=0.5, discount_factor=0.0, initial_q=0.0)
+        >>> _ = q.update_many([0] * 100, [0] * 100, [1.0] * 100, [1] * 100)
+        >>> float(q.q_table[0, 0])
+        0.5
+        """
+        states, actions = np.asarray(states), np.asarray(actions)
+        td_errors = self._apply(states, actions, rewards, next_states, dones)
+        np.add.at(self.visits, (states, actions), 1)
+
+        # Same decay as one update_q_value call per transition
+        self.exploration_rate *= self.exploration_decay ** len(states)
+        return td_errors
+
+    @timed("qlearning.replay")
+    def replay(self, buffer, updates=1, batch_size=32, prioritized=False, beta=0.4):
+        """
+        Learns again from past transitions stored in a ReplayBuffer.
+        Replays neither count as visits nor decay the exploration rate: they are no new experience.
+        Batches are drawn with replacement, so a cell sampled many times still moves by a single
+        step, the mean of its TD errors weighted by the importance weights.
+        :param updates: Number of batches to replay.
+        :param prioritized: Sample by TD error and refresh the priorities afterwards.
+
+        >>> from replay import ReplayBuffer
+        >>> buffer = ReplayBuffer(capacity=4, seed=0)
+        >>> buffer.add(0, 1, 1.0, 1)
+        >>> q = QLearning(["a", "b", "c", "d"], 4, discount_factor=0.9, initial_q=5.0)
+        >>> for _ in range(6):
+        ...     q.replay(buffer, batch_size=32, prioritized=True)
+        >>> 5.0 <= float(q.q_table[0, 1]) <= 1.0 + 0.9 * 5.0
+        True
+        """
+        if len(buffer) == 0:
+            return
+        for _ in range(updates):
+            states, actions, rewards, next_states, dones, indices, weights = buffer.sample(
+                batch_size, prioritized, beta)
+            td_errors = self._apply(states, actions, rewards, next_states, dones, weights)
+            if prioritized:
+                buffer.update_priorities(indices, td_errors)
+
+    def _apply(self, states, actions, rewards, next_states, dones=None, weights=None):
+        best_future_q = self.q_table[np.asarray(next_states)].max(axis=1)
+        if dones is not None:
+            best_future_q = np.where(dones, 0.0, best_future_q)
+        td_errors = np.asarray(rewards) + self.discount_factor * best_future_q - self.q_table[states, actions]
+        steps = self.learning_rate * td_errors if weights is None else self.learning_rate * weights * td_errors
+        # Every step was computed from the same Q-value, so repeated cells take the mean step instead of the sum,
+        # weighted by the importance weights of the cell when there are some
+        cells = np.ravel_multi_index((states, actions), self.q_table.shape)
+        sums = np.bincount(cells, weights=steps, minlength=self.q_table.size)
+        totals = np.bincount(cells, weights=weights, minlength=self.q_table.size)
+        self.q_table += np.divide(sums, totals, out=np.zeros_like(sums), where=totals > 0).reshape(self.q_table.shape)
+        return td_errors
+
+    def reset_traces(self):
+        # Call at the start of each episode
+        if self.traces is not None:
+            self.traces[...] = 0
+
     def save_q_table(self, iteration, is_reviewer=False):
         # Usa um nome diferente para o arquivo dependendo de quem está salvando
-        file_name = "reviewer_q_tables.csv" if is_reviewer else "coder_q_tables.csv"
-        with open(file_name, 'a', newline='') as file:
-            writer = csv.writer(file)
-
-            if iteration == 0:  # No primeiro, escreve o cabeçalho
-                header = ['Iteration'] + [f'Action {i+1}' for i in range(self.q_table.shape[1])]
-                writer.writerow(header)
+        name = "reviewer_q_table" if is_reviewer else "coder_q_table"
+        # Checkpoint binário com a última tabela, e um log só com as células que mudaram em cada iteração
+        checkpoint.save_checkpoint(self, f"{name}.qtbl", iteration)
+        if name not in self.delta_logs:
+            self.delta_logs[name] = checkpoint.DeltaLog(f"{name}.qlog")
+        self.delta_logs[name].append(self, iteration)
 
-            for row in self.q_table:
-                writer.writerow([iteration] + list(row))
\ No newline at end of file
+    def load_q_table(self, is_reviewer=False, mmap=True):
+        """
+        Resumes from the checkpoint written by save_q_table.
+        :return: The iteration it was saved at.
+        """
+        return checkpoint.restore(self, "reviewer_q_table.qtbl" if is_reviewer else "coder_q_table.qtbl", mmap)
@@ -0,0 +1,122 @@
+import json
+import os
+
+import numpy as np
+
+TRANSITION_DTYPE = np.dtype([
+    ("state", np.int64), ("action", np.int64), ("reward", np.float64), ("next_state", np.int64),
+    ("done", np.bool_), ("priority", np.float64),
+])
+
+
+class ReplayBuffer:
+    """
+    Ring buffer of the last `capacity` transitions, stored in preallocated NumPy arrays.
+    Sampling is uniform or prioritized by TD error (priority ** alpha, with importance
+    weights). With a `path`, the transitions live in a memory-mapped .npy file and the
+    write position in `path`.json, so the buffer survives restarts (call flush() to sync).
+    """
+
+    def __init__(self, capacity=10000, path=None, alpha=0.6, seed=None):
+        self.capacity = capacity
+        self.path = path
+        self.alpha = alpha
+        self.rng = np.random.default_rng(seed)
+        self.position = 0  # Next slot to write
+        self.size = 0
+
+        if path is not None and os.path.exists(path):
+            self.data = np.lib.format.open_memmap(path, mode="r+")
+            if self.data.dtype != TRANSITION_DTYPE or self.data.shape != (capacity,):
+                raise ValueError(f"Replay buffer {path} has shape {self.data.shape} and dtype {self.data.dtype}, "
+                                 f"expected ({capacity},) and {TRANSITION_DTYPE}")
+            try:
+                with open(f"{path}.json") as f:
+                    meta = json.load(f)
+                self.position, self.size = meta["position"], meta["size"]
+            except FileNotFoundError:
+                pass  # Never flushed: nothing to trust in the file
+        elif path is not None:
+            self.data = np.lib.format.open_memmap(path, mode="w+", dtype=TRANSITION_DTYPE, shape=(capacity,))
+        else:
+            self.data = np.zeros(capacity, dtype=TRANSITION_DTYPE)
+
+    def __len__(self):
+        return self.size
+
+    def add(self, state, action, reward, next_state, done=False):
+        """Stores one transition, overwriting the oldest one when the buffer is full."""
+        self.add_many([state], [action], [reward], [next_state], [done])
+
+    def add_many(self, states, actions, rewards, next_states, dones=None):
+        """
+        Stores a batch of transitions. New transitions get the highest priority seen so far,
+        so each one is sampled at least once soon after it arrives.
+        """
+        count = len(states)
+        if count == 0:
+            return
+        indices = (self.position + np.arange(count)) % self.capacity
+        batch = self.data[indices]  # A copy: written back in one go below
+        batch["state"], batch["action"], batch["reward"], batch["next_state"] = states, actions, rewards, next_states
+        batch["done"] = dones if dones is not None else False
+        batch["priority"] = self.data["priority"][:self.size].max() if self.size else 1.0
+        self.data[indices] = batch
+        self.position = int((self.position + count) % self.capacity)
+        self.size = min(self.size + count, self.capacity)
+
+    def sample(self, batch_size, prioritized=False, beta=0.4):
+        """
+        Draws a batch of stored transitions, with replacement.
+        :param prioritized: Sample proportionally to priority ** alpha instead of uniformly.
+        :param beta: How much the importance weights correct the prioritized sampling (0 to 1).
+        :return: Tuple (states, actions, rewards, next_states, dones, indices, weights); the
+                 weights are all 1 with uniform sampling.
+        """
+        if self.size == 0:
+            raise ValueError("Cannot sample from an empty replay buffer")
+        if prioritized:
+            probabilities = self.data["priority"][:self.size] ** self.alpha
+            probabilities /= probabilities.sum()
+            indices = self.rng.choice(self.size, size=batch_size, p=probabilities)
+            weights = (self.size * probabilities[indices]) ** -beta
+            weights /= weights.max()
+        else:
+            indices = self.rng.integers(self.size, size=batch_size)
+            weights = np.ones(batch_size)
+        batch = self.data[indices]
+        return (batch["state"], batch["action"], batch["reward"], batch["next_state"], batch["done"],
+                indices, weights)
+
+    def update_priorities(self, indices, td_errors, epsilon=1e-3):
+        """Sets the priority of sampled transitions from their latest TD errors."""
+        self.data["priority"][indices] = np.abs(td_errors) + epsilon
+
+    def save_snapshot(self, path):
+        """
+        Copies the stored transitions to the .npy file `path`, to roll the buffer back to this
+        point with restore_snapshot. Unlike flush(), it is a copy: later writes do not change it.
+        :return: JSON-serializable dict with the write position and the sampling RNG state.
+        """
+        np.save(path, self.data[:self.size])
+        return {"position": self.position, "size": self.size, "random_state": self.rng.bit_generator.state}
+
+    def restore_snapshot(self, path, state):
+        """Puts back the transitions, write position and RNG state saved by save_snapshot."""
+        saved = np.load(path)
+        if saved.dtype != TRANSITION_DTYPE or len(saved) > self.capacity:
+            raise ValueError(f"Replay snapshot {path} does not fit a buffer of capacity {self.capacity}")
+        self.data[:len(saved)] = saved
+        self.position, self.size = state["position"], state["size"]
+        self.rng.bit_generator.state = state["random_state"]
+        self.flush()
+
+    def flush(self):
+        """Writes the memory-mapped transitions and the write position to disk."""
+        if self.path is None:
+            return
+        self.data.flush()
+        temp_path = f"{self.path}.json.tmp"
+        with open(temp_path, "w") as f:
+            json.dump({"position": self.position, "size": self.size}, f)
+        os.replace(temp_path, f"{self.path}.json")
@@ -0,0 +1,134 @@
+import json
+import os
+import queue
+import struct
+import threading
+import time
+
+from sandbox import code_hash
+
+_OFFSET = struct.Struct("<Q")
+
+
+class RunLog:
+    """
+    Structured log of a training run, written by a background thread so the loop never waits on disk.
+    Under `directory`:
+      events.jsonl  one JSON record per iteration (actions, score, rewards, timings, metrics, body hashes)
+      events.idx    byte offset of every record in events.jsonl, 8 bytes each, for random access
+      bodies/       code and feedback texts, one file per SHA-256, each written once
+    `verbosity` controls the console: 0 prints nothing, 1 one summary line per iteration,
+    2 everything the loop used to print (code, feedback and Q-tables).
+    """
+
+    def __init__(self, directory="runs", verbosity=1, flush_interval=1.0):
+        self.directory = directory
+        self.verbosity = verbosity
+        self.flush_interval = flush_interval
+        os.makedirs(os.path.join(directory, "bodies"), exist_ok=True)
+        self._seen = set(os.listdir(os.path.join(directory, "bodies")))
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._write_loop, name="run-log-writer", daemon=True)
+        self._thread.start()
+
+    def body(self, text):
+        """
+        Stores a code or feedback text once.
+        :return: Its hash, to reference it from a record.
+        """
+        key = code_hash(text)
+        if key not in self._seen:
+            self._seen.add(key)
+            self._queue.put(("body", key, text))
+        return key
+
+    def record(self, **fields):
+        """Queues one iteration record; a timestamp is added."""
+        fields.setdefault("timestamp", time.time())
+        self._queue.put(("event", fields))
+        if self.verbosity == 1:
+            print(_summary(fields))
+
+    def stop(self, reason, iterations):
+        """Records why the run ended, as a last record with `event` set to "stop"."""
+        self._queue.put(("event", {"event": "stop", "reason": reason, "iterations": iterations,
+                                   "timestamp": time.time()}))
+        if self.verbosity == 1:
+            print(f"Stopped after {iterations} iterations: {reason}")
+
+    def close(self):
+        """Writes everything still queued and stops the writer."""
+        self._queue.put(None)
+        self._thread.join()
+
+    def _write_loop(self):
+        with open(os.path.join(self.directory, "events.jsonl"), "ab") as events, \
+                open(os.path.join(self.directory, "events.idx"), "ab") as index:
+            done = False
+            while not done:
+                try:
+                    items = [self._queue.get(timeout=self.flush_interval)]
+                except queue.Empty:
+                    continue
+                while True:  # Write everything queued in one batch
+                    try:
+                        items.append(self._queue.get_nowait())
+                    except queue.Empty:
+                        break
+                for item in items:
+                    if item is None:
+                        done = True
+                    elif item[0] == "body":
+                        self._write_body(item[1], item[2])
+                    else:
+                        index.write(_OFFSET.pack(events.tell()))
+                        events.write(json.dumps(item[1], default=_to_json).encode("utf-8") + b"\n")
+                events.flush()
+                index.flush()
+
+    def _write_body(self, key, text):
+        path = os.path.join(self.directory, "bodies", key)
+        try:
+            with open(f"{path}.tmp", "w", encoding="utf-8") as f:
+                f.write(text)
+            os.replace(f"{path}.tmp", path)
+        except OSError as e:
+            print(f"Error writing run log body: {e}")
+
+
+def read_events(directory):
+    """Yields every record of a run log, in order."""
+    with open(os.path.join(directory, "events.jsonl"), "rb") as f:
+        for line in f:
+            yield json.loads(line)
+
+
+def read_event(directory, number):
+    """Returns the record at a position (0-based) without reading the others."""
+    with open(os.path.join(directory, "events.idx"), "rb") as index:
+        index.seek(number * _OFFSET.size)
+        data = index.read(_OFFSET.size)
+    if len(data) < _OFFSET.size:
+        raise IndexError(f"Run log {directory} has no record {number}")
+    with open(os.path.join(directory, "events.jsonl"), "rb") as f:
+        f.seek(_OFFSET.unpack(data)[0])
+        return json.loads(f.readline())
+
+
+def read_body(directory, key):
+    """Returns a code or feedback text from its hash."""
+    with open(os.path.join(directory, "bodies", key), encoding="utf-8") as f:
+        return f.read()
+
+
+def _summary(fields):
+    rewards = f"coder {fields.get('coder_reward')}, reviewer {fields.get('reviewer_reward')}"
+    return (f"Iteration {fields.get('iteration')}: score {fields.get('score')}, rewards {rewards}, "
+            f"{fields.get('timings', {}).get('total', 0):.2f}s")
+
+
+def _to_json(value):
+    # NumPy scalars (action indices, rewards) are not JSON serializable
+    if hasattr(value, "item"):
+        return value.item()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
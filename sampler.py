@@ -0,0 +1,119 @@
+import collections
+import os
+import threading
+import time
+
+import psutil
+
+Sample = collections.namedtuple("Sample", ["timestamp", "pid", "cpu_percent", "rss", "read_bytes", "write_bytes"])
+
+
+class ResourceSampler:
+    """
+    Background thread that samples CPU, RSS and IO counters of the watched processes every
+    `interval` seconds into a ring buffer of `capacity` samples. The trainer itself is always
+    watched; executors add the children running generated code while they are alive.
+    Reading an aggregate never blocks on the sampling.
+    """
+
+    def __init__(self, interval=0.1, capacity=10000):
+        self.interval = interval
+        self.samples = collections.deque(maxlen=capacity)
+        self._processes = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self.watch(os.getpid())
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="resource-sampler", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def watch(self, pid, baseline=0):
+        """
+        Starts sampling a process, with one sample taken right away.
+        :param baseline: Bytes subtracted from every RSS reading, e.g. the pages a fork inherited.
+        """
+        try:
+            process = psutil.Process(pid)
+        except psutil.Error:
+            return
+        with self._lock:
+            self._processes[pid] = process, baseline
+        self._sample(pid, process, baseline, first=True)
+
+    def unwatch(self, pid):
+        with self._lock:
+            process, baseline = self._processes.pop(pid, (None, 0))
+        if process is not None:
+            self._sample(pid, process, baseline)  # Last reading before the process goes away
+
+    def window(self, seconds=None, pid=None, start=None, end=None):
+        """
+        Aggregates the samples of one process over a time span.
+        :param seconds: Span ending now; ignored when `start` is given.
+        :param pid: Process to aggregate, the trainer by default.
+        :param start: Span start as a time.time() timestamp.
+        :param end: Span end as a time.time() timestamp, now by default.
+        :return: Dict with samples, cpu_percent (mean), max_cpu_percent, peak_rss (bytes),
+                 read_bytes and write_bytes (increase over the span), or None without samples.
+                 The CPU fields are None when the process was only sampled once.
+        """
+        pid = pid if pid is not None else os.getpid()
+        end = end if end is not None else time.time()
+        if start is None:
+            start = end - seconds if seconds is not None else float("-inf")
+        with self._lock:
+            samples = [s for s in self.samples if s.pid == pid and start <= s.timestamp <= end]
+        if not samples:
+            return None
+
+        cpu = [s.cpu_percent for s in samples if s.cpu_percent is not None]
+        return {
+            "samples": len(samples),
+            "cpu_percent": sum(cpu) / len(cpu) if cpu else None,
+            "max_cpu_percent": max(cpu) if cpu else None,
+            "peak_rss": max(s.rss for s in samples),
+            "read_bytes": _increase(samples, "read_bytes"),
+            "write_bytes": _increase(samples, "write_bytes"),
+        }
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            with self._lock:
+                processes = list(self._processes.items())
+            for pid, (process, baseline) in processes:
+                self._sample(pid, process, baseline)
+
+    def _sample(self, pid, process, baseline=0, first=False):
+        try:
+            with process.oneshot():
+                cpu_percent = process.cpu_percent(None)
+                if first:
+                    cpu_percent = None  # The first call only sets the reference point
+                rss = max(process.memory_info().rss - baseline, 0)
+                try:
+                    io = process.io_counters()
+                    read_bytes, write_bytes = io.read_bytes, io.write_bytes
+                except (AttributeError, psutil.AccessDenied):  # Not available on macOS
+                    read_bytes = write_bytes = None
+        except psutil.Error:
+            with self._lock:
+                self._processes.pop(pid, None)
+            return
+        sample = Sample(time.time(), pid, cpu_percent, rss, read_bytes, write_bytes)
+        with self._lock:
+            self.samples.append(sample)
+
+
+def _increase(samples, field):
+    values = [getattr(s, field) for s in samples if getattr(s, field) is not None]
+    return values[-1] - values[0] if values else None
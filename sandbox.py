@@ -0,0 +1,894 @@
+import ast
+import collections
+import contextlib
+import hashlib
+import itertools
+import json
+import os
+import pathlib
+import pickle
+import queue
+import signal
+import struct
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import weakref
+
+import psutil
+
+
+def code_hash(code):
+    """
+    Returns the key used to identify a program everywhere in the loop.
+    :param code: Source code as a string.
+    :return: SHA-256 hex digest of the code text.
+    """
+    return hashlib.sha256(code.encode("utf-8")).hexdigest()
+
+
+def semantic_hash(code):
+    """
+    Returns a key that only changes when the meaning of the program changes: it hashes
+    the AST without positions, so whitespace, comments and line shifts are ignored.
+    :return: SHA-256 hex digest, or None if the code does not parse.
+    """
+    try:
+        tree = ast.parse(code)
+    except (SyntaxError, ValueError):
+        return None
+    return hashlib.sha256(ast.dump(tree).encode("utf-8")).hexdigest()
+
+
+_data_digests = {}  # (path, size, mtime_ns) -> SHA-256 of the file content
+_data_lock = threading.Lock()
+
+
+def data_fingerprint(paths):
+    """
+    Returns a key that changes whenever the content of one of the files changes.
+    Files are only hashed again when their size or modification time changed, and
+    copies of the same file (e.g. one per episode directory) get the same key.
+    :param paths: Files the programs read; missing ones count as missing.
+    :return: SHA-256 hex digest.
+    """
+    digest = hashlib.sha256()
+    for path in paths:
+        path = os.path.abspath(path)
+        try:
+            stat = os.stat(path)
+        except OSError:
+            digest.update(f"{os.path.basename(path)}:missing\n".encode("utf-8"))
+            continue
+        stamp = (path, stat.st_size, stat.st_mtime_ns)
+        with _data_lock:
+            content = _data_digests.get(stamp)
+        if content is None:
+            content_hash = hashlib.sha256()
+            with open(path, "rb") as f:
+                for block in iter(lambda: f.read(1 << 20), b""):
+                    content_hash.update(block)
+            content = content_hash.hexdigest()
+            with _data_lock:
+                _data_digests[stamp] = content
+        digest.update(f"{os.path.basename(path)}:{content}\n".encode("utf-8"))
+    return digest.hexdigest()
+
+
+def forget_data(path):
+    """Drops the remembered hash of a file that was just rewritten, even if its size and mtime did not change."""
+    path = os.path.abspath(path)
+    with _data_lock:
+        for stamp in [stamp for stamp in _data_digests if stamp[0] == path]:
+            del _data_digests[stamp]
+
+
+class ResourceUsage(collections.namedtuple(
+        "ResourceUsage",
+        ["wall_time", "peak_rss", "cpu_time", "user_time", "system_time", "minor_faults", "major_faults",
+         "read_bytes", "write_bytes"])):
+    """
+    What a program consumed: times in seconds, peak_rss and IO in bytes.
+    Any field is None when the platform does not report it.
+    """
+    __slots__ = ()
+
+    @property
+    def cpu_percent(self):
+        """Average CPU use over the run, above 100% when it used several cores."""
+        if self.cpu_time is None or not self.wall_time:
+            return None
+        return 100 * self.cpu_time / self.wall_time
+
+USAGE_FIELDS = ResourceUsage._fields[1:]  # Everything measured besides the wall time
+
+
+class ResourceLimits(collections.namedtuple(
+        "ResourceLimits", ["memory", "cpu_time", "open_files", "processes", "output_size"],
+        defaults=(2 * 1024 ** 3, 20, 256, None, 64 * 1024 ** 2))):
+    """
+    Caps applied to every run with setrlimit; None leaves a resource unlimited.
+    memory is the address space in bytes (also enforced on the sampled peak RSS, so
+    a run is killed early where RLIMIT_AS is not honoured), cpu_time is in seconds,
+    output_size caps every file the program writes, its captured stdout/stderr included.
+    processes is RLIMIT_NPROC, which counts all processes of the user, not only the run's.
+    """
+    __slots__ = ()
+
+    def rlimits(self):
+        """:return: List of (resource, (soft, hard)) pairs to pass to setrlimit."""
+        import resource
+
+        rlimits = []
+        if self.cpu_time is not None:
+            # SIGXCPU at the soft limit, SIGKILL one second later if it is ignored
+            rlimits.append((resource.RLIMIT_CPU, (self.cpu_time, self.cpu_time + 1)))
+        caps = [(resource.RLIMIT_AS, self.memory), (resource.RLIMIT_NOFILE, self.open_files),
+                (resource.RLIMIT_NPROC, self.processes), (resource.RLIMIT_FSIZE, self.output_size)]
+        rlimits.extend((limit, (value, value)) for limit, value in caps if value is not None)
+        return rlimits
+
+    def apply(self):
+        """Sets the limits on the calling process; meant to run in the child before the code."""
+        import resource
+
+        for limit, values in self.rlimits():
+            resource.setrlimit(limit, values)
+
+
+FAILURE_MESSAGES = {
+    "timeout": "Error: Code execution timed out.",
+    "memory": "Error: Code execution exceeded the memory limit.",
+    "cpu_time": "Error: Code execution exceeded the CPU time limit.",
+    "output_size": "Error: Code execution exceeded the output size limit.",
+    "open_files": "Error: Code execution exceeded the open files limit.",
+    "processes": "Error: Code execution exceeded the process limit.",
+}
+
+
+class ExecutionResult(collections.namedtuple(
+        "ExecutionResult",
+        ["code_hash", "returncode", "stdout", "stderr", "wall_time", "peak_rss", "cpu_time", "timed_out",
+         "pid", "start_time", "user_time", "system_time", "minor_faults", "major_faults",
+         "read_bytes", "write_bytes", "failure"],
+        defaults=(None,) * 9)):
+    """
+    Outcome of running one program in the sandbox, including what the child process
+    itself consumed (see ResourceUsage). pid and start_time (a time.time() timestamp)
+    locate the run in a ResourceSampler's buffer. failure names the limit that stopped
+    the run (a FAILURE_MESSAGES key), None when it ended on its own.
+    """
+    __slots__ = ()
+
+    @property
+    def success(self):
+        return self.returncode == 0 and not self.timed_out and self.failure is None
+
+    def report(self):
+        """
+        Converts the result to the (success, output) contract used by the agents.
+        :return: Tuple (success: bool, output: str).
+        """
+        if self.timed_out:
+            return False, FAILURE_MESSAGES["timeout"]
+        if self.failure is not None:
+            return False, f"{FAILURE_MESSAGES[self.failure]}\n{self.stderr}".rstrip()
+        if self.success:
+            return True, "Code executed successfully."
+        return False, self.stderr
+
+    @property
+    def usage(self):
+        return ResourceUsage(self.wall_time, *(getattr(self, field) for field in USAGE_FIELDS))
+
+    def to_dict(self):
+        return self._asdict()
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(**{field: data.get(field) for field in cls._fields})
+
+
+class CodeExecutor:
+    """
+    Runs each unique program once and serves every later request from a cache.
+    Results are keyed by the hash of the code text together with the limits, the timeout
+    and the content of the `data_files` the programs read (relative to the working
+    directory), so changing any of them runs the programs again. They are kept in an LRU
+    of `max_entries` and, if `cache_dir` is given, also stored on disk so they survive across runs.
+    Misses are run by `backend`, a backend object or the name of one (see make_backend),
+    under the ResourceLimits `limits` (no limits besides the timeout when None).
+    With `incremental=True`, a program that only differs from an already run one in
+    whitespace or comments is not run again: it gets that run's result (whose tracebacks
+    may then point at the old line numbers).
+    """
+
+    def __init__(self, timeout=30, max_entries=128, cache_dir=None, backend="subprocess", sampler=None,
+                 limits=None, incremental=False, data_files=("Sales.csv",)):
+        self.timeout = timeout  # kind of big, but it worked better with a big timer
+        self.limits = limits
+        self.data_files = tuple(data_files)
+        self.incremental = incremental
+        self._semantic = collections.OrderedDict()  # semantic_hash -> code hash of the run to reuse
+        self.reused = 0
+        self.backend = make_backend(backend) if isinstance(backend, str) else backend
+        self.sampler = None
+        if sampler is not None:
+            self.attach_sampler(sampler)
+        self.max_entries = max_entries
+        self.cache_dir = pathlib.Path(cache_dir) if cache_dir else None
+        if self.cache_dir:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self._cache = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self._key_locks = {}  # key -> [lock, number of callers using it]
+        self.hits = 0
+        self.misses = 0
+
+    def run(self, code):
+        """
+        Returns the execution result for the code, running it only on a cache miss.
+        :param code: Code to be executed.
+        :return: ExecutionResult.
+        """
+        program = code_hash(code)
+        context = self._context()
+        key = _combine(program, context)
+        result = self._lookup(key)
+        if result is not None:
+            return result
+
+        # Concurrent callers with the same code wait for the first run instead of spawning again
+        with self._key_lock(key):
+            result = self._lookup(key)
+            if result is not None:
+                return result
+            semantic_key = semantic_hash(code) if self.incremental else None
+            if semantic_key is not None:
+                semantic_key = _combine(semantic_key, context)
+            result = self._reuse(key, program, semantic_key)
+            if result is not None:
+                return result
+
+            with self._lock:
+                self.misses += 1
+            result = self._execute(program, code)
+            if result.returncode is not None:  # Failures to spawn are not cached
+                self._store(key, result)
+                if semantic_key is not None:
+                    with self._lock:
+                        self._semantic[semantic_key] = key
+                        self._semantic.move_to_end(semantic_key)
+                        while len(self._semantic) > self.max_entries:
+                            self._semantic.popitem(last=False)
+            return result
+
+    def execute_code(self, code):
+        """
+        Executes the code to check for runtime errors.
+        :param code: Code to be executed.
+        :return: Tuple (success: bool, output: str).
+        """
+        return self.run(code).report()
+
+    def close(self):
+        """Stops the backend's helper processes, if it has any; the cached results stay usable."""
+        if hasattr(self.backend, "close"):
+            self.backend.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def clear(self):
+        """Forgets the results kept in memory, and the equivalences between programs used to reuse them."""
+        with self._lock:
+            self._cache.clear()
+            self._semantic.clear()
+
+    def attach_sampler(self, sampler):
+        """Makes the ResourceSampler watch every program this executor runs."""
+        self.sampler = sampler
+        self.backend.sampler = sampler
+
+    def _context(self):
+        """Everything besides the code that the result of a run depends on."""
+        limits = tuple(self.limits) if self.limits is not None else None
+        return f"{self.timeout}|{limits}|{data_fingerprint(self.data_files)}"
+
+    def _reuse(self, key, program, semantic_key):
+        """Returns the result of an equivalent program run before, stored under the new key, or None."""
+        if semantic_key is None:
+            return None
+        with self._lock:
+            previous_key = self._semantic.get(semantic_key)
+        previous = self._lookup(previous_key) if previous_key is not None else None
+        if previous is None:
+            return None
+        result = previous._replace(code_hash=program)
+        self._store(key, result)
+        with self._lock:
+            self.reused += 1
+        return result
+
+    @contextlib.contextmanager
+    def _key_lock(self, key):
+        """Holds the lock of a key; it is dropped once no caller is running or waiting on that key."""
+        with self._lock:
+            entry = self._key_locks.setdefault(key, [threading.Lock(), 0])
+            entry[1] += 1
+        try:
+            with entry[0]:
+                yield
+        finally:
+            with self._lock:
+                entry[1] -= 1
+                if entry[1] == 0:
+                    del self._key_locks[key]
+
+    def _lookup(self, key):
+        with self._lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                self.hits += 1
+                return self._cache[key]
+
+        result = self._load(key)
+        if result is not None:
+            with self._lock:
+                self.hits += 1
+            self._remember(key, result)
+        return result
+
+    def _remember(self, key, result):
+        with self._lock:
+            self._cache[key] = result
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
+
+    def _store(self, key, result):
+        self._remember(key, result)
+        if self.cache_dir is None:
+            return
+        path = self.cache_dir / f"{key}.json"
+        temp_path = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        try:
+            with open(temp_path, "w", encoding="utf-8") as f:
+                json.dump(result.to_dict(), f)
+            os.replace(temp_path, path)
+        except OSError as e:
+            print(f"Error saving execution result: {e}")
+
+    def _load(self, key):
+        if self.cache_dir is None:
+            return None
+        path = self.cache_dir / f"{key}.json"
+        try:
+            with open(path, encoding="utf-8") as f:
+                return ExecutionResult.from_dict(json.load(f))
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, TypeError) as e:
+            print(f"Error loading execution result {key}: {e}")
+            return None
+
+    def _execute(self, key, code):
+        start = time.perf_counter()
+        try:
+            return self.backend.run(key, code, self.timeout, self.limits)
+        except Exception as e:
+            print(f"Error during execution: {e}")
+            return ExecutionResult(key, None, "", f"Error during execution: {e}",
+                                   time.perf_counter() - start, None, None, False)
+
+
+# Sets the limits, then replaces itself with `python -c code`: rlimits survive exec, and unlike
+# preexec_fn nothing runs between fork and exec in the (threaded) trainer
+_LIMITS_WRAPPER = ("import os, resource, sys\n"
+                   "for limit, values in {rlimits!r}:\n"
+                   "    resource.setrlimit(limit, values)\n"
+                   "os.execv(sys.executable, [sys.executable, '-c', sys.argv[1]])\n")
+
+
+class SubprocessBackend:
+    """Runs every program in a brand new `python -c` interpreter."""
+
+    def __init__(self, poll_interval=0.02):
+        self.poll_interval = poll_interval  # How often the running child's memory is sampled
+        self.sampler = None
+
+    def run(self, key, code, timeout, limits=None):
+        """
+        Spawns a fresh interpreter for the code and collects its resource usage.
+        Output goes to temporary files so a chatty program can never fill a pipe.
+        :param limits: ResourceLimits set in the child before it starts, or None.
+        :return: ExecutionResult.
+        """
+        start_time, start = time.time(), time.perf_counter()
+        with tempfile.TemporaryFile() as out, tempfile.TemporaryFile() as err:
+            command = [sys.executable, "-c", code]
+            if limits is not None:
+                command = [sys.executable, "-S", "-c", _LIMITS_WRAPPER.format(rlimits=limits.rlimits()), code]
+            process = subprocess.Popen(command, stdout=out, stderr=err)
+            with _watched(self.sampler, process.pid):
+                returncode, usage, killed = self._wait(process, timeout, limits)
+            wall_time = time.perf_counter() - start
+            stdout, stderr = _read_output(out), _read_output(err)
+            captured = _captured_size(out, err)
+        failure = _failure_reason(killed, returncode, stderr, usage, limits, captured)
+        return ExecutionResult(key, returncode, stdout, stderr, wall_time, timed_out=failure == "timeout",
+                               pid=process.pid, start_time=start_time, failure=failure, **usage)
+
+    def _wait(self, process, timeout, limits=None):
+        """
+        Waits for the process, killing it after the timeout or above the memory limit, while
+        sampling its memory and IO. Times and page faults come from wait4's rusage. The peak RSS
+        is polled instead because on Linux ru_maxrss also counts the trainer's own memory,
+        inherited by the child before exec.
+        :return: Tuple (returncode, usage dict, reason it was killed or None).
+        """
+        status = {"rusage": None}
+
+        def reap():
+            if not hasattr(os, "wait4"):
+                status["returncode"] = process.wait()
+                return
+            try:
+                _, code, status["rusage"] = os.wait4(process.pid, 0)
+                status["returncode"] = os.waitstatus_to_exitcode(code)
+            except ChildProcessError:
+                # Already reaped by Popen while being killed; it kept the exit code
+                status["returncode"] = process.returncode
+
+        # The reaper blocks, so the timeout and the sampling happen here in the caller
+        waiter = threading.Thread(target=reap, daemon=True)
+        waiter.start()
+        usage, killed = _supervise(process.pid, waiter.join, waiter.is_alive, timeout, self.poll_interval, limits)
+        if killed:
+            process.kill()
+            waiter.join()
+
+        process.returncode = status["returncode"]
+        if status["rusage"] is not None:
+            usage = _merge_usage(usage, _rusage_usage(status["rusage"]))
+        return process.returncode, usage, killed
+
+
+class ForkServerBackend:
+    """
+    Runs every program in a fresh fork of a zygote process that already imported the
+    data science stack, so a job no longer pays for interpreter startup and for
+    importing pandas, numpy and matplotlib. The zygote reaps its forks with wait4, so
+    the CPU times and page faults reported are exactly the job's own. So is the peak RSS:
+    the pages a fork starts with resident, inherited from the zygote, are subtracted.
+    The zygote is stopped by close(), or else when the backend is garbage collected or
+    the interpreter exits.
+    Only available where os.fork exists (Linux and macOS).
+    """
+
+    def __init__(self, workers=4, preload=("numpy", "pandas", "matplotlib", "matplotlib.pyplot"),
+                 poll_interval=0.02):
+        self.workers = workers
+        self.preload = list(preload)
+        self.poll_interval = poll_interval
+        self.sampler = None
+        self._slots = threading.BoundedSemaphore(workers)  # Limits how many forks run at the same time
+        self._lock = threading.Lock()
+        self._zygote = None
+        self._stop_zygote = None  # weakref.finalize stopping the running zygote
+        self._jobs = {}
+        self._job_ids = itertools.count()
+
+    def run(self, key, code, timeout, limits=None):
+        """
+        Forks a worker from the zygote for the code and collects its output and resource usage.
+        :param limits: ResourceLimits set in the child before it starts, or None.
+        :return: ExecutionResult.
+        """
+        with self._slots:
+            start_time, start = time.time(), time.perf_counter()
+            paths = []
+            for _ in range(3):  # stdout, stderr and the job's final usage sample
+                with tempfile.NamedTemporaryFile(delete=False) as f:
+                    paths.append(f.name)
+            job = {"started": queue.Queue(maxsize=1), "done": threading.Event(), "result": None}
+            try:
+                self._submit(job, (code, paths, os.getcwd(), limits))
+                started = job["started"].get()
+                if started is None:
+                    raise RuntimeError("the zygote process exited")
+
+                pid, baseline = started
+                with _watched(self.sampler, pid, baseline):
+                    usage, killed = _supervise(pid, job["done"].wait, lambda: not job["done"].is_set(),
+                                               timeout, self.poll_interval, limits, baseline)
+                    if killed:
+                        _kill(pid)
+                    job["done"].wait()
+                wall_time = time.perf_counter() - start
+                if job["result"] is None:
+                    raise RuntimeError("the zygote process exited")
+
+                returncode, rusage_usage = job["result"]
+                with open(paths[2], "rb") as f:
+                    data = f.read()
+                if data:  # Empty when killed before it could report
+                    usage = _merge_usage(usage, json.loads(data))
+                usage = _merge_usage(usage, rusage_usage)
+                with open(paths[0], "rb") as out, open(paths[1], "rb") as err:
+                    stdout, stderr = _read_output(out), _read_output(err)
+                    captured = _captured_size(out, err)
+            finally:
+                with self._lock:
+                    for job_id in [i for i, j in self._jobs.items() if j is job]:
+                        del self._jobs[job_id]
+                for path in paths:
+                    os.remove(path)
+        failure = _failure_reason(killed, returncode, stderr, usage, limits, captured)
+        return ExecutionResult(key, returncode, stdout, stderr, wall_time, timed_out=failure == "timeout",
+                               pid=pid, start_time=start_time, failure=failure, **usage)
+
+    def close(self):
+        """Stops the zygote; the next job starts a new one."""
+        with self._lock:
+            stop, self._zygote, self._stop_zygote = self._stop_zygote, None, None
+        if stop is not None:
+            stop()
+
+    def _submit(self, job, request):
+        with self._lock:
+            if self._zygote is None or self._zygote.poll() is not None:
+                self._start_zygote()
+            job_id = next(self._job_ids)
+            self._jobs[job_id] = job
+            data = pickle.dumps((job_id,) + request)
+            self._zygote.stdin.write(struct.pack("!I", len(data)) + data)
+            self._zygote.stdin.flush()
+        return job_id
+
+    def _start_zygote(self):
+        response_r, response_w = os.pipe()
+        here = os.path.dirname(os.path.abspath(__file__))
+        command = (f"import sys; sys.path.insert(0, {here!r}); import sandbox; "
+                   f"sandbox._zygote_main({response_w}, {self.preload!r})")
+        environment = dict(os.environ, MPLBACKEND="Agg")  # Plots must never open a window in the sandbox
+        self._zygote = subprocess.Popen([sys.executable, "-c", command], stdin=subprocess.PIPE,
+                                        pass_fds=(response_w,), env=environment)
+        os.close(response_w)
+        # Neither the reader thread nor the finalizer may hold the backend, or it would never be collected
+        if self._stop_zygote is not None:
+            self._stop_zygote.detach()
+        self._stop_zygote = weakref.finalize(self, _stop_zygote, self._zygote)
+        threading.Thread(target=_read_responses, args=(os.fdopen(response_r, "rb"), self._jobs, self._lock),
+                         daemon=True).start()
+
+
+def _stop_zygote(zygote):
+    """Closing its stdin makes the zygote leave its loop and exit."""
+    try:
+        zygote.stdin.close()
+    except OSError:
+        pass
+    zygote.wait()
+
+
+def _read_responses(responses, jobs, lock):
+    """Dispatches the zygote's "started"/"finished" messages to the waiting jobs of a ForkServerBackend."""
+    while True:
+        try:
+            message = pickle.load(responses)
+        except (EOFError, OSError, pickle.UnpicklingError):
+            break
+        with lock:
+            job = jobs.get(message[1])
+        if job is None:
+            continue
+        if message[0] == "started":
+            job["started"].put((message[2], message[3]))
+        else:
+            job["result"] = message[2], message[3]
+            job["done"].set()
+    responses.close()
+
+    # The zygote is gone: release everyone still waiting on it
+    with lock:
+        waiting = list(jobs.values())
+        jobs.clear()
+    for job in waiting:
+        if job["started"].empty():
+            job["started"].put(None)
+        job["done"].set()
+
+
+BACKENDS = {"subprocess": SubprocessBackend, "forkserver": ForkServerBackend}
+
+
+def make_backend(name="subprocess", **kwargs):
+    """
+    Builds an execution backend by name, falling back to subprocesses where forking is unsupported.
+    :param name: "subprocess" or "forkserver".
+    """
+    if name == "forkserver" and not hasattr(os, "fork"):
+        print("Forkserver is not available on this platform, using subprocesses instead.")
+        name, kwargs = "subprocess", {k: v for k, v in kwargs.items() if k == "poll_interval"}
+    return BACKENDS[name](**kwargs)
+
+
+def _zygote_main(response_fd, preload):
+    """
+    Main loop of the zygote: imports `preload` once, then forks one child per request read
+    from stdin and reports "started" (with the RSS the child inherits) and "finished" (with
+    the child's rusage) on `response_fd`.
+    """
+    import importlib
+    import select
+    import signal
+
+    for name in preload:
+        try:
+            importlib.import_module(name)
+        except ImportError:
+            pass
+
+    responses = os.fdopen(response_fd, "wb")
+    requests = sys.stdin.buffer.fileno()
+    # SIGCHLD wakes the select below as soon as a child exits
+    wakeup_r, wakeup_w = os.pipe()
+    os.set_blocking(wakeup_w, False)
+    signal.signal(signal.SIGCHLD, lambda signum, frame: None)
+    signal.set_wakeup_fd(wakeup_w)
+    children = {}
+
+    def send(message):
+        pickle.dump(message, responses)
+        responses.flush()
+
+    while True:
+        try:
+            readable, _, _ = select.select([requests, wakeup_r], [], [])
+        except InterruptedError:
+            continue
+        if wakeup_r in readable:
+            os.read(wakeup_r, 4096)
+        while children:
+            pid, status, rusage = os.wait4(-1, os.WNOHANG)
+            if pid == 0:
+                break
+            send(("finished", children.pop(pid), os.waitstatus_to_exitcode(status), _rusage_usage(rusage)))
+        if requests not in readable:
+            continue
+
+        header = _read_exactly(requests, 4)
+        if not header:
+            break  # The trainer closed the pipe
+        job_id, code, paths, cwd, limits = pickle.loads(_read_exactly(requests, struct.unpack("!I", header)[0]))
+        baseline_r, baseline_w = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            # A fork starts with part of the zygote's pages (the preloaded modules) resident: not the job's memory
+            baseline = psutil.Process().memory_info().rss
+            os.write(baseline_w, struct.pack("!Q", baseline))
+            signal.set_wakeup_fd(-1)
+            signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+            for fd in (requests, response_fd, wakeup_r, wakeup_w, baseline_r, baseline_w):
+                os.close(fd)
+            _run_forked(code, paths, cwd, limits, baseline)
+        os.close(baseline_w)
+        data = _read_exactly(baseline_r, 8)
+        os.close(baseline_r)
+        baseline = struct.unpack("!Q", data)[0] if data else 0
+        children[pid] = job_id
+        send(("started", job_id, pid, baseline))
+
+
+def _run_forked(code, paths, cwd, limits=None, baseline=0):
+    """
+    Body of a forked job: behaves like `python -c code` as far as the program can tell.
+    Runs in the child, so before exiting it writes its own peak memory and IO to paths[2].
+    :param baseline: RSS inherited from the zygote, left out of the peak memory.
+    """
+    import builtins
+    import traceback
+
+    if "matplotlib" in sys.modules:
+        sys.modules["matplotlib"].use("Agg", force=True)
+
+    # Point the real file descriptors at the capture files, so C extensions are captured too
+    for fd, path in zip((1, 2), paths):
+        target = os.open(path, os.O_WRONLY | os.O_TRUNC)
+        os.dup2(target, fd)
+        os.close(target)
+    sys.stdout = open(1, "w", encoding="utf-8", errors="backslashreplace", closefd=False)
+    sys.stderr = open(2, "w", encoding="utf-8", errors="backslashreplace", closefd=False)
+    sys.stdin = open(os.devnull)
+    sys.argv = ["-c"]
+
+    exit_code = 0
+    try:
+        os.chdir(cwd)
+        if limits is not None:
+            limits.apply()
+        exec(compile(code, "<string>", "exec"), {"__name__": "__main__", "__builtins__": builtins})
+    except SystemExit as e:
+        if isinstance(e.code, int):
+            exit_code = e.code
+        elif e.code is not None:
+            print(e.code, file=sys.stderr)
+            exit_code = 1
+    except BaseException as e:
+        # Skip this function's own frame, the traceback then matches `python -c`
+        traceback.print_exception(type(e), e, e.__traceback__.tb_next)
+        exit_code = 1
+
+    try:
+        sys.stdout.flush()
+        sys.stderr.flush()
+        with open(paths[2], "w") as f:
+            json.dump(_sample_process(os.getpid(), baseline), f)
+    finally:
+        os._exit(exit_code)  # Skips the zygote's atexit handlers
+
+
+def _read_exactly(fd, size):
+    data = b""
+    while len(data) < size:
+        chunk = os.read(fd, size - len(data))
+        if not chunk:
+            return b""
+        data += chunk
+    return data
+
+
+def _kill(pid):
+    try:
+        os.kill(pid, signal.SIGKILL)
+    except ProcessLookupError:
+        pass  # Finished in the meantime
+
+
+def _supervise(pid, join, is_alive, timeout, poll_interval, limits=None, baseline=0):
+    """
+    Samples a running process until it finishes, the timeout expires or its peak RSS
+    goes over the memory limit.
+    :param join: Waits up to the given number of seconds for the process to finish.
+    :param is_alive: Tells whether the process is still running.
+    :param baseline: RSS the process started with that is not its own (see _sample_process).
+    :return: Tuple (usage dict, reason to kill it: "timeout", "memory" or None);
+             the process is left running for the caller to kill.
+    """
+    usage = {}
+    memory = limits.memory if limits is not None else None
+    deadline = time.monotonic() + timeout
+    while is_alive() and time.monotonic() < deadline:
+        usage = _merge_usage(usage, _sample_process(pid, baseline))
+        if memory is not None and usage.get("peak_rss", 0) > memory:
+            return usage, "memory"
+        join(min(poll_interval, max(0, deadline - time.monotonic())))
+    return usage, "timeout" if is_alive() else None
+
+
+def _failure_reason(killed, returncode, stderr, usage, limits, captured=0):
+    """
+    Tells which limit stopped a run, from how it was killed, its exit status and the error it printed.
+    :param captured: Size in bytes of the largest of the stdout and stderr captures.
+    :return: A FAILURE_MESSAGES key, or None when the run ended on its own.
+    """
+    if killed is not None:
+        return killed
+    # A capture that reached the cap was cut, even if the program did not notice (or failed to say so)
+    if limits is not None and limits.output_size is not None and captured >= limits.output_size:
+        return "output_size"
+    if limits is None or not returncode:
+        return None
+    cpu_time = usage.get("cpu_time")
+    if limits.cpu_time is not None and (returncode == -signal.SIGXCPU or (
+            returncode == -signal.SIGKILL and cpu_time is not None and cpu_time >= limits.cpu_time)):
+        return "cpu_time"
+    if limits.output_size is not None and (returncode == -signal.SIGXFSZ or "File too large" in stderr):
+        return "output_size"
+    if limits.memory is not None and "MemoryError" in stderr:
+        return "memory"
+    if limits.open_files is not None and "Too many open files" in stderr:
+        return "open_files"
+    if limits.processes is not None and "Resource temporarily unavailable" in stderr:
+        return "processes"
+    return None
+
+
+@contextlib.contextmanager
+def _watched(sampler, pid, baseline=0):
+    """Has the sampler (if any) record the process while the block runs."""
+    if sampler is None:
+        yield
+        return
+    sampler.watch(pid, baseline)
+    try:
+        yield
+    finally:
+        sampler.unwatch(pid)
+
+
+def _captured_size(*files):
+    return max(os.fstat(file.fileno()).st_size for file in files)
+
+
+def _read_output(file):
+    file.seek(0)
+    return file.read().decode("utf-8", errors="replace")
+
+
+def _sample_process(pid, baseline=0):
+    """
+    Reads the memory high-water mark, CPU times and IO of a running process.
+    :param baseline: Bytes subtracted from the peak RSS. A fork of the zygote starts with the
+                     zygote's resident pages (pandas, numpy...) already counted in its VmHWM.
+    :return: Usage dict, empty if the process already exited.
+    """
+    try:
+        process = psutil.Process(pid)
+        with process.oneshot():
+            times = process.cpu_times()
+            usage = {"user_time": times.user, "system_time": times.system,
+                     "cpu_time": times.user + times.system}
+            try:
+                io = process.io_counters()
+                # On Linux the *_chars counters include reads served from the page cache
+                usage["read_bytes"] = getattr(io, "read_chars", io.read_bytes)
+                usage["write_bytes"] = getattr(io, "write_chars", io.write_bytes)
+            except (AttributeError, psutil.AccessDenied):  # Not available on macOS
+                pass
+            if sys.platform.startswith("linux"):
+                # VmHWM belongs to the post-exec address space, so it is the child's own peak
+                with open(f"/proc/{pid}/status") as f:
+                    for line in f:
+                        if line.startswith("VmHWM:"):
+                            usage["peak_rss"] = max(int(line.split()[1]) * 1024 - baseline, 0)
+                            return usage
+                return {}  # Zombie: no address space left to measure
+            memory = process.memory_info()
+            usage["peak_rss"] = max(getattr(memory, "peak_wset", memory.rss) - baseline, 0)
+            return usage
+    except (psutil.Error, OSError):
+        return {}
+
+
+def _rusage_usage(rusage):
+    """Converts a resource.struct_rusage to a usage dict (its ru_maxrss is not used, see SubprocessBackend)."""
+    return {
+        "user_time": rusage.ru_utime,
+        "system_time": rusage.ru_stime,
+        "cpu_time": rusage.ru_utime + rusage.ru_stime,
+        "minor_faults": rusage.ru_minflt,
+        "major_faults": rusage.ru_majflt,
+    }
+
+
+def _merge_usage(old, new):
+    """Keeps the highest peak RSS and the most recent value of every other counter."""
+    merged = dict(old)
+    merged.update({field: value for field, value in new.items() if value is not None})
+    if old.get("peak_rss") is not None and new.get("peak_rss") is not None:
+        merged["peak_rss"] = max(old["peak_rss"], new["peak_rss"])
+    return merged
+
+
+def _combine(digest, context):
+    return hashlib.sha256(f"{digest}|{context}".encode("utf-8")).hexdigest()
+
+
+_default_executor = None
+_default_lock = threading.Lock()
+
+
+def default_executor():
+    """Returns the executor shared by every agent that was not given one explicitly."""
+    global _default_executor
+    with _default_lock:
+        if _default_executor is None:
+            _default_executor = CodeExecutor()
+        return _default_executor
@@ -0,0 +1,151 @@
+import collections
+import json
+import re
+
+# The seven criteria of the review rubric: JSON field, name shown to the model, maximum score
+RUBRIC = (
+    ("data_analysis", "Data Analysis", 20),
+    ("pep8", "Adherence to PEP-8", 20),
+    ("logic_structure", "Code logic and structure", 20),
+    ("comments", "Code comments", 10),
+    ("visualizations", "Visualizations", 10),
+    ("error_prevention", "Error prevention", 10),
+    ("optimization", "Code optimization", 10),
+)
+FIELDS = tuple(field for field, _, _ in RUBRIC)
+
+# "field": value pairs, read from a partial or broken JSON text. A number counts only once a
+# "," or "}" follows it: at the end of a streamed chunk it may still be being written
+_PAIR = re.compile(r'"(\w+)"\s*:\s*("(?:[^"\\]|\\.)*"|-?\d+(?:\.\d+)?(?=\s*[,}]))')
+
+
+def review_schema(fields=FIELDS):
+    """
+    JSON schema of a structured review with the given rubric fields, passed to the model server
+    as its output format. The free-text feedback comes first, so a streamed answer has
+    everything once the last score is written.
+    """
+    maximums = {field: maximum for field, _, maximum in RUBRIC}
+    properties = {"feedback": {"type": "string"}}
+    for field in fields:
+        properties[field] = {"type": "integer", "minimum": 0, "maximum": maximums[field]}
+    return {"type": "object", "properties": properties, "required": list(properties)}
+
+
+def validate(data, schema):
+    """
+    Checks a parsed JSON value against the subset of JSON schema used here
+    (object, string and integer types, required, minimum and maximum).
+    :return: Dict property -> error message; empty when the value is valid.
+    """
+    if not isinstance(data, dict):
+        return {"": "not a JSON object"}
+    errors = {}
+    for name, rules in schema["properties"].items():
+        if name not in data:
+            if name in schema.get("required", ()):
+                errors[name] = "missing"
+            continue
+        value = data[name]
+        if rules["type"] == "string" and not isinstance(value, str):
+            errors[name] = "not a string"
+        elif rules["type"] == "integer":
+            if isinstance(value, bool) or not isinstance(value, (int, float)) or value != int(value):
+                errors[name] = "not an integer"
+            elif not rules.get("minimum", value) <= value <= rules.get("maximum", value):
+                errors[name] = f"out of range [{rules.get('minimum')}, {rules.get('maximum')}]"
+    return errors
+
+
+class Review(collections.namedtuple("Review", ["scores", "feedback", "errors"])):
+    """
+    What could be read from a structured review: the valid rubric scores (dict field -> int),
+    the feedback text and, for every rubric field that is missing or invalid, why.
+    """
+    __slots__ = ()
+
+    @property
+    def missing(self):
+        return tuple(field for field in FIELDS if field not in self.scores)
+
+    @property
+    def total(self):
+        return sum(self.scores.values())
+
+    def merge(self, other):
+        """Adds the scores of a re-ask answer to the ones already known."""
+        scores = dict(self.scores, **other.scores)
+        errors = {field: error for field, error in self.errors.items() if field not in scores}
+        return Review(scores, self.feedback or other.feedback, errors)
+
+    def to_json(self):
+        data = {"feedback": self.feedback}
+        data.update((field, self.scores[field]) for field in FIELDS if field in self.scores)
+        return json.dumps(data, ensure_ascii=False, indent=2)
+
+
+def parse_review(text, fields=FIELDS):
+    """
+    Reads a structured review. A complete JSON object is validated against the schema;
+    a partial one (a stream still being written, or a broken answer) gives the fields
+    that are already complete, so it can be called on every streamed chunk.
+    :return: Review.
+    """
+    schema = review_schema(fields)
+    data = _load_object(text)
+    if data is None:
+        data = {}
+        for name, value in _PAIR.findall(text):
+            data[name] = json.loads(value)
+    errors = validate(data, schema)
+    scores = {field: int(data[field]) for field in fields if field in data and field not in errors}
+    feedback = data.get("feedback") if isinstance(data.get("feedback"), str) else ""
+    return Review(scores, feedback, {field: error for field, error in errors.items() if field in fields})
+
+
+def reask_prompt(review):
+    """Short follow-up asking only for the missing scores, with the feedback already given as context."""
+    names = {field: (name, maximum) for field, name, maximum in RUBRIC}
+    wanted = "\n".join(f'- "{field}": {names[field][0]}, an integer from 0 to {names[field][1]}'
+                       for field in review.missing)
+    return (f"You reviewed a Python program and wrote this feedback:\n{review.feedback}\n\n"
+            f"Your answer did not include these scores:\n{wanted}\n\n"
+            f"Reply only with a JSON object holding these fields.")
+
+
+def _load_object(text):
+    # Models sometimes wrap the object in a code fence or add words around it
+    start, end = text.find("{"), text.rfind("}")
+    if start == -1 or end <= start:
+        return None
+    try:
+        data = json.loads(text[start:end + 1])
+    except ValueError:
+        return None
+    return data if isinstance(data, dict) else None
+
+
+class ReviewStats:
+    """Counts how often the review scores could not be read, whichever the scoring mode."""
+
+    def __init__(self):
+        self.reviews = 0
+        self.parse_failures = 0  # Reviews scored -1 (nothing readable) or with missing fields
+        self.reasks = 0
+        self.reasked_fields = collections.Counter()
+
+    def record(self, failed, reasked=()):
+        self.reviews += 1
+        self.parse_failures += bool(failed)
+        if reasked:
+            self.reasks += 1
+            self.reasked_fields.update(reasked)
+
+    @property
+    def parse_failure_rate(self):
+        return self.parse_failures / self.reviews if self.reviews else 0.0
+
+    def summary(self):
+        return {"reviews": self.reviews, "parse_failures": self.parse_failures,
+                "parse_failure_rate": self.parse_failure_rate, "reasks": self.reasks,
+                "reasked_fields": dict(self.reasked_fields)}
@@ -0,0 +1,107 @@
+import json
+import os
+import random
+import shutil
+import time
+
+import checkpoint
+
+LATEST = "latest.json"
+
+
+class Session:
+    """
+    Snapshots of a training loop, taken every `every` iterations under `directory`.
+    Each snapshot is a folder with both Q-table checkpoints, a copy of the replay buffers (if any)
+    and a JSON file with the rest of the loop state (iteration, state, scores, last code and
+    feedback, agent memory, RNG states).
+    It only becomes the one to resume from when `latest.json` is atomically pointed at it,
+    so a crash while writing leaves the previous snapshot in place. The last `keep` are kept.
+    """
+
+    def __init__(self, directory="session", every=10, keep=2):
+        self.directory = directory
+        self.every = every
+        self.keep = keep
+
+    def due(self, iteration):
+        """Tells whether a snapshot should be taken after this (0-based) iteration."""
+        return self.every > 0 and (iteration + 1) % self.every == 0
+
+    def save(self, iteration, loop_state, c_qlearning, r_qlearning, agents, replay_buffers=None):
+        """
+        Writes a snapshot taken after an iteration.
+        :param loop_state: JSON-serializable dict of the loop variables.
+        :param agents: Dict name -> LLMAgent whose conversation memory is saved.
+        :param replay_buffers: Optional (coder, reviewer) ReplayBuffers, rolled back with the rest on restore.
+        """
+        name = f"iteration_{iteration + 1}_{time.time_ns()}"  # Never overwrites the snapshot latest.json points to
+        path = os.path.join(self.directory, name)
+        os.makedirs(path, exist_ok=True)
+        checkpoint.save_checkpoint(c_qlearning, os.path.join(path, "coder.qtbl"), iteration)
+        checkpoint.save_checkpoint(r_qlearning, os.path.join(path, "reviewer.qtbl"), iteration)
+        state = {
+            "iteration": iteration,
+            "loop": loop_state,
+            "memory": {agent_name: agent.memory for agent_name, agent in agents.items()},
+            "random_state": _encode_random_state(random.getstate()),
+            "numpy_random_state": {"coder": c_qlearning.rng.bit_generator.state,
+                                   "reviewer": r_qlearning.rng.bit_generator.state},
+            "replay": [buffer.save_snapshot(os.path.join(path, f"replay_{i}.npy"))
+                       for i, buffer in enumerate(replay_buffers or ())],
+        }
+        _write_json(os.path.join(path, "state.json"), state)
+        _write_json(os.path.join(self.directory, LATEST), {"snapshot": name})
+        self._prune(name)
+
+    def restore(self, c_qlearning, r_qlearning, agents, replay_buffers=None):
+        """
+        Loads the latest snapshot into the Q-learnings, the agents, the RNGs and the replay buffers,
+        so the transitions recorded after it are not replayed.
+        :return: Tuple (iteration to continue from, loop_state dict), or None without a snapshot.
+        """
+        try:
+            with open(os.path.join(self.directory, LATEST)) as f:
+                path = os.path.join(self.directory, json.load(f)["snapshot"])
+            with open(os.path.join(path, "state.json")) as f:
+                state = json.load(f)
+        except FileNotFoundError:
+            return None
+
+        # Read into memory: the snapshot folder may be pruned while training goes on
+        checkpoint.restore(c_qlearning, os.path.join(path, "coder.qtbl"), mmap=False)
+        checkpoint.restore(r_qlearning, os.path.join(path, "reviewer.qtbl"), mmap=False)
+        for agent_name, agent in agents.items():
+            agent.memory = state["memory"].get(agent_name, [])
+        random.setstate(_decode_random_state(state["random_state"]))
+        c_qlearning.rng.bit_generator.state = state["numpy_random_state"]["coder"]
+        r_qlearning.rng.bit_generator.state = state["numpy_random_state"]["reviewer"]
+        for i, (buffer, buffer_state) in enumerate(zip(replay_buffers or (), state.get("replay", ()))):
+            buffer.restore_snapshot(os.path.join(path, f"replay_{i}.npy"), buffer_state)
+        return state["iteration"] + 1, state["loop"]
+
+    def _prune(self, latest):
+        snapshots = [entry for entry in os.listdir(self.directory) if entry.startswith("iteration_")]
+        snapshots.sort(key=lambda entry: tuple(int(part) for part in entry.split("_")[1:]))
+        for entry in snapshots[:-self.keep] if self.keep > 0 else []:
+            if entry != latest:
+                shutil.rmtree(os.path.join(self.directory, entry), ignore_errors=True)
+
+
+def _write_json(path, data):
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    with open(temp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp_path, path)
+
+
+def _encode_random_state(state):
+    version, internal, gauss = state
+    return [version, list(internal), gauss]
+
+
+def _decode_random_state(state):
+    version, internal, gauss = state
+    return version, tuple(internal), gauss
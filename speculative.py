@@ -0,0 +1,147 @@
+import asyncio
+import collections
+import concurrent.futures
+import time
+
+from analysis import default_analyzer
+from lint import default_linter
+
+
+class Candidate(collections.namedtuple(
+        "Candidate", ["code", "action_index", "options", "metrics", "lint", "success", "output",
+                      "generation_time", "check_time"])):
+    """
+    One sampled program and its checks. success is None when the program was not run
+    because it does not parse.
+    """
+    __slots__ = ()
+
+    @property
+    def accepted(self):
+        """Parses, runs without errors and Ruff finds no bugs in it (style issues are fine)."""
+        return bool(self.metrics.valid and self.success and not self.lint.bug_count)
+
+    @property
+    def rank(self):
+        """Sort key, higher is better: parses, runs, fewest Ruff bugs, fewest issues, fewest row loops."""
+        return (self.metrics.valid, bool(self.success), -self.lint.bug_count, -self.lint.issue_count,
+                -(self.metrics.iterrows_calls + self.metrics.dataframe_loops))
+
+    def to_dict(self):
+        return {"action": self.action_index, "options": self.options, "valid": self.metrics.valid,
+                "success": self.success, "issues": self.lint.issue_count, "accepted": self.accepted,
+                "generation_time": self.generation_time, "check_time": self.check_time}
+
+
+class BestOfK:
+    """
+    Speculative code generation: the Coder samples `k` candidates at the same time, each one
+    is parsed, linted and run in parallel, and only the best one goes on to the Reviewer.
+    Candidate i uses temperatures[i % len(temperatures)] and, with `vary_prompts`, the coder
+    prompt after the chosen one by i (so candidate 0 always uses the chosen prompt).
+    Every program is run through the shared executor, so the Reviewer and the Environment
+    get the execution of the selected one from its cache.
+    """
+
+    def __init__(self, k=4, temperatures=(0.2, 0.5, 0.8, 1.1), vary_prompts=False):
+        self.k = k
+        self.temperatures = tuple(temperatures) or (None,)
+        self.vary_prompts = vary_prompts
+        self.coder = self.executor = self.linter = self.analyzer = None
+        self.rounds = 0
+        self.candidates = 0
+        self.accepted = 0
+        self.selected_accepted = 0
+        self.wall_time = 0.0
+        self.candidate_time = 0.0  # Generation plus checks of every candidate, as if run one at a time
+
+    def bind(self, coder, executor, linter=None, analyzer=None):
+        """Sets the Coder sampling the candidates and the tools checking them."""
+        self.coder = coder
+        self.executor = executor
+        self.linter = linter if linter is not None else default_linter()
+        self.analyzer = analyzer if analyzer is not None else default_analyzer()
+        return self
+
+    def generate(self, prompts, action_index, review="", previous_code=""):
+        """
+        Samples and checks the candidates on a thread pool (for the synchronous Coder).
+        :param prompts: Coder prompts, indexed by action.
+        :return: Tuple (best Candidate, list of all the Candidates).
+        """
+        start = time.perf_counter()
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.k) as pool:
+            futures = [pool.submit(self._sample, prompts, action_index, review, previous_code, i)
+                       for i in range(self.k)]
+            candidates = [future.result() for future in futures]
+        return self._select(candidates, time.perf_counter() - start)
+
+    async def generate_async(self, prompts, action_index, review="", previous_code=""):
+        """Same as generate, for the AsyncCoder: requests run concurrently, checks in threads."""
+        start = time.perf_counter()
+        candidates = await asyncio.gather(*(self._sample_async(prompts, action_index, review, previous_code, i)
+                                            for i in range(self.k)))
+        return self._select(list(candidates), time.perf_counter() - start)
+
+    def summary(self):
+        """
+        :return: Dict with the acceptance rate of all the candidates and of the selected ones, and the
+        wall-time cost of a round relative to generating and checking a single candidate.
+        """
+        single = self.candidate_time / self.candidates if self.candidates else 0.0
+        round_time = self.wall_time / self.rounds if self.rounds else 0.0
+        return {
+            "k": self.k,
+            "rounds": self.rounds,
+            "candidates": self.candidates,
+            "acceptance_rate": self.accepted / self.candidates if self.candidates else 0.0,
+            "selected_acceptance_rate": self.selected_accepted / self.rounds if self.rounds else 0.0,
+            "round_time": round_time,
+            "single_candidate_time": single,
+            "relative_cost": round_time / single if single else 0.0,
+        }
+
+    def format_summary(self):
+        s = self.summary()
+        return (f"Best-of-{s['k']}: {s['rounds']} rounds, {s['candidates']} candidates, "
+                f"{s['acceptance_rate']:.0%} accepted ({s['selected_acceptance_rate']:.0%} of the selected), "
+                f"{s['round_time']:.2f}s per round, {s['relative_cost']:.2f}x the time of a single candidate")
+
+    def _action_index(self, prompts, action_index, i):
+        return (action_index + i) % len(prompts) if self.vary_prompts else action_index
+
+    def _options(self, i):
+        temperature = self.temperatures[i % len(self.temperatures)]
+        return None if temperature is None else {"temperature": temperature}
+
+    def _sample(self, prompts, action_index, review, previous_code, i):
+        action_index = self._action_index(prompts, action_index, i)
+        options = self._options(i)
+        start = time.perf_counter()
+        code = self.coder.generate_code(prompts[action_index], review, previous_code, options)
+        return self._check(code, action_index, options, time.perf_counter() - start)
+
+    async def _sample_async(self, prompts, action_index, review, previous_code, i):
+        action_index = self._action_index(prompts, action_index, i)
+        options = self._options(i)
+        start = time.perf_counter()
+        code = await self.coder.generate_code(prompts[action_index], review, previous_code, options)
+        return await asyncio.to_thread(self._check, code, action_index, options, time.perf_counter() - start)
+
+    def _check(self, code, action_index, options, generation_time):
+        start = time.perf_counter()
+        metrics = self.analyzer.analyze(code)
+        lint = self.linter.check(code)
+        success, output = self.executor.execute_code(code) if metrics.valid else (None, metrics.syntax_error)
+        return Candidate(code, action_index, options, metrics, lint, success, output, generation_time,
+                         time.perf_counter() - start)
+
+    def _select(self, candidates, wall_time):
+        best = max(candidates, key=lambda candidate: candidate.rank)  # First of the best on ties
+        self.rounds += 1
+        self.candidates += len(candidates)
+        self.accepted += sum(candidate.accepted for candidate in candidates)
+        self.selected_accepted += best.accepted
+        self.wall_time += wall_time
+        self.candidate_time += sum(candidate.generation_time + candidate.check_time for candidate in candidates)
+        return best, candidates
@@ -0,0 +1,129 @@
+import collections
+import time
+
+import numpy as np
+
+
+class Progress(collections.namedtuple(
+        "Progress", ["iteration", "score", "coder_reward", "q_tables", "tokens"])):
+    """What the stopping policies look at after each iteration (0-based `iteration`)."""
+
+
+class ScoreThreshold:
+    """Stops once the score has been at least `threshold` for `patience` iterations in a row."""
+
+    def __init__(self, threshold, patience=3):
+        self.threshold = threshold
+        self.patience = patience
+        self.streak = 0
+
+    def check(self, progress):
+        self.streak = self.streak + 1 if progress.score >= self.threshold else 0
+        if self.streak >= self.patience:
+            return f"score >= {self.threshold} for {self.streak} iterations"
+        return None
+
+
+class QConvergence:
+    """Stops once no Q-value moved by more than `epsilon` for `patience` iterations in a row."""
+
+    def __init__(self, epsilon=1e-3, patience=5):
+        self.epsilon = epsilon
+        self.patience = patience
+        self.streak = 0
+        self._previous = None
+
+    def check(self, progress):
+        tables = [np.array(table, dtype=np.float64) for table in progress.q_tables]
+        if self._previous is not None:
+            change = max(float(np.abs(table - previous).max()) for table, previous in zip(tables, self._previous))
+            self.streak = self.streak + 1 if change < self.epsilon else 0
+        self._previous = tables
+        if self.streak >= self.patience:
+            return f"Q-values changed by less than {self.epsilon} for {self.streak} iterations"
+        return None
+
+
+class RewardPlateau:
+    """
+    Stops when the mean coder reward of the last `window` iterations is within `min_delta`
+    of the mean of the `window` before them.
+    """
+
+    def __init__(self, window=10, min_delta=0.01):
+        self.window = window
+        self.min_delta = min_delta
+        self.rewards = collections.deque(maxlen=2 * window)
+
+    def check(self, progress):
+        self.rewards.append(progress.coder_reward)
+        if len(self.rewards) < 2 * self.window:
+            return None
+        rewards = np.array(self.rewards)
+        before, last = rewards[:self.window].mean(), rewards[self.window:].mean()
+        if abs(last - before) < self.min_delta:
+            return f"coder reward plateaued at {last:.3f} over the last {2 * self.window} iterations"
+        return None
+
+
+class WallClockBudget:
+    """Stops once `seconds` have passed since the policy was created."""
+
+    def __init__(self, seconds):
+        self.seconds = seconds
+        self.start = time.monotonic()
+
+    def check(self, progress):
+        elapsed = time.monotonic() - self.start
+        if elapsed >= self.seconds:
+            return f"wall-clock budget of {self.seconds:g}s spent ({elapsed:.0f}s)"
+        return None
+
+
+class TokenBudget:
+    """Stops once the agents have spent `tokens` model tokens (prompt and response)."""
+
+    def __init__(self, tokens):
+        self.tokens = tokens
+
+    def check(self, progress):
+        if progress.tokens >= self.tokens:
+            return f"token budget of {self.tokens} spent ({progress.tokens} tokens)"
+        return None
+
+
+class StoppingCriteria:
+    """
+    Ends the training loop at the first of its policies that fires, remembering why in `reason`.
+    Every policy sees every iteration, so the streaks and windows stay up to date.
+    Their state is not part of the session snapshots: after a resume they start over.
+    """
+
+    def __init__(self, policies=()):
+        self.policies = list(policies)
+        self.reason = None
+
+    def check(self, progress):
+        """
+        :param progress: Progress of the iteration that just ended.
+        :return: Why training should stop, or None to go on.
+        """
+        reasons = [policy.check(progress) for policy in self.policies]
+        self.reason = next((reason for reason in reasons if reason is not None), None)
+        return self.reason
+
+    @classmethod
+    def from_args(cls, args):
+        """Builds the policies asked for on the command line (see main.py); none gives an empty criteria."""
+        policies = []
+        if args.stop_score is not None:
+            policies.append(ScoreThreshold(args.stop_score, args.stop_patience))
+        if args.stop_q_epsilon is not None:
+            policies.append(QConvergence(args.stop_q_epsilon, args.stop_patience))
+        if args.stop_plateau is not None:
+            policies.append(RewardPlateau(args.stop_plateau, args.stop_plateau_delta))
+        if args.max_seconds is not None:
+            policies.append(WallClockBudget(args.max_seconds))
+        if args.max_tokens is not None:
+            policies.append(TokenBudget(args.max_tokens))
+        return cls(policies)
@@ -0,0 +1,146 @@
+import contextlib
+import functools
+import inspect
+import json
+import os
+import threading
+import time
+
+import numpy as np
+
+
+class Timings:
+    """
+    Durations of named stages (spans) of the training loop.
+    While disabled, spans and timed functions only check one attribute, so the
+    instrumentation can stay in the hot path. Enabled with enable() or TIMING=1.
+    """
+
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self._durations = {}
+        self._lock = threading.Lock()
+
+    def enable(self, enabled=True):
+        self.enabled = enabled
+
+    def add(self, name, seconds):
+        with self._lock:
+            self._durations.setdefault(name, []).append(seconds)
+
+    def reset(self):
+        with self._lock:
+            self._durations.clear()
+
+    def summary(self):
+        """
+        Aggregates every stage.
+        :return: Dict stage -> {count, total, mean, p50, p95, p99, max}, in seconds.
+        """
+        with self._lock:
+            durations = {name: np.array(values) for name, values in self._durations.items()}
+        result = {}
+        for name, values in sorted(durations.items()):
+            p50, p95, p99 = np.percentile(values, [50, 95, 99])
+            result[name] = {"count": len(values), "total": float(values.sum()), "mean": float(values.mean()),
+                            "p50": float(p50), "p95": float(p95), "p99": float(p99), "max": float(values.max())}
+        return result
+
+    def format(self):
+        """Returns the summary as a text table, slowest stages (by total time) first."""
+        summary = self.summary()
+        lines = [f"{'stage':<32} {'count':>7} {'total s':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}"]
+        for name, stats in sorted(summary.items(), key=lambda item: -item[1]["total"]):
+            lines.append(f"{name:<32} {stats['count']:>7} {stats['total']:>9.2f} {stats['p50'] * 1000:>9.1f} "
+                         f"{stats['p95'] * 1000:>9.1f} {stats['p99'] * 1000:>9.1f}")
+        return "\n".join(lines)
+
+    def export(self, path):
+        """Writes the summary to a JSON file."""
+        temp_path = f"{path}.tmp"
+        with open(temp_path, "w") as f:
+            json.dump(self.summary(), f, indent=2)
+        os.replace(temp_path, path)
+
+
+class LiveView:
+    """Prints the timing table every `interval` seconds from a background thread."""
+
+    def __init__(self, timings=None, interval=10.0):
+        self.timings = timings if timings is not None else TIMINGS
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="timing-live-view", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            print(f"\n=== Timings ===\n{self.timings.format()}\n")
+
+
+TIMINGS = Timings(enabled=os.environ.get("TIMING") == "1")
+_NO_SPAN = contextlib.nullcontext()
+
+
+def span(name, timings=None):
+    """
+    Times a block: `with span("reviewer.ruff"): ...`.
+    Returns a shared no-op context manager while timing is disabled.
+    """
+    timings = timings if timings is not None else TIMINGS
+    if not timings.enabled:
+        return _NO_SPAN
+    return _Span(name, timings)
+
+
+def timed(name):
+    """Decorator timing every call of a function or coroutine function as the stage `name`."""
+    def decorate(func):
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                if not TIMINGS.enabled:
+                    return await func(*args, **kwargs)
+                start = time.perf_counter()
+                try:
+                    return await func(*args, **kwargs)
+                finally:
+                    TIMINGS.add(name, time.perf_counter() - start)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not TIMINGS.enabled:
+                return func(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                TIMINGS.add(name, time.perf_counter() - start)
+        return wrapper
+    return decorate
+
+
+class _Span:
+    __slots__ = ("name", "timings", "start")
+
+    def __init__(self, name, timings):
+        self.name = name
+        self.timings = timings
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.timings.add(self.name, time.perf_counter() - self.start)
+        return False